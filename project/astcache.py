@@ -0,0 +1,102 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+
+from element import Element
+
+
+class ASTCache:
+    """ Content-addressed cache of parsed programs. Entries are keyed by the hash of the source text and the
+    signature of the code that parses it (see brewparse.tree_signature), kept in a bounded in-memory LRU and
+    optionally persisted on disk as pickled Element trees. Cached trees are shared between callers, so they must be
+    treated as read-only. """
+    def __init__(self, signature: str, cache_dir: str|None = None, max_entries: int = 128):
+        self.signature = signature
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.memory: OrderedDict[str, Element] = OrderedDict()
+        self.hits = 0  # served from memory
+        self.disk_hits = 0  # served from disk
+        self.misses = 0
+        self.lock = threading.Lock()  # parse_program may be called from several threads
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, program: str, variant: str = "") -> str:
+        digest = hashlib.sha256(self.signature.encode())
+        if variant:
+            digest.update(b"\0" + variant.encode())  # e.g. the AST form, the default keeps the original keys
+        digest.update(b"\0")
+        digest.update(program.encode("utf-8", "surrogatepass"))
+        return digest.hexdigest()
+
+    def get(self, program: str, variant: str = "") -> Element|None:
+        """ Return the cached AST for the program, or None if it has not been parsed before. """
+        key = self.key(program, variant)
+        with self.lock:
+            ast = self.memory.get(key)
+            if ast is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return ast
+
+        ast = self._load(key)
+        with self.lock:
+            if ast is not None:
+                self._remember(key, ast)
+                self.disk_hits += 1
+                return ast
+            self.misses += 1
+        return None
+
+    def put(self, program: str, ast: Element, variant: str = "") -> None:
+        key = self.key(program, variant)
+        with self.lock:
+            self._remember(key, ast)
+        self._store(key, ast)
+
+    def clear(self) -> None:
+        """ Drop the in-memory entries and reset the counters. Files on disk are kept. """
+        with self.lock:
+            self.memory.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses, "entries": len(self.memory)}
+
+    def _remember(self, key: str, ast: Element) -> None:
+        self.memory[key] = ast
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)  # evict least recently used
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key[2:] + ".ast")
+
+    def _load(self, key: str) -> Element|None:
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, RecursionError):
+            return None  # missing or unreadable entry is just a miss
+
+    def _store(self, key: str, ast: Element) -> None:
+        if self.cache_dir is None:
+            return
+        path = self._path(key)
+        tmp = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # write to a temp file first so concurrent readers never see a partial entry
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(ast, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except (OSError, RecursionError, pickle.PicklingError):
+            if tmp is not None and os.path.exists(tmp):
+                os.unlink(tmp)  # caching is best effort, the parsed tree is still returned
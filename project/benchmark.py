@@ -0,0 +1,634 @@
+""" Micro-benchmarks for the Brewin front end. Run with: python benchmark.py <name> [...] """
+import contextlib
+import gc
+import io
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import brewlex
+import brewparse
+
+
+def sample_program(num_funcs: int = 200) -> str:
+    """ A large, valid v3-style program built by repeating a few struct-heavy functions. """
+    lines = ["struct node { value: int; next: node; }"]
+    for i in range(num_funcs):
+        lines.append(f"""
+func helper{i}(n: int, flag: bool): int {{
+  var total: int;
+  var cur: node;
+  var i: int;
+  /* walk a short list and sum it up */
+  cur = new node;
+  cur.value = n * {i} + 1;
+  for (i = 0; i < n; i = i + 1) {{
+    if (flag && i > 2 || !(i == 5)) {{
+      total = total + cur.value * (i - 1) / 2;
+    }} else {{
+      print("skip ", i, " in helper{i}");
+    }}
+  }}
+  return total;
+}}""")
+    lines.append("""
+func main(): void {
+  print(helper0(10, true));
+}""")
+    return "\n".join(lines)
+
+
+def timed(fn, repeat: int = 5) -> float:
+    """ Best wall time of fn() over a few runs, in seconds. """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_cache(num_funcs: int = 400) -> None:
+    program = sample_program(num_funcs)
+    print(f"program: {len(program) / 1024:.0f} KiB, {program.count(chr(10)) + 1} lines")
+
+    brewparse.disable_cache()
+    cold = timed(lambda: brewparse.parse_program(program))
+    print(f"no cache        : {cold * 1000:8.2f} ms")
+
+    cache_dir = tempfile.mkdtemp(prefix="brewin-ast-")
+    try:
+        cache = brewparse.enable_cache(cache_dir)
+        brewparse.parse_program(program)  # populate
+        warm = timed(lambda: brewparse.parse_program(program))
+        print(f"memory hit      : {warm * 1000:8.2f} ms ({cold / warm:.0f}x)")
+
+        def disk_hit():
+            cache.memory.clear()
+            brewparse.parse_program(program)
+        disk = timed(disk_hit)
+        print(f"disk hit        : {disk * 1000:8.2f} ms ({cold / disk:.1f}x)")
+        print(f"counters        : {brewparse.cache_stats()}")
+    finally:
+        brewparse.disable_cache()
+        shutil.rmtree(cache_dir)
+
+
+def bench_startup(runs: int = 5) -> None:
+    """ Import time and time to the first parse in a fresh interpreter, with and without prebuilt tables. """
+    script = ("import time; t = time.perf_counter(); import brewparse; i = time.perf_counter() - t;"
+              "brewparse.parse_program('func main() { print(1); }'); p = time.perf_counter() - t;"
+              "print(i, p)")
+    table_dir = tempfile.mkdtemp(prefix="brewin-tables-")
+    env = dict(os.environ, BREWIN_TABLE_DIR=table_dir)
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    def run() -> tuple[float, float]:
+        out = subprocess.run([sys.executable, "-c", script], cwd=here, env=env, check=True,
+                             capture_output=True, text=True).stdout
+        imported, parsed = out.split()
+        return float(imported), float(parsed)
+
+    try:
+        imported, parsed = run()
+        print(f"no tables       : import {imported * 1000:6.1f} ms, first parse done at {parsed * 1000:6.1f} ms")
+        best = min(run() for _ in range(runs))
+        print(f"prebuilt tables : import {best[0] * 1000:6.1f} ms, first parse done at {best[1] * 1000:6.1f} ms")
+        print(f"artifacts       : {sorted(os.listdir(table_dir))}")
+    finally:
+        shutil.rmtree(table_dir)
+
+
+def bench_threads(num_threads: int = 16, rounds: int = 20) -> None:
+    """ Stress test: many threads parse different programs at once and must get the same trees as a serial run. """
+    programs = [sample_program(n) for n in range(1, 25)]
+    expected = [str(brewparse.parse_program(program)) for program in programs]
+    start_line = threading.Barrier(num_threads)
+
+    def worker(seed: int) -> int:
+        start_line.wait()  # maximize overlap
+        mismatches = 0
+        for r in range(rounds):
+            i = (seed * 7 + r) % len(programs)
+            if str(brewparse.parse_program(programs[i])) != expected[i]:
+                mismatches += 1
+        return mismatches
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(num_threads) as pool:
+        mismatches = sum(pool.map(worker, range(num_threads)))
+    elapsed = time.perf_counter() - start
+    print(f"{num_threads} threads x {rounds} parses: {elapsed * 1000:.0f} ms, {mismatches} mismatching trees, "
+          f"{len(brewparse._pool.idle)} pooled parsers")
+    assert mismatches == 0
+
+
+def measure(fn) -> tuple[float, int]:
+    """ Wall time and peak traced memory of a single fn() call. """
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def bench_stream(num_funcs: int = 4000) -> None:
+    """ Lexing a large file from one string vs. streaming it in chunks from a memory map. """
+    from brewstream import StreamLexer
+
+    fd, path = tempfile.mkstemp(suffix=".br")
+    with os.fdopen(fd, "w") as f:
+        f.write(sample_program(num_funcs))
+    try:
+        print(f"file: {os.path.getsize(path) / 2**20:.1f} MiB")
+
+        def whole_string():
+            lexer = brewlex.get_lexer().clone()
+            with open(path) as f:
+                lexer.input(f.read())
+            for _ in lexer:
+                pass
+
+        def streamed():
+            for _ in StreamLexer(path):
+                pass
+
+        for name, fn in [("string lexer", whole_string), ("stream lexer", streamed)]:
+            elapsed = timed(fn, 3)
+            _, peak = measure(fn)  # tracing slows things down, so time and memory are measured separately
+            print(f"{name:16}: {elapsed * 1000:8.0f} ms, peak {peak / 2**20:6.2f} MiB")
+    finally:
+        os.unlink(path)
+
+
+def bench_pratt(num_funcs: int = 400) -> None:
+    """ Differential check and parse latency of the LALR and hand-written backends. """
+    brewparse.disable_cache()
+    for n in (1, 7, 40):
+        program = sample_program(n)
+        lalr, pratt = brewparse.parse_program(program), brewparse.parse_program(program, backend="pratt")
+        assert str(lalr) == str(pratt) and spans(lalr) == spans(pratt)
+
+    program = sample_program(num_funcs)
+    lalr = timed(lambda: brewparse.parse_program(program, backend="lalr"))
+    pratt = timed(lambda: brewparse.parse_program(program, backend="pratt"))
+    print(f"program: {len(program) / 1024:.0f} KiB, identical trees")
+    print(f"lalr            : {lalr * 1000:8.2f} ms")
+    print(f"pratt           : {pratt * 1000:8.2f} ms ({lalr / pratt:.2f}x)")
+
+
+def bench_driver(num_funcs: int = 2000) -> None:
+    """ PLY's generic LRParser driver vs. the Brewin-specific one in brewlalr, over the same tokens. """
+    import brewgen
+    from brewlalr import get_driver
+
+    parser = brewparse.Parser()
+    driver = get_driver()
+    programs = [("sample", sample_program(num_funcs)), ("generated v3", brewgen.generate(3, num_funcs // 4)),
+                ("generated v4", brewgen.generate(4, num_funcs // 4, exceptions=0.5))]
+    for name, program in programs:
+        tokens = brewlex.tokenize(program)
+        stock, specialized = parser.parse_ply(tokens), driver.parse(tokens)
+        assert str(stock) == str(specialized) and spans(stock) == spans(specialized)
+        del stock, specialized
+        print(f"{name:13}: {len(tokens):7} tokens, identical trees")
+        # the driver pauses the collector itself (see brewlalr), PLY only runs without it when the caller pauses it
+        for label, collect in (("gc on", True), ("gc paused", False)):
+            if not collect:
+                gc.disable()
+            try:
+                ply = timed(lambda: parser.parse_ply(tokens), 3)
+                fast = timed(lambda: driver.parse(tokens), 3)
+            finally:
+                gc.enable()
+            print(f"  {label:11}: ply {ply * 1000:7.0f} ms, specialized {fast * 1000:7.0f} ms ({ply / fast:.2f}x)")
+        assert gc.isenabled()
+    gc.disable()
+    driver.parse(brewlex.tokenize(programs[0][1]))
+    assert not gc.isenabled(), "the driver turned on a collector its caller had paused"
+    gc.enable()
+
+
+def bench_incremental(num_funcs: int = 400, edits: int = 50) -> None:
+    """ Reparse after editing one function, from scratch vs. reusing the previous tree; checked against a full parse. """
+    import random
+
+    brewparse.disable_cache()
+    rng = random.Random(131)
+    program = sample_program(num_funcs)
+    previous = brewparse.parse_program(program)
+    full_time = incremental_time = 0.0
+    reused = 0
+    for _ in range(edits):
+        i = rng.randrange(num_funcs)
+        program = program.replace(f"cur.value = n * {i} + 1;", f"cur.value = n * {i} + {rng.randrange(100)};", 1)
+        start = time.perf_counter()
+        full = brewparse.parse_program(program)
+        full_time += time.perf_counter() - start
+        start = time.perf_counter()
+        previous = brewparse.parse_program(program, previous=previous)
+        incremental_time += time.perf_counter() - start
+        assert str(previous) == str(full) and spans(previous) == spans(full)
+        reused += previous.reused_definitions
+
+    print(f"program: {len(program) / 1024:.0f} KiB, {edits} single-function edits, identical trees")
+    print(f"full reparse    : {full_time / edits * 1000:8.2f} ms per edit")
+    print(f"incremental     : {incremental_time / edits * 1000:8.2f} ms per edit ({full_time / incremental_time:.1f}x), "
+          f"{reused / edits:.0f} definitions reused per edit")
+
+
+def walk(node) -> int:
+    """ Visit every node through get()/elem_type like the interpreters do; returns the node count. """
+    count = 1
+    for key in getattr(node, "_fields", None) or node.dict:  # typed nodes build .dict on demand
+        child = node.get(key)
+        if isinstance(child, list):
+            for item in child:
+                if hasattr(item, "elem_type"):
+                    count += walk(item)
+        elif hasattr(child, "elem_type"):
+            count += walk(child)
+    return count
+
+
+def spans(node) -> list:
+    """ (elem_type, span) of every node, in the order walk() visits them. """
+    found = [(node.elem_type, node.span)]
+    for key in getattr(node, "_fields", None) or node.dict:
+        child = node.get(key)
+        for item in child if isinstance(child, list) else (child,):
+            if hasattr(item, "elem_type"):
+                found += spans(item)
+    return found
+
+
+def bench_spans(num_funcs: int = 400) -> None:
+    """ Every backend and AST form records the same spans, and they point at the right source text. """
+    import io
+    import flatast
+    import nodes
+
+    brewparse.disable_cache()
+    program = sample_program(num_funcs)
+    lalr = brewparse.parse_program(program)
+    expected = spans(lalr)
+    assert expected == spans(brewparse.parse_program(program, backend="pratt"))
+    assert expected == spans(brewparse.parse_file(io.StringIO(program), chunk_size=7))
+    assert expected == spans(nodes.from_element(lalr)) == spans(flatast.from_element(lalr).root)
+    lines = program.split("\n")
+    for elem_type, (start_line, start_column, end_line, end_column) in expected:
+        assert start_column < len(lines[start_line - 1]) and 0 < end_column <= len(lines[end_line - 1])
+    assert expected[1] == ("struct", (1, 0, 1, len("struct node { value: int; next: node; }")))
+    assert expected[0][1][2:] == (len(lines), 1)  # the program ends with the "}" of main
+
+    # spans are lines and columns: an edit within a line leaves the later definitions as they are, and moving
+    # every definition down a line moves the spans of the reused subtrees with it
+    for old, new in (("n * 3 + 1;", "n * 3 + 100;"), ("struct node", "\nstruct node")):
+        edited = program.replace(old, new, 1)
+        reparsed = brewparse.parse_program(edited, previous=lalr)
+        assert reparsed.reused_definitions >= num_funcs + 1
+        assert spans(reparsed) == spans(brewparse.parse_program(edited))
+
+    print(f"program: {len(program) / 1024:.0f} KiB, {len(expected)} nodes, identical spans in every form")
+    for backend in ("lalr", "pratt"):
+        print(f"{backend:16}: {timed(lambda: brewparse.parse_program(program, backend=backend)) * 1000:8.2f} ms")
+
+
+def bench_nodes(num_funcs: int = 2000) -> None:
+    """ Memory held by, and traversal speed of, dict-based Element trees vs. the typed __slots__ nodes. """
+    brewparse.disable_cache()
+    program = sample_program(num_funcs)
+    trees = {}
+    for form in ("element", "typed"):
+        ast = brewparse.parse_program(program, backend="pratt", form=form)  # warm up, then measure a fresh tree
+        tracemalloc.start()
+        ast = brewparse.parse_program(program, backend="pratt", form=form)
+        retained = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        trees[form] = ast
+
+        # what an interpreter's statement loop does: get() on Element, plain attributes on typed nodes
+        if form == "typed":
+            def hot_loop():
+                for func in ast.functions:
+                    for statement in func.statements:
+                        if statement.elem_type == "=":
+                            statement.expression
+        else:
+            def hot_loop():
+                for func in ast.get("functions"):
+                    for statement in func.get("statements"):
+                        if statement.elem_type == "=":
+                            statement.get("expression")
+        print(f"{form:16}: {retained / 2**20:6.1f} MiB retained, {walk(ast)} nodes walked via get() "
+              f"in {timed(lambda: walk(ast), 3) * 1000:6.1f} ms, statement loop {timed(hot_loop) * 1000:5.2f} ms")
+    assert str(trees["element"]) == str(trees["typed"])
+
+
+def bench_flat(num_programs: int = 2000) -> None:
+    """ Batch workload: many small programs held in memory, and reloading a big one from disk. """
+    import pickle
+
+    import flatast
+
+    brewparse.disable_cache()
+    programs = [sample_program(n % 5 + 1) for n in range(num_programs)]
+    for form in ("element", "typed", "flat"):
+        tracemalloc.start()
+        trees = [brewparse.parse_program(program, backend="pratt", form=form) for program in programs]
+        retained = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        assert str(trees[7]) == str(brewparse.parse_program(programs[7]))
+        print(f"{form:16}: {num_programs} programs retain {retained / 2**20:6.1f} MiB")
+        del trees
+
+    program = sample_program(2000)
+    tree = brewparse.parse_program(program, backend="pratt")
+    flat = flatast.from_element(tree)
+    directory = tempfile.mkdtemp(prefix="brewin-flat-")
+    try:
+        pickled, packed = os.path.join(directory, "ast.pickle"), os.path.join(directory, "ast.flat")
+        with open(pickled, "wb") as f:
+            pickle.dump(tree, f, protocol=pickle.HIGHEST_PROTOCOL)
+        flat.save(packed)
+
+        def load_pickle():
+            with open(pickled, "rb") as f:
+                return pickle.load(f)
+        load_pickle_time = timed(load_pickle, 3)
+        load_flat_time = timed(lambda: flatast.FlatAST.load(packed))
+        assert str(flatast.FlatAST.load(packed)) == str(tree)
+        print(f"pickled Element : {os.path.getsize(pickled) / 2**20:5.1f} MiB, load {load_pickle_time * 1000:8.2f} ms")
+        print(f"mapped flat     : {os.path.getsize(packed) / 2**20:5.1f} MiB, load {load_flat_time * 1000:8.2f} ms")
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_tokenize(num_funcs: int = 8000) -> None:
+    """ PLY's Lexer.token() loop vs. brewlex.tokenize() over a multi-megabyte program; the tokens must match. """
+    program = sample_program(num_funcs)
+    print(f"program: {len(program) / 2**20:.1f} MiB")
+
+    def ply_tokens():
+        lexer = brewlex.get_lexer().clone()
+        lexer.lineno = 1
+        lexer.input(program)
+        return list(lexer)
+
+    expected = ply_tokens()
+    tokens = brewlex.tokenize(program)
+    assert [(t.type, t.value, t.lineno, t.lexpos) for t in expected] == \
+        list(zip(tokens.types, tokens.values, tokens.linenos, tokens.positions))
+    del expected
+
+    ply = timed(ply_tokens, 3)
+    fast = timed(lambda: brewlex.tokenize(program), 3)
+    print(f"{len(tokens)} identical tokens")
+    print(f"ply lexer       : {ply * 1000:8.0f} ms")
+    print(f"tokenize        : {fast * 1000:8.0f} ms ({ply / fast:.2f}x)")
+
+
+def bench_pathological(mib: int = 1) -> None:
+    """ Lexing time of huge and unterminated comments and strings must grow linearly with the input size. """
+    import re
+
+    from brewstream import StreamLexer
+
+    size = mib * 2**20
+    inputs = {
+        "huge comment": lambda n: "/*" + "x\n" * (n // 2) + "*/ func main() { }",
+        "unclosed comments": lambda n: "/* a " * (n // 5),
+        "unclosed strings": lambda n: ('"' + "a" * 1000 + "\n") * (n // 1002),
+    }
+
+    def ply(program):
+        lexer = brewlex.get_lexer().clone()
+        lexer.input(program)
+        for _ in lexer:
+            pass
+
+    def stream(program):
+        for _ in StreamLexer(program.encode()):
+            pass
+
+    print(f"seconds for {mib}, {mib * 2} and {mib * 4} MiB of input")
+    for name, make in inputs.items():
+        programs = [make(size * scale) for scale in (1, 2, 4)]
+        for label, fn in (("ply", ply), ("tokenize", brewlex.tokenize), ("stream", stream)):
+            times = [timed(lambda: fn(program), 1) for program in programs]
+            print(f"{name:18} {label:9}: " + " ".join(f"{t:7.3f}" for t in times))
+
+    # for comparison, the old rule retried at every /* of an unclosed comment (quadratic)
+    old_comment = re.compile(r"/\*(.|\n)*?\*/")
+    for n in (5_000, 10_000, 20_000):
+        program = "/* a " * (n // 5)
+        elapsed = timed(lambda: [old_comment.match(program, i) for i in range(0, len(program), 5)], 1)
+        print(f"old t_comment rule, {n // 1000:2d} KB of unclosed comments: {elapsed:7.3f}")
+
+
+def bench_validate(num_funcs: int = 4000, mutations: int = 300) -> None:
+    """ Syntax check without building a tree vs. a full parse; both must accept and reject the same programs. """
+    import contextlib
+    import io
+    import random
+
+    brewparse.disable_cache()
+    rng = random.Random(13)
+    small = sample_program(3)
+    tokens = brewlex.tokenize(small)
+    rejected = 0
+    for _ in range(mutations):
+        # drop or duplicate a random token
+        i = rng.randrange(len(tokens))
+        start = tokens.positions[i]
+        end = start + tokens.end_columns[i] - tokens.columns[i]
+        program = small[:start] + (small[start:end] * 2 if rng.random() < 0.5 else "") + small[end:]
+        error = brewparse.validate_program(program)
+        # PLY recovers from some errors and still returns a tree, p_error's report is what counts
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), contextlib.suppress(SyntaxError):
+            brewparse.parse_program(program)
+        messages = [line for line in output.getvalue().splitlines() if line.startswith("Syntax error")]
+        assert (error is None) == (not messages), program
+        if messages:
+            rejected += 1
+            assert messages[0] == "Syntax error at EOF" or messages[0].endswith(f" on line {error[0]}"), \
+                (messages[0], error)
+    print(f"{mutations} mutated programs, {rejected} rejected by both")
+
+    program = sample_program(num_funcs)
+    assert brewparse.validate_program(program) is None
+    print(f"program: {len(program) / 2**20:.1f} MiB")
+    for name, fn in [("parse", lambda: brewparse.parse_program(program)),
+                     ("validate", lambda: brewparse.validate_program(program))]:
+        elapsed = timed(fn, 3)
+        _, peak = measure(fn)
+        print(f"{name:16}: {elapsed * 1000:8.0f} ms, peak {peak / 2**20:6.2f} MiB")
+
+
+def bench_bulk(num_files: int = 2000, funcs_per_file: int = 5) -> None:
+    """ Parsing a corpus of files in a process pool; every result must match a serial parse_program. """
+    import bulkparse
+
+    brewparse.disable_cache()
+    directory = tempfile.mkdtemp()
+    try:
+        expected, broken = {}, set()
+        for i in range(num_files):
+            path = os.path.join(directory, f"{i // 100:02d}", f"prog{i}.br")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            program = sample_program(funcs_per_file).replace("helper0", f"helper{i}x")
+            if i % 50 == 7:
+                program = program.replace("var i: int;", "var i int;", 1)  # a syntax error now and then
+                broken.add(path)
+            with open(path, "w") as f:
+                f.write(program)
+            expected[path] = program
+        print(f"corpus: {num_files} files, {sum(map(len, expected.values())) / 2**20:.1f} MiB, "
+              f"{os.cpu_count()} CPUs")
+
+        def check(results):
+            seen = 0
+            for result in results:
+                seen += 1
+                if result.path in broken:
+                    assert result.error == "Syntax error at 'int' on line 6" and result.data is None, result
+                else:
+                    assert result.ok and str(result.ast) == str(brewparse.parse_program(expected[result.path]))
+            assert seen == num_files
+
+        check(bulkparse.parse_directory(directory, workers=2))
+        printed = io.StringIO()
+        with contextlib.redirect_stdout(printed):  # in this process: errors are collected, not printed
+            check(bulkparse.parse_directory(directory, workers=1))
+        assert printed.getvalue() == "", printed.getvalue()
+
+        serial = None
+        for workers in sorted({1, 2, os.cpu_count() or 1}):
+            elapsed = timed(lambda: sum(1 for _ in bulkparse.parse_directory(directory, workers=workers)), 3)
+            serial = serial or elapsed
+            print(f"{workers:2d} workers      : {elapsed * 1000:8.0f} ms, {num_files / elapsed:7.0f} files/s "
+                  f"({serial / elapsed:.2f}x)")
+    finally:
+        shutil.rmtree(directory)
+
+
+def bench_hashcons(num_programs: int = 1000) -> None:
+    """ Memory retained by a batch of similar programs, with and without interning their subtrees. """
+    from hashcons import Interner
+
+    brewparse.disable_cache()
+    programs = [sample_program(2 + i % 4).replace("n * ", f"n * {i % 7} * ").replace("helper", f"h{i}_")
+                for i in range(num_programs)]
+    for form in ("element", "typed"):
+        results = {}
+        for label, make in (("plain", lambda: None), ("interned", Interner)):
+            tracemalloc.start()
+            interner = make()
+            trees = [brewparse.parse_program(program, backend="pratt", form=form, interner=interner)
+                     for program in programs]
+            retained = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            results[label] = (trees, retained, interner)
+        (plain, plain_size, _), (interned, interned_size, interner) = results["plain"], results["interned"]
+        assert all(str(a) == str(b) for a, b in zip(plain, interned))
+        stats = interner.stats()
+        print(f"{form:8} plain   : {plain_size / 2**20:6.1f} MiB retained")
+        print(f"{form:8} interned: {interned_size / 2**20:6.1f} MiB retained, {stats['shared']} of {stats['nodes']} "
+              f"nodes shared, {stats['saved_bytes'] / 2**20:.1f} MiB saved by the interner's count")
+
+
+def load_interpreter(version: int):
+    """ Import interpreterv<version> from its project directory; for v2, the revised interpreter with the env and
+    type modules it was written against. Versions share module names, so load only one per process. """
+    import importlib
+    import importlib.util
+
+    directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", f"project{version}")
+
+    def load(name, filename):
+        spec = importlib.util.spec_from_file_location(name, os.path.join(directory, filename))
+        module = sys.modules[name] = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+    if version == 2:
+        load("type", "type-revised.py")
+        load("env", "env-revised.py")
+        return load("interpreterv2", "interpreterv2-revised.py")
+    sys.path.insert(0, directory)
+    return importlib.import_module(f"interpreterv{version}")
+
+
+def print_phases(version: int, sizes: tuple[int, ...]) -> None:
+    """ Time and peak memory of lexing, parsing and running generated programs of growing size. """
+    import brewgen
+
+    brewparse.disable_cache()
+    interpreter = load_interpreter(version)
+
+    def run(ast):
+        interpreter.parse_program = lambda program: ast
+        interpreter.Interpreter(console_output=False).run("")
+
+    rows = {"lex": [], "parse": [], "run": []}
+    for size in sizes:
+        program = brewgen.generate(version, functions=size, exceptions=0.2, seed=size)
+        ast = brewparse.parse_program(program)
+        phases = (("lex", lambda: brewlex.tokenize(program)), ("parse", lambda: brewparse.parse_program(program)),
+                  ("run", lambda: run(ast)))
+        for phase, fn in phases:
+            elapsed = timed(fn, 3)
+            _, peak = measure(fn)
+            rows[phase].append((elapsed, peak))
+    print(f"v{version} functions  : " + "".join(f"{size:>17}" for size in sizes) + "   growth")
+    for phase, row in rows.items():
+        # the growth exponent is the slope of the log-log plot between the smallest and the largest size
+        growth = math.log(row[-1][0] / row[0][0]) / math.log(sizes[-1] / sizes[0])
+        print(f"v{version} {phase:12}: " + "".join(f"{t * 1000:8.1f} ms {m / 2**20:5.1f} M" for t, m in row)
+              + f"   n^{growth:.2f}")
+
+
+def bench_scaling(sizes: tuple[int, ...] = (25, 50, 100, 200, 400)) -> None:
+    """ How lexing, parsing and interpreting v2, v3 and v4 programs from brewgen scale with program size. """
+    import brewgen
+
+    for version in brewgen.VERSIONS:
+        # a fresh process per version, the interpreters' modules share names
+        subprocess.run([sys.executable, "-c", f"import benchmark; benchmark.print_phases({version}, {sizes!r})"],
+                       cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+
+
+BENCHMARKS = {
+    "cache": bench_cache,
+    "startup": bench_startup,
+    "threads": bench_threads,
+    "stream": bench_stream,
+    "pratt": bench_pratt,
+    "driver": bench_driver,
+    "incremental": bench_incremental,
+    "spans": bench_spans,
+    "nodes": bench_nodes,
+    "flat": bench_flat,
+    "tokenize": bench_tokenize,
+    "pathological": bench_pathological,
+    "validate": bench_validate,
+    "bulk": bench_bulk,
+    "hashcons": bench_hashcons,
+    "scaling": bench_scaling,
+}
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print(f"== {name} ==")
+        BENCHMARKS[name]()
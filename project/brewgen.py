@@ -0,0 +1,221 @@
+""" Synthetic Brewin programs for scaling benchmarks. Run with: python brewgen.py [version] [functions] [seed] """
+import random
+import sys
+
+VERSIONS = (2, 3, 4)  # v2: untyped; v3: typed, with structs; v4: untyped, lazy, with exceptions
+
+_LIMIT = 100000  # accumulators are divided down past this, so values stay small whatever the trip counts
+_LEAVES = 3  # small functions every generated function may call, which keeps the call graph shallow
+
+
+def generate(version: int = 3, functions: int = 20, depth: int = 2, trips: int = 10, structs: int = 2,
+             exceptions: float = 0.0, lazy_chain: int = 10, seed: int = 0) -> str:
+    """ A syntactically and semantically valid program for interpreter v2, v3 or v4 that runs to completion and
+    prints one line per generated function plus a final total. The knobs:
+
+    functions   number of generated functions, each called once from main
+    depth       nesting of control flow in a function body, alternating for loops and if/else
+    trips       iterations of every for loop; a body nested d levels deep runs about trips ** ceil(d / 2) times
+    structs     v3: number of struct types, each with a peer field of the one before; every function builds and
+                walks a list of trips nodes of one of them (ignored by v2 and v4)
+    exceptions  v4: chance that a block holds a try statement that raises, or divides by zero (ignored otherwise)
+    lazy_chain  length of a chain of variables each defined from the previous one, printed at the end of main;
+                in v4 nothing is evaluated until the print, which then recurses through the whole chain
+
+    The same arguments always give the same program. """
+    if version not in VERSIONS:
+        raise ValueError(f"Unknown Brewin version: {version}")
+    return _Generator(version, depth, trips, structs if version == 3 else 0,
+                      exceptions if version == 4 else 0.0, random.Random(seed)).program(functions, lazy_chain)
+
+
+class _Generator:
+    def __init__(self, version: int, depth: int, trips: int, structs: int, exceptions: float, rng: random.Random):
+        self.version = version
+        self.depth = depth
+        self.trips = trips
+        self.structs = structs
+        self.exceptions = exceptions
+        self.rng = rng
+        self.lines: list[str] = []
+        self.indent = 0
+
+    # ---- output ----
+
+    def emit(self, line: str) -> None:
+        self.lines.append("  " * self.indent + line)
+
+    def open(self, line: str) -> None:
+        self.emit(line + " {")
+        self.indent += 1
+
+    def close(self) -> None:
+        self.indent -= 1
+        self.emit("}")
+
+    def typed(self, name: str, var_type: str = "int") -> str:
+        return f"{name}: {var_type}" if self.version == 3 else name
+
+    def returns(self, return_type: str) -> str:
+        return f": {return_type}" if self.version == 3 else ""
+
+    # ---- program ----
+
+    def program(self, functions: int, lazy_chain: int) -> str:
+        for k in range(self.structs):
+            peer = f"s{max(k - 1, 0)}"  # a field's struct type must be defined before it, or be its own
+            self.emit(f"struct s{k} {{ value: int; next: s{k}; peer: {peer}; }}")
+        for k in range(_LEAVES):
+            self.emit("")
+            self.open(f"func leaf{k}({self.typed('n')}){self.returns('int')}")
+            self.emit(f"return n * {k + 2} - {k + 1};")
+            self.close()
+        for k in range(functions):
+            self.emit("")
+            self.function(k)
+        self.emit("")
+        self.main(functions, lazy_chain)
+        return "\n".join(self.lines) + "\n"
+
+    def main(self, functions: int, lazy_chain: int) -> None:
+        self.open(f"func main(){self.returns('void')}")
+        self.emit(f"var {self.typed('total')};")
+        for k in range(lazy_chain + 1):
+            self.emit(f"var {self.typed(f'c{k}')};")
+        self.emit("total = 0;")
+        for k in range(functions):
+            self.emit(f"total = total + f{k}({k});")
+            self.emit(f"print(\"f{k} \", total);")  # also forces the lazy total in v4, keeping its closure chain short
+        self.emit("c0 = total;")
+        for k in range(1, lazy_chain + 1):
+            self.emit(f"c{k} = c{k - 1} + {self.rng.randint(1, 9)};")
+        self.emit(f"print(\"total \", c{lazy_chain});")
+        self.close()
+
+    def function(self, k: int) -> None:
+        self.open(f"func f{k}({self.typed('n')}){self.returns('int')}")
+        self.emit(f"var {self.typed('acc')};")
+        self.emit(f"var {self.typed('t')};")
+        for level in range(0, max(self.depth, 1), 2):  # i0 is also the struct walk's counter
+            self.emit(f"var {self.typed(f'i{level}')};")
+        if self.structs:
+            struct = f"s{k % self.structs}"
+            for name in ("p", "q"):
+                self.emit(f"var {self.typed(name, struct)};")
+        self.emit(f"acc = n + {k};")
+        self.emit("t = 0;")
+        self.block(0)
+        if self.structs:
+            self.struct_walk(k % self.structs)
+        self.emit("return acc;")
+        self.close()
+
+    # ---- statements ----
+
+    def block(self, level: int) -> None:
+        """ A few statements that update acc, with the nested control flow for the next level. """
+        rng = self.rng
+        self.bound()
+        self.emit(f"acc = {self.expression(level, 2)};")
+        if rng.random() < 0.5:
+            self.emit(f"t = leaf{rng.randrange(_LEAVES)}({self.expression(level, 1)});")
+            self.emit(f"acc = acc + t / {rng.randint(2, 9)};")
+        if self.exceptions and rng.random() < self.exceptions:
+            self.try_statement(level)
+        if level < self.depth:
+            if level % 2 == 0:
+                counter = f"i{level}"
+                self.open(f"for ({counter} = 0; {counter} < {self.trips}; {counter} = {counter} + 1)")
+                self.block(level + 1)
+                self.close()
+            else:
+                self.open(f"if ({self.condition(level)})")
+                self.block(level + 1)
+                self.close()
+                self.open("else")
+                self.emit(f"acc = acc - {rng.randint(1, 9)};")
+                self.close()
+
+    def bound(self) -> None:
+        # comparing acc also evaluates it in v4, so a loop never builds a long chain of closures
+        self.open(f"if (acc > {_LIMIT} || acc < -{_LIMIT})")
+        self.emit(f"acc = acc / {self.rng.randint(7, 13)};")
+        self.close()
+
+    def try_statement(self, level: int) -> None:
+        rng = self.rng
+        self.open("try")
+        if rng.random() < 0.5:
+            self.open(f"if ({self.condition(level)})")
+            self.emit('raise "big";')
+            self.close()
+            self.emit(f"acc = acc + {rng.randint(1, 9)};")
+        else:
+            # raised when the if below evaluates acc
+            self.emit(f"acc = acc + {rng.randint(1, 9)} / (t - t);")
+            self.open("if (acc > 0)")
+            self.emit("acc = acc + 1;")
+            self.close()
+        self.close()
+        self.open('catch "big"')
+        self.emit("acc = acc / 2;")
+        self.close()
+        self.open('catch "div0"')
+        self.emit(f"acc = n + {rng.randint(1, 9)};")  # acc itself would raise again
+        self.close()
+
+    def struct_walk(self, k: int) -> None:
+        """ Build a list of trips s<k> nodes, each with a peer of the previous struct type, then sum it up. """
+        peer = f"s{max(k - 1, 0)}"
+        self.emit(f"p = new s{k};")
+        self.emit("q = p;")
+        self.open(f"for (i0 = 0; i0 < {self.trips}; i0 = i0 + 1)")
+        self.emit(f"q.next = new s{k};")
+        self.emit("q = q.next;")
+        self.emit("q.value = i0 + acc / 3;")
+        self.emit(f"q.peer = new {peer};")
+        self.emit("q.peer.value = q.value * 2;")
+        self.close()
+        self.open("for (q = p.next; q != nil; q = q.next)")
+        self.emit("acc = acc + q.value / 5 - q.peer.value / 11;")
+        self.close()
+        self.bound()
+
+    # ---- expressions ----
+
+    def operand(self, level: int) -> str:
+        rng = self.rng
+        names = ["acc", "n", "t"] + [f"i{counter}" for counter in range(0, min(level, self.depth), 2)]
+        if rng.random() < 0.3:
+            return str(rng.randint(0, 20))
+        return rng.choice(names)
+
+    def expression(self, level: int, size: int) -> str:
+        """ An int expression over the variables in scope; division is by nonzero constants only. """
+        rng = self.rng
+        if size <= 0:
+            return self.operand(level)
+        left = self.expression(level, size - 1)
+        op = rng.choice("+-*/")
+        if op == "/":
+            return f"{left} / {rng.randint(2, 9)}"
+        if op == "*":
+            return f"{left} * {rng.randint(1, 3)}"  # keeps products small
+        return f"({left} {op} {self.expression(level, size - 1)})"
+
+    def condition(self, level: int) -> str:
+        rng = self.rng
+        comparison = (f"{self.expression(level, 1)} {rng.choice(('<', '<=', '>', '>=', '==', '!='))} "
+                      f"{rng.randint(-50, 50)}")
+        kind = rng.random()
+        if kind < 0.2:
+            return f"!({comparison})"
+        if kind < 0.4:
+            return f"{comparison} && {self.operand(level)} != {rng.randint(0, 20)}"
+        if kind < 0.6:
+            return f"{comparison} || {self.operand(level)} == {rng.randint(0, 20)}"
+        return comparison
+
+
+if __name__ == "__main__":
+    sys.stdout.write(generate(**dict(zip(("version", "functions", "seed"), map(int, sys.argv[1:4])))))
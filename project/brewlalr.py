@@ -0,0 +1,141 @@
+import gc
+import threading
+
+from brewlex import Tokens
+
+_END = (1 << 64) - 1  # the end line and column of a packed span
+
+
+class LALRDriver:
+    """ LALR driver specialized for the Brewin grammar, in place of ply.yacc.LRParser.parseopt_notrack. The PLY
+    tables are turned into lists indexed by state and terminal (or nonterminal) number, the symbol stacks are plain
+    lists of states, values and packed spans, and every reduction calls the p_ function directly with a
+    list as its p: the actions only index p and take its length, so no YaccSymbol or YaccProduction is made.
+
+    Spans are recorded as brewparse._spanned does. parse() returns None on the first syntax error without
+    reporting it; the caller reruns the program through PLY for p_error's messages and its error recovery, which
+    repeats the work up to the error, and only for programs that have one.
+
+    The cyclic garbage collector is paused while the driver runs: the nodes it allocates by the thousand are all
+    reachable from its stacks, so every collection the allocations trigger walks the growing tree and frees
+    nothing, and those collections took as much time as the parse itself. Reference counting still frees what
+    the actions drop. The driver only reads its tables, so one instance serves every thread. """
+    def __init__(self, lrparser):
+        terminals: dict[str, int] = {}
+        nonterminals: dict[str, int] = {}
+        for row in lrparser.action.values():
+            for name in row:
+                terminals.setdefault(name, len(terminals))
+        for row in lrparser.goto.values():
+            for name in row:
+                nonterminals.setdefault(name, len(nonterminals))
+        num_states = max(max(lrparser.action), max(lrparser.goto)) + 1
+        width = len(terminals) + 1  # the last column is for token types the grammar does not know: always an error
+        self.terminals = terminals
+        self.unknown = len(terminals)
+        self.end = terminals["$end"]
+        self.actions: list[list[int|None]] = [[None] * width for _ in range(num_states)]
+        for state, row in lrparser.action.items():
+            for name, action in row.items():
+                self.actions[state][terminals[name]] = action
+        self.gotos: list[list[int|None]] = [[None] * len(nonterminals) for _ in range(num_states)]
+        for state, row in lrparser.goto.items():
+            for name, target in row.items():
+                self.gotos[state][nonterminals[name]] = target
+        # production number -> (length, left-hand side, p_ function); production 0 (S' -> program) only accepts
+        self.productions: list[tuple[int, int, object]] = [
+            (production.len, nonterminals.get(production.name, -1),
+             getattr(production.callable, "__wrapped__", production.callable))
+            for production in lrparser.productions
+        ]
+        if any(length == 0 for length, _, _ in self.productions):
+            raise ValueError("Empty productions are not supported")  # Brewin has none, reductions assume a symbol
+
+    def parse(self, tokens: Tokens):
+        """ The value of the start symbol, or None if the tokens are not a valid program. """
+        _pause_gc()
+        try:
+            return self._parse(tokens)
+        finally:
+            _resume_gc()
+
+    def _parse(self, tokens: Tokens):
+        terminals, unknown = self.terminals, self.unknown
+        codes = [terminals.get(tok_type, unknown) for tok_type in tokens.types]
+        codes.append(self.end)
+        token_values, linenos, columns, end_columns = tokens.values, tokens.linenos, tokens.columns, tokens.end_columns
+        actions, gotos, productions = self.actions, self.gotos, self.productions
+
+        # the bottom entries stand below the first symbol, so p can be sliced from values including the slot for p[0]
+        states = [0]
+        values = [None]
+        spans = [0]  # each symbol's span, packed as element.pack_span does
+        i = 0
+        code = codes[0]
+        state = 0
+        while True:
+            action = actions[state][code]
+            if action is None:
+                return None
+            if action > 0:  # shift
+                state = action
+                states.append(state)
+                values.append(token_values[i])
+                lineno = linenos[i] << 32
+                spans.append((lineno | columns[i]) << 64 | lineno | end_columns[i])
+                i += 1
+                code = codes[i]
+            elif action < 0:  # reduce
+                length, lhs, func = productions[-action]
+                p = values[-length - 1:]
+                p[0] = None
+                func(p)
+                result = p[0]
+                # from the start of the first symbol to the end of the last one
+                span = spans[-length] >> 64 << 64 | spans[-1] & _END
+                # the first production to build a node sets its span: a parenthesized expression keeps the inner one
+                if getattr(result, "_span", False) is None:
+                    result._span = span
+                values[-length:] = (result,)
+                spans[-length:] = (span,)
+                state = gotos[states[-length - 1]][lhs]
+                states[-length:] = (state,)
+            else:  # accept
+                return values[-1]
+
+
+_paused = 0  # parses running with the collector paused by _pause_gc
+_resumes = False  # whether the last of them enables it again (it was enabled when the first one started)
+_gc_lock = threading.Lock()
+
+
+def _pause_gc() -> None:
+    global _paused, _resumes
+    with _gc_lock:
+        if not _paused:
+            _resumes = gc.isenabled()
+            gc.disable()
+        _paused += 1
+
+
+def _resume_gc() -> None:
+    global _paused
+    with _gc_lock:
+        _paused -= 1
+        if not _paused and _resumes:
+            gc.enable()
+
+
+_driver = None
+_driver_lock = threading.Lock()
+
+
+def get_driver() -> LALRDriver:
+    """ The driver over brewparse's LALR tables, built on first use. """
+    global _driver
+    if _driver is None:
+        with _driver_lock:
+            if _driver is None:
+                import brewparse
+                _driver = LALRDriver(brewparse.get_parser())
+    return _driver
@@ -1,5 +1,9 @@
 
-from ply import lex
+import sys
+import threading
+from array import array
+
+import tables
 
 reserved = (
     "VAR",
@@ -107,6 +111,7 @@ def t_NUMBER(t):
 def t_NAME(t):
     r"[A-Za-z_][\w_]*"
     t.type = reserved_map.get(t.value, "NAME")
+    t.value = sys.intern(t.value)  # identifiers are compared and hashed over and over by the interpreters
     return t
 
 def t_newline(t):
@@ -115,12 +120,29 @@ def t_newline(t):
 
 
 def t_comment(t):
-    r"/\*(.|\n)*?\*/"
-    t.lexer.lineno += t.value.count("\n")
+    r"/\*"
+    # only the opening is matched and the end is found with str.find: a rule like /\*(.|\n)*?\*/ crawls through
+    # long comments, and rescans the rest of the input for every /* when a comment is never closed
+    lexer = t.lexer
+    data, start = lexer.lexdata, lexer.lexpos
+    unterminated = getattr(lexer, "unterminated_comment", None)
+    if unterminated is not None and unterminated[0] is data and start >= unterminated[1]:
+        end = -1  # a later search cannot succeed where an earlier one failed
+    else:
+        end = data.find("*/", start)
+        if end < 0:
+            lexer.unterminated_comment = (data, start)
+    if end < 0:
+        # not a comment after all: the "/" is a DIVIDE as it always was, and lexing carries on at the "*"
+        lexer.lexpos = start - 1
+        t.type, t.value = "DIVIDE", "/"
+        return t
+    lexer.lineno += data.count("\n", start, end)
+    lexer.lexpos = end + 2
 
 
 def t_STRING(t):
-    r'".*?"'
+    r'"[^"\n]*"'
     t.value = t.value[1:-1]
     return t
 
@@ -130,7 +152,228 @@ def t_error(t):
     t.lexer.skip(1)
 
 def reset_lineno():
-    lexer.lineno = 1
+    get_lexer().lineno = 1
+
+
+_lexer = None
+_lexer_lock = threading.Lock()
+
+
+def get_lexer():
+    """ Build the lexer on first use, from a prebuilt table when one exists for the current rules.
+    This is the shared module-level lexer; concurrent parsers work on clones of it. """
+    global _lexer
+    if _lexer is None:
+        with _lexer_lock:
+            if _lexer is None:
+                _lexer = _build_lexer()
+    return _lexer
+
+
+def _build_lexer():
+    from ply import lex  # deferred, importing PLY is a good part of the start-up cost
+
+    module = sys.modules[__name__]
+    tabname = "brewlex_" + tables.lexer_signature(vars(module))[:16]
+
+    tabfile = tables.find_table(tabname + ".py")
+    if tabfile is not None:
+        try:
+            return lex.lex(optimize=True, lextab=tables.load_module(tabfile, tabname))
+        except (ImportError, SyntaxError, AttributeError, KeyError):
+            pass  # unreadable table, rebuild it below
+
+    # rules are collected from this module's globals; string rules keep their definition order
+    lexer = lex.lex()
+    outputdir = tables.cache_dir()
+    if outputdir is not None:  # otherwise read-only everywhere, keep the in-memory lexer only
+        try:
+            lexer.writetab(tabname, outputdir)
+        except OSError:
+            pass
+    return lexer
+
+
+class Tokens:
+    """ All tokens of a program as parallel arrays, as produced by tokenize(). Iterating yields LexTokens
+    equal to what the PLY lexer returns for the same input, plus the columns each token starts and ends at
+    (column, endlineno, endcolumn). Columns count from 0, and an end column is just past the token. """
+    __slots__ = ("types", "values", "linenos", "positions", "columns", "end_columns")
+
+    def __init__(self, types: list[str], values: list, linenos: array, positions: array, columns: array,
+                 end_columns: array):
+        self.types = types
+        self.values = values
+        self.linenos = linenos
+        self.positions = positions
+        self.columns = columns
+        self.end_columns = end_columns
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def __iter__(self):
+        from ply.lex import LexToken
+
+        for tok_type, value, lineno, lexpos, column, end_column in zip(self.types, self.values, self.linenos,
+                                                                       self.positions, self.columns, self.end_columns):
+            tok = LexToken()
+            tok.type, tok.value, tok.lineno, tok.lexpos = tok_type, value, lineno, lexpos
+            tok.column, tok.endlineno, tok.endcolumn = column, lineno, end_column  # no token spans lines
+            yield tok
+
+
+# what tokenize() does for each rule function; a rule not listed here sends tokenize() down the PLY path
+_TOKEN, _LINES, _NUMBER, _NAME, _STRING, _COMMENT = range(6)
+_FAST_RULES = {
+    "t_NUMBER": _NUMBER,
+    "t_NAME": _NAME,
+    "t_newline": _LINES,
+    "t_comment": _COMMENT,
+    "t_STRING": _STRING,
+}
+
+_scanner = None
+_scanner_lock = threading.Lock()
+
+
+def _get_scanner():
+    """ One compiled regex for tokenize(): the ignored characters, then the lexer's master regex, so rules are
+    tried in exactly the order PLY tries them. Returns (pattern, actions), or None if a rule has no fast path. """
+    global _scanner
+    if _scanner is None:
+        with _scanner_lock:
+            if _scanner is None:
+                _scanner = _build_scanner()
+    return _scanner or None
+
+
+def _build_scanner():
+    import re
+
+    lexer = get_lexer()
+    if len(lexer.lexre) != 1:  # PLY splits very large rule sets over several regexes
+        return ()
+    master, lexindexfunc = lexer.lexre[0]
+    # ignored characters are folded into the following token's match, which halves the number of matches.
+    # Possessive, so they are never given back to a rule like t_DOT
+    ignore = "".join("\\" + c if c in "\\]^-" else c for c in lexer.lexignore)
+    pattern = re.compile(f"[{ignore}]*+(?:{master.pattern})" if ignore else master.pattern, lexer.lexreflags)
+    actions = [None]  # group 0
+    for entry in lexindexfunc[1:]:
+        if entry is None:
+            actions.append(None)  # a group nested inside a rule, never the last one matched
+            continue
+        func, tok_type = entry
+        if func is None:
+            actions.append((_TOKEN, tok_type))
+        elif func.__name__ in _FAST_RULES:
+            actions.append((_FAST_RULES[func.__name__], tok_type))
+        else:
+            return ()
+    return pattern, actions
+
+
+def tokenize(program: str, lineno: int = 1, pos: int = 0, endpos: int|None = None) -> Tokens:
+    """ Tokenize a whole program in one pass. Same tokens and line numbers as the PLY lexer, without creating
+    a LexToken per token or dispatching to the t_ functions. pos and endpos limit lexing to a slice of program
+    (lineno is the line at pos), while token offsets stay relative to the whole string. """
+    scanner = _get_scanner()
+    if endpos is None:
+        endpos = len(program)
+    if scanner is None:
+        return _tokenize_ply(program, lineno, pos, endpos)
+    pattern, actions = scanner
+    first_lineno, first_pos = lineno, pos
+    line_start = program.rfind("\n", 0, pos) + 1
+    reserved_get = reserved_map.get
+    intern = sys.intern
+    types, values, linenos, positions, columns, end_columns = [], [], [], [], [], []
+    add_type, add_value, add_lineno, add_position, add_column, add_end_column = (
+        types.append, values.append, linenos.append, positions.append, columns.append, end_columns.append)
+    unterminated = endpos  # no comment opened at or after this offset is closed, as in t_comment
+    matches = pattern.finditer(program, pos, endpos)
+    while matches is not None:
+        for m in matches:
+            start, end = m.span()
+            if start != pos:
+                return _tokenize_ply(program, first_lineno, first_pos, endpos)  # only literals or t_error handle it
+            pos = end
+            i = m.lastindex
+            action, tok_type = actions[i]
+            if action == _LINES:
+                lineno += m.group(i).count("\n")
+                line_start = end
+                continue
+            if action == _COMMENT:
+                # skip to the end of the comment, or lex the "/" as DIVIDE if it is never closed
+                opening = m.start(i)
+                close = -1 if opening >= unterminated else program.find("*/", end, endpos)
+                if close < 0:
+                    unterminated = min(unterminated, opening)
+                    add_type("DIVIDE")
+                    add_value("/")
+                    add_lineno(lineno)
+                    add_position(opening)
+                    add_column(opening - line_start)
+                    add_end_column(opening + 1 - line_start)
+                    pos = opening + 1
+                else:
+                    newlines = program.count("\n", end, close)
+                    if newlines:
+                        lineno += newlines
+                        line_start = program.rfind("\n", end, close) + 1
+                    pos = close + 2
+                matches = pattern.finditer(program, pos, endpos)
+                break
+            value = m.group(i)
+            if action == _NAME:
+                tok_type = reserved_get(value, "NAME")
+                value = intern(value)
+            elif action == _NUMBER:
+                value = int(value)
+            elif action == _STRING:
+                value = value[1:-1]
+            add_type(tok_type)
+            add_value(value)
+            add_lineno(lineno)
+            start = m.start(i)
+            add_position(start)
+            add_column(start - line_start)
+            add_end_column(end - line_start)
+        else:
+            matches = None
+    if program[pos:endpos].strip(get_lexer().lexignore):
+        return _tokenize_ply(program, first_lineno, first_pos, endpos)
+    return Tokens(types, values, array("I", linenos), array("I", positions), array("I", columns),
+                  array("I", end_columns))
+
+
+def _tokenize_ply(program: str, lineno: int, pos: int, endpos: int) -> Tokens:
+    lexer = get_lexer().clone()
+    lexer.lineno = lineno
+    lexer.input(program[pos:endpos])
+    types, values, linenos, positions, columns, end_columns = [], [], [], [], [], []
+    line_start = program.rfind("\n", 0, pos) + 1
+    searched = pos  # no newline between line_start and here
+    for tok in lexer:
+        start = pos + tok.lexpos
+        newline = program.rfind("\n", searched, start)
+        if newline >= 0:
+            line_start = newline + 1
+        searched = start
+        types.append(tok.type)
+        values.append(tok.value)
+        linenos.append(tok.lineno)
+        positions.append(start)
+        columns.append(start - line_start)
+        end_columns.append(pos + lexer.lexpos - line_start)  # the lexer stops right after the token it returns
+    return Tokens(types, values, array("I", linenos), array("I", positions), array("I", columns),
+                  array("I", end_columns))
+
 
-# Build the lexer
-lexer = lex.lex()
+def __getattr__(name):
+    # the lexer used to be built at import time; keep `brewlex.lexer` working
+    if name == "lexer":
+        return get_lexer()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
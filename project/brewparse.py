@@ -1,7 +1,20 @@
-from element import Element
+import copy
+import os
+import sys
+import threading
+
+import tables
+from element import DottedName, Element
 from brewlex import *
 from intbase import InterpreterBase
-from ply import yacc
+
+# bump whenever the shape of the generated Element tree changes for a reason the AST cache cannot see (it already
+# keys its entries on the source of TREE_MODULES), so cached trees are invalidated
+AST_VERSION = 3
+
+# the modules whose code decides what tree a program parses to: the grammar and its actions, the lexer rules and
+# identifier interning, both parser backends and the node classes of every form
+TREE_MODULES = ["brewparse", "brewlex", "brewlalr", "brewpratt", "element", "nodes", "flatast"]
 
 # Parsing rules
 
@@ -114,7 +127,8 @@ def p_variable_w_dot(p):
     """variable_w_dot : variable_w_dot DOT NAME
     | NAME"""
     if len(p) == 4:
-        p[0] = p[1] + "." + p[3]
+        path = p[1].path if isinstance(p[1], DottedName) else (p[1],)
+        p[0] = DottedName(path + (p[3],))
     else:
         p[0] = p[1]
 
@@ -255,20 +269,342 @@ def p_expression_args(p):
 
 
 def p_error(p):
+    print(syntax_error_message(p))
+
+
+def syntax_error_message(p) -> str:
     if p:
-        print(f"Syntax error at '{p.value}' on line {p.lineno}")
-    else:
-        print("Syntax error at EOF")
+        return f"Syntax error at '{p.value}' on line {p.lineno}"
+    return "Syntax error at EOF"
+
+
+_cache = None
+
+
+def enable_cache(cache_dir=None, max_entries=128):
+    """ Cache parsed programs by source hash. With a cache_dir, trees are also persisted across processes. """
+    from astcache import ASTCache
+
+    global _cache
+    _cache = ASTCache(tree_signature(), cache_dir, max_entries)
+    return _cache
+
+
+def tree_signature() -> str:
+    """ Signature of everything a parsed tree depends on, for the AST cache: the grammar, the token rules, and
+    the source of TREE_MODULES, so an edited rule action or lexer function never serves a stale tree. """
+    import hashlib
+
+    parts = [tables.grammar_signature(globals()), tables.lexer_signature(vars(sys.modules["brewlex"])),
+             tables.source_signature(TREE_MODULES)]
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def disable_cache():
+    global _cache
+    _cache = None
+
+
+def cache_stats():
+    return _cache.stats() if _cache is not None else None
 
 
 # exported function
-def parse_program(program):
-    reset_lineno()
-    ast = yacc.parse(program)
+def parse_program(program, backend="lalr", previous=None, form="element", interner=None, on_error=None):
+    """ Parse a Brewin program into an Element tree. backend selects the LALR parser ("lalr": PLY's tables, run by
+    the driver in brewlalr) or the hand-written recursive descent parser in brewpratt ("pratt"); both build
+    identical trees.
+
+    Every node records where it is in the source as span = (start line, start column, end line, end column), and
+    lineno is its start line, which the interpreters pass to error().
+
+    form="typed" returns the compact __slots__ node classes from nodes.py instead of Element, and form="flat"
+    a flatast.FlatAST that packs the whole tree into a few arrays. Both have the same get()/elem_type interface,
+    so every interpreter accepts any form.
+
+    previous is an earlier result of parse_program for an edited version of the program. The func and struct
+    subtrees whose source text did not change are reused, and only the modified definitions are parsed again;
+    the returned program node then records reused_definitions and parsed_definitions for the call.
+
+    interner is a hashcons.Interner: structurally identical subtrees are then shared within the program and with
+    every other program parsed with the same interner. Interned trees bypass the cache.
+
+    on_error is called with the message of each syntax error, which is printed otherwise. PLY may recover from an
+    error and still return a tree; such trees are not cached. """
+    if backend not in ("lalr", "pratt"):
+        raise ValueError(f"Unknown parser backend: {backend}")
+    if form in ("element", "flat"):
+        node = Element  # a flat AST is packed from the Element tree
+    elif form == "typed":
+        from nodes import make_node as node
+    else:
+        raise ValueError(f"Unknown AST form: {form}")
+    variant = "" if form == "element" else form
+    if interner is not None and form == "flat":
+        raise ValueError("Flat ASTs cannot be interned")
+    cache = _cache if interner is None else None
+
+    if cache is not None:
+        ast = cache.get(program, variant)
+        if ast is not None:
+            ast = _own_program(ast, node, form)
+            ast.source = program
+            if previous is not None:
+                ast.reused_definitions = len(ast.get("structs")) + len(ast.get("functions"))
+                ast.parsed_definitions = 0
+            return ast
+
+    ast = None
+    if previous is not None and form != "flat" and isinstance(previous, Element) == (node is Element):
+        import incremental
+        ast = incremental.reparse(program, previous, node)
+    if ast is None and backend == "pratt":
+        import brewpratt
+        try:
+            ast = brewpratt.parse(program, node)
+        except (SyntaxError, RecursionError):
+            pass  # report the error (or handle very deep nesting) with the LALR parser below
+
+    errors = 0
     if ast is None:
-        raise SyntaxError("Syntax error")
+        def report(message):
+            nonlocal errors
+            errors += 1
+            if on_error is None:
+                print(message)
+            else:
+                on_error(message)
+
+        parser = _pool.acquire()
+        try:
+            ast = parser.parse(program, report)
+        finally:
+            _pool.release(parser)
+        if node is not Element:
+            import nodes
+            ast = nodes.from_element(ast)
+    if form == "flat":
+        import flatast
+        ast = flatast.from_element(ast)
+    elif interner is not None:
+        ast = interner.intern(ast)
+
+    if previous is not None:
+        reused = getattr(ast, "reused_definitions", 0)  # set by incremental.reparse, 0 when parsed from scratch
+        parsed = len(ast.get("structs")) + len(ast.get("functions")) - reused
+    if cache is not None and not errors:
+        cache.put(program, ast, variant)
+        ast = _own_program(ast, node, form)  # the cached tree is shared from now on
+    ast.source = program  # lets the tree serve as previous for the next edit, kept out of the disk cache
+    if previous is not None:
+        ast.reused_definitions, ast.parsed_definitions = reused, parsed
     return ast
 
 
-# generate our parser
-yacc.yacc() # yacc.yacc(debug=True, debuglog=open("parse.log", "w"))
+def _own_program(ast, node, form: str):
+    """ A program node for one call over a cached tree, sharing all of its children: what the call records on it
+    (source and the incremental statistics) never reaches the cache or the other callers. """
+    if form == "flat":
+        import flatast
+        own = flatast.FlatAST(ast.kinds, ast.offsets, ast.words, ast.blob, ast.string_offsets, ast.spans)
+        own._strings, own._dotted, own._mmap = ast._strings, ast._dotted, ast._mmap
+        return own
+    own = node(InterpreterBase.PROGRAM_NODE, structs=ast.get("structs"), functions=ast.get("functions"))
+    own._span = ast._span
+    if hasattr(ast, "definitions"):
+        own.definitions = ast.definitions  # split from the same source text
+    return own
+
+
+def parse_file(source, chunk_size=None):
+    """ Like parse_program, but lexes the source incrementally (see brewstream.StreamLexer). Not cached. """
+    parser = _pool.acquire()
+    try:
+        return parser.parse_file(source, chunk_size)
+    finally:
+        _pool.release(parser)
+
+
+def validate_program(program: str) -> tuple[int, int]|None:
+    """ Check the syntax of a program without building its tree: the LALR tables are driven directly, with no
+    p_ actions, symbols or Elements. Return None if the program has no syntax errors, otherwise the (line, column)
+    of the first token the grammar rejects, or of the end of the program if it ends too early. A program with
+    errors may still get a tree from parse_program, when PLY's error recovery gets past them. """
+    actions, gotos, reductions = _get_validator()
+    tokens = tokenize(program)
+    types = tokens.types
+    count = len(types)
+    states = [0]
+    i = 0
+    tok_type = types[0] if count else "$end"
+    while True:
+        action = actions[states[-1]].get(tok_type)
+        if action is None:
+            if i < count:
+                return tokens.linenos[i], tokens.columns[i]
+            return program.count("\n") + 1, len(program) - program.rfind("\n") - 1
+        if action > 0:  # shift
+            states.append(action)
+            i += 1
+            tok_type = types[i] if i < count else "$end"
+        elif action < 0:  # reduce
+            length, name = reductions[-action]
+            if length:
+                del states[-length:]
+            states.append(gotos[states[-1]][name])
+        else:  # accept
+            return None
+
+
+_validator = None
+
+
+def _get_validator():
+    # the parser's tables, with each production reduced to what the validator needs: its length and name
+    global _validator
+    if _validator is None:
+        lrparser = get_parser()
+        reductions = [(production.len, production.name) for production in lrparser.productions]
+        _validator = (lrparser.action, lrparser.goto, reductions)
+    return _validator
+
+
+class Parser:
+    """ A reentrant parser. Each instance owns a clone of the lexer and its own LRParser over the shared
+    (read-only) LALR tables, so separate instances can parse concurrently. A single instance is not thread-safe. """
+    def __init__(self):
+        self.lexer = get_lexer().clone()
+        self.lrparser = copy.copy(get_parser())  # parse state lives on the instance, the tables are shared
+
+    def parse(self, program, on_error=None):
+        """ The tree of a program. on_error, if given, is called with the message of each syntax error instead of
+        p_error printing it. """
+        from brewlalr import get_driver
+
+        tokens = tokenize(program)  # one pass over the source
+        ast = get_driver().parse(tokens)
+        if ast is None:
+            ast = self.parse_ply(tokens, on_error)  # PLY reports the syntax error, and may recover from it
+        if ast is None:
+            raise SyntaxError("Syntax error")
+        return ast
+
+    def parse_ply(self, tokens, on_error=None):
+        """ Run PLY's own LALR driver over the tokens; LexTokens are only made as it reads them. """
+        tokens = iter(tokens)
+        if on_error is None:
+            return self.lrparser.parse(lexer=self.lexer, tokenfunc=lambda: next(tokens, None))
+        errorfunc = self.lrparser.errorfunc
+        self.lrparser.errorfunc = lambda p: on_error(syntax_error_message(p))  # this instance only
+        try:
+            return self.lrparser.parse(lexer=self.lexer, tokenfunc=lambda: next(tokens, None))
+        finally:
+            self.lrparser.errorfunc = errorfunc
+
+    def parse_file(self, source, chunk_size=None):
+        """ Parse straight from a path, memory map or file object without reading it into one string. """
+        from brewstream import CHUNK_SIZE, StreamLexer
+
+        lexer = StreamLexer(source, chunk_size or CHUNK_SIZE)
+        try:
+            ast = self.lrparser.parse(lexer=lexer)
+        finally:
+            lexer.close()
+        if ast is None:
+            raise SyntaxError("Syntax error")
+        return ast
+
+
+class ParserPool:
+    """ Keeps up to `size` idle Parser objects around for reuse across threads. """
+    def __init__(self, size=8):
+        self.size = size
+        self.idle: list[Parser] = []
+        self.lock = threading.Lock()
+
+    def acquire(self) -> Parser:
+        with self.lock:
+            if self.idle:
+                return self.idle.pop()
+        return Parser()
+
+    def release(self, parser: Parser) -> None:
+        with self.lock:
+            if len(self.idle) < self.size:
+                self.idle.append(parser)
+
+
+_pool = ParserPool()
+_parser = None
+_parser_lock = threading.Lock()
+
+
+def get_parser():
+    """ Build the parser on first use, loading the LALR tables from the table cache when they are current.
+    This is the template LRParser; use Parser (or parse_program) to actually parse. """
+    global _parser
+    if _parser is None:
+        with _parser_lock:
+            if _parser is None:
+                _parser = _build_parser()
+    return _parser
+
+
+def build():
+    """ Build the lexer and parser now instead of on the first parse_program call. """
+    get_lexer()
+    get_parser()
+
+
+def _build_parser():
+    import pickle
+    from ply import yacc  # deferred like the lexer, see brewlex._build_lexer
+
+    module = sys.modules[__name__]
+    tabname = "brewparse_" + tables.grammar_signature(vars(module))[:16] + ".pickle"
+
+    tabfile = tables.find_table(tabname)
+    if tabfile is not None:
+        try:
+            # skip yacc's grammar reflection entirely, the file name already pins the grammar
+            lr = yacc.LRTable()
+            lr.read_pickle(tabfile)
+            lr.bind_callables(vars(module))
+            return _record_spans(yacc.LRParser(lr, p_error))
+        except (ImportError, yacc.YaccError, EOFError, pickle.UnpicklingError, KeyError):
+            pass  # unreadable table, rebuild it below
+
+    outputdir = tables.cache_dir()
+    picklefile = os.path.join(outputdir, tabname) if outputdir is not None else None
+    # yacc.yacc(debug=True, debuglog=open("parse.log", "w"))
+    return _record_spans(yacc.yacc(debug=False, write_tables=False, picklefile=picklefile))
+
+
+def _record_spans(lrparser):
+    """ Wrap every production's action so each reduction records where its symbol starts and ends, and stores that
+    as the span of the node it built. Cheaper than parse(tracking=True), which also keeps lexpos for every symbol
+    and still knows nothing about where tokens end. """
+    for production in lrparser.productions:
+        if production.callable is not None:
+            production.callable = _spanned(production.callable)
+    return lrparser
+
+
+def _spanned(action):
+    def spanned_action(p):
+        action(p)
+        symbols = p.slice
+        first, last, result = symbols[1], symbols[-1], symbols[0]
+        result.lineno, result.column = first.lineno, first.column
+        result.endlineno, result.endcolumn = last.endlineno, last.endcolumn
+        # the first production to build a node sets its span: a parenthesized expression keeps the inner span
+        node = result.value
+        if getattr(node, "_span", False) is None:  # element.pack_span, inlined
+            node._span = first.lineno << 96 | first.column << 64 | last.endlineno << 32 | last.endcolumn
+    spanned_action.__wrapped__ = action  # brewlalr calls the action itself
+    return spanned_action
+
+
+# BREWIN_AST_CACHE=<dir> turns on the on-disk cache for every interpreter without code changes
+if os.environ.get("BREWIN_AST_CACHE"):
+    enable_cache(os.environ["BREWIN_AST_CACHE"])
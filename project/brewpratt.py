@@ -0,0 +1,303 @@
+from brewlex import Tokens, tokenize
+from element import DottedName, Element
+from intbase import InterpreterBase
+
+# binding power of each binary operator token, mirroring the precedence table in brewparse (all left associative)
+BINARY_PRECEDENCE = {
+    "OR": 1,
+    "AND": 2,
+    "GREATER_EQ": 3, "GREATER": 3, "LESS_EQ": 3, "LESS": 3, "EQ": 3, "NOT_EQ": 3,
+    "PLUS": 4, "MINUS": 4,
+    "MULTIPLY": 5, "DIVIDE": 5,
+}
+
+
+class PrattParser:
+    """ Hand-written recursive descent parser for Brewin, with precedence climbing for expressions.
+    Builds exactly the same Element tree as the LALR grammar in brewparse (spans included), without the table-driven
+    overhead, or the equivalent typed nodes when node is nodes.make_node. """
+    def __init__(self, tokens: Tokens, node=Element):
+        self.node = node  # node constructor, Element or nodes.make_node
+        self.types = tokens.types + ["$end"]
+        self.values = tokens.values
+        self.linenos = tokens.linenos
+        self.columns = tokens.columns
+        self.end_columns = tokens.end_columns
+        self.i = 0
+
+    # ---- token helpers ----
+
+    def peek(self, offset: int = 0) -> str:
+        i = self.i + offset
+        return self.types[i] if i < len(self.types) else "$end"
+
+    def advance(self):
+        """ Consume the current token and return its value. """
+        value = self.values[self.i]
+        self.i += 1
+        return value
+
+    def expect(self, tok_type: str):
+        if self.types[self.i] != tok_type:
+            self.error()
+        return self.advance()
+
+    def spanned(self, node, start: int):
+        """ Give node the span of the tokens from index start up to the last one consumed, like the LALR parser.
+        Packed as element.pack_span does, inlined. """
+        end = self.i - 1
+        linenos = self.linenos
+        node._span = linenos[start] << 96 | self.columns[start] << 64 | linenos[end] << 32 | self.end_columns[end]
+        return node
+
+    def error(self):
+        # silent: brewparse reruns erroneous programs through the LALR parser, so syntax error messages
+        # and PLY's error recovery behave exactly as before
+        lineno = self.linenos[self.i] if self.i < len(self.linenos) else None
+        raise SyntaxError("Syntax error", (None, lineno, None, None))
+
+    # ---- top level ----
+
+    def parse_program(self) -> Element:
+        start = self.i
+        structs = []
+        while self.peek() == "STRUCT":
+            structs.append(self.parse_struct())
+        functions = [self.parse_func()]
+        while self.peek() == "FUNC":
+            functions.append(self.parse_func())
+        if self.peek() != "$end":
+            self.error()
+        return self.spanned(self.node(InterpreterBase.PROGRAM_NODE, structs=structs, functions=functions), start)
+
+    def parse_struct(self) -> Element:
+        start = self.i
+        self.expect("STRUCT")
+        name = self.expect("NAME")
+        self.expect("LBRACE")
+        fields = []
+        while True:
+            field_start = self.i
+            field_name = self.expect("NAME")
+            self.expect("COLON")
+            var_type = self.expect("NAME")
+            self.expect("SEMI")
+            fields.append(self.spanned(self.node(InterpreterBase.FIELD_DEF_NODE, name=field_name, var_type=var_type),
+                                       field_start))
+            if self.peek() != "NAME":
+                break
+        self.expect("RBRACE")
+        return self.spanned(self.node(InterpreterBase.STRUCT_NODE, name=name, fields=fields), start)
+
+    def parse_func(self) -> Element:
+        start = self.i
+        self.expect("FUNC")
+        name = self.expect("NAME")
+        self.expect("LPAREN")
+        args = []
+        if self.peek() != "RPAREN":
+            args.append(self.parse_formal_arg())
+            while self.peek() == "COMMA":
+                self.advance()
+                args.append(self.parse_formal_arg())
+        self.expect("RPAREN")
+        return_type = None
+        if self.peek() == "COLON":
+            self.advance()
+            return_type = self.expect("NAME")
+        statements = self.parse_block()
+        return self.spanned(self.node(InterpreterBase.FUNC_NODE, name=name, args=args, return_type=return_type,
+                                      statements=statements), start)
+
+    def parse_formal_arg(self) -> Element:
+        start = self.i
+        name = self.expect("NAME")
+        var_type = None
+        if self.peek() == "COLON":
+            self.advance()
+            var_type = self.expect("NAME")
+        return self.spanned(self.node(InterpreterBase.ARG_NODE, name=name, var_type=var_type), start)
+
+    # ---- statements ----
+
+    def parse_block(self) -> list[Element]:
+        """ LBRACE statements RBRACE, with at least one statement like the grammar requires. """
+        self.expect("LBRACE")
+        statements = [self.parse_statement()]
+        while self.peek() != "RBRACE":
+            statements.append(self.parse_statement())
+        self.advance()
+        return statements
+
+    def parse_statement(self) -> Element:
+        start = self.i
+        tok_type = self.peek()
+        if tok_type == "VAR":
+            self.advance()
+            name = self.expect("NAME")
+            var_type = None
+            if self.peek() == "COLON":
+                self.advance()
+                var_type = self.expect("NAME")
+            self.expect("SEMI")
+            return self.spanned(self.node(InterpreterBase.VAR_DEF_NODE, name=name, var_type=var_type), start)
+        if tok_type == "IF":
+            return self.parse_if()
+        if tok_type == "FOR":
+            return self.parse_for()
+        if tok_type == "TRY":
+            return self.parse_try()
+        if tok_type == "RETURN":
+            self.advance()
+            expr = None
+            if self.peek() != "SEMI":
+                expr = self.parse_expression()
+            self.expect("SEMI")
+            return self.spanned(self.node(InterpreterBase.RETURN_NODE, expression=expr), start)
+        if tok_type == "RAISE":
+            self.advance()
+            expr = self.parse_expression()
+            self.expect("SEMI")
+            return self.spanned(self.node(InterpreterBase.RAISE_NODE, exception_type=expr), start)
+        if tok_type == "NAME" and self.is_assignment():
+            statement = self.parse_assign()
+        else:
+            statement = self.parse_expression()
+        self.expect("SEMI")
+        return statement
+
+    def is_assignment(self) -> bool:
+        """ Look past NAME (DOT NAME)* to see whether an ASSIGN follows. """
+        j = 1
+        while self.peek(j) == "DOT" and self.peek(j + 1) == "NAME":
+            j += 2
+        return self.peek(j) == "ASSIGN"
+
+    def parse_assign(self) -> Element:
+        start = self.i
+        name = self.parse_dotted_name()
+        self.expect("ASSIGN")
+        return self.spanned(self.node("=", name=name, expression=self.parse_expression()), start)
+
+    def parse_dotted_name(self) -> str:
+        name = self.expect("NAME")
+        if self.types[self.i] != "DOT":
+            return name
+        path = [name]
+        while self.peek() == "DOT":
+            self.advance()
+            path.append(self.expect("NAME"))
+        return DottedName(tuple(path))
+
+    def parse_if(self) -> Element:
+        start = self.i
+        self.expect("IF")
+        self.expect("LPAREN")
+        condition = self.parse_expression()
+        self.expect("RPAREN")
+        statements = self.parse_block()
+        else_statements = None
+        if self.peek() == "ELSE":
+            self.advance()
+            else_statements = self.parse_block()
+        return self.spanned(self.node(InterpreterBase.IF_NODE, condition=condition, statements=statements,
+                                      else_statements=else_statements), start)
+
+    def parse_for(self) -> Element:
+        start = self.i
+        self.expect("FOR")
+        self.expect("LPAREN")
+        init = self.parse_assign()
+        self.expect("SEMI")
+        condition = self.parse_expression()
+        self.expect("SEMI")
+        update = self.parse_assign()
+        self.expect("RPAREN")
+        statements = self.parse_block()
+        return self.spanned(self.node(InterpreterBase.FOR_NODE, init=init, condition=condition, update=update,
+                                      statements=statements), start)
+
+    def parse_try(self) -> Element:
+        start = self.i
+        self.expect("TRY")
+        statements = self.parse_block()
+        catchers = []
+        while True:
+            catch_start = self.i
+            self.expect("CATCH")
+            exception_type = self.expect("STRING")
+            catchers.append(self.spanned(self.node(InterpreterBase.CATCH_NODE, exception_type=exception_type,
+                                                   statements=self.parse_block()), catch_start))
+            if self.peek() != "CATCH":
+                break
+        return self.spanned(self.node(InterpreterBase.TRY_NODE, statements=statements, catchers=catchers), start)
+
+    # ---- expressions ----
+
+    def parse_expression(self, min_precedence: int = 1) -> Element:
+        start = self.i  # every operator node built here starts where its left operand does
+        lhs = self.parse_unary()
+        types = self.types
+        while True:
+            precedence = BINARY_PRECEDENCE.get(types[self.i], 0)
+            if precedence < min_precedence:
+                return lhs
+            op = self.advance()
+            rhs = self.parse_expression(precedence + 1)  # left associative
+            lhs = self.spanned(self.node(op, op1=lhs, op2=rhs), start)
+
+    def parse_unary(self) -> Element:
+        # NOT and unary MINUS bind tighter than every binary operator
+        start = self.i
+        tok_type = self.types[start]
+        if tok_type == "NOT":
+            self.advance()
+            return self.spanned(self.node(InterpreterBase.NOT_NODE, op1=self.parse_unary()), start)
+        if tok_type == "MINUS":
+            self.advance()
+            return self.spanned(self.node(InterpreterBase.NEG_NODE, op1=self.parse_unary()), start)
+        return self.parse_primary()
+
+    def parse_primary(self) -> Element:
+        start = self.i
+        tok_type = self.types[start]
+        if tok_type == "NUMBER":
+            return self.spanned(self.node(InterpreterBase.INT_NODE, val=self.advance()), start)
+        if tok_type == "STRING":
+            return self.spanned(self.node(InterpreterBase.STRING_NODE, val=self.advance()), start)
+        if tok_type == "TRUE" or tok_type == "FALSE":
+            return self.spanned(self.node(InterpreterBase.BOOL_NODE, val=self.advance() == InterpreterBase.TRUE_DEF),
+                                start)
+        if tok_type == "NIL":
+            self.advance()
+            return self.spanned(self.node(InterpreterBase.NIL_NODE), start)
+        if tok_type == "NEW":
+            self.advance()
+            return self.spanned(self.node(InterpreterBase.NEW_NODE, var_type=self.expect("NAME")), start)
+        if tok_type == "LPAREN":
+            self.advance()
+            expr = self.parse_expression()
+            self.expect("RPAREN")
+            return expr
+        if tok_type == "NAME":
+            if self.peek(1) == "LPAREN":
+                return self.parse_call()
+            return self.spanned(self.node(InterpreterBase.VAR_NODE, name=self.parse_dotted_name()), start)
+        self.error()
+
+    def parse_call(self) -> Element:
+        start = self.i
+        name = self.advance()
+        self.advance()  # LPAREN
+        args = []
+        if self.peek() != "RPAREN":
+            args.append(self.parse_expression())
+            while self.peek() == "COMMA":
+                self.advance()
+                args.append(self.parse_expression())
+        self.expect("RPAREN")
+        return self.spanned(self.node(InterpreterBase.FCALL_NODE, name=name, args=args), start)
+
+
+def parse(program: str, node=Element) -> Element:
+    return PrattParser(tokenize(program), node).parse_program()
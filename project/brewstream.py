@@ -0,0 +1,225 @@
+import codecs
+import io
+import mmap
+import os
+import re
+
+from brewlex import get_lexer
+from ply.lex import LexError, LexToken
+
+CHUNK_SIZE = 1 << 16
+
+_COMMENT_END = re.compile(r"\*/")
+_STRING_END = re.compile(r'["\n]')  # t_STRING does not span lines, a newline settles it as well
+
+
+class StreamLexer:
+    """ Lexes Brewin source incrementally from a file, a memory map or a file object, so the whole program never
+    has to be materialized as one Python string. Uses the same master regex and t_ rules as the brewlex lexer and
+    produces identical tokens; lexpos is the absolute character offset in the source.
+
+    Only a window of the input is kept in memory. A token that straddles the end of the window is retried once
+    more input has been read, and comments and strings are searched for their terminator before being matched,
+    so the window grows to hold at most the largest comment or string. """
+    def __init__(self, source, chunk_size: int = CHUNK_SIZE, encoding: str = "utf-8"):
+        base = get_lexer()
+        self.lexre = base.lexre
+        self.lexignore = base.lexignore
+        self.lexliterals = base.lexliterals
+        self.lexerrorf = base.lexerrorf
+
+        self.chunk_size = chunk_size
+        self.lineno = 1
+        self.line_start = 0  # absolute offset of the current line, for token columns
+        self.buf = ""  # current window of the source
+        self.base = 0  # absolute offset of buf[0]
+        self.pos = 0  # read position within buf
+        self.eof = False
+        self.unterminated = float("inf")  # absolute offset from which no comment is closed, see _comment
+
+        self._owned = []  # files and maps opened here, closed at EOF
+        self._reader = self._open(source)
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="strict")
+
+    @property
+    def lexpos(self) -> int:
+        return self.base + self.pos
+
+    def skip(self, n: int) -> None:
+        self.pos += n
+
+    def input(self, s):
+        raise TypeError("StreamLexer reads from its source; use a ply Lexer to lex strings")
+
+    def token(self) -> LexToken|None:
+        lexignore = self.lexignore
+        while True:
+            buf, pos = self.buf, self.pos
+            end = len(buf)
+            while pos < end and buf[pos] in lexignore:
+                pos += 1
+            self.pos = pos
+            if pos >= end:
+                if self.eof:
+                    self.close()
+                    return None
+                self._fill()
+                continue
+
+            # comments and strings are the only unbounded tokens, make sure their terminator is in the window
+            c = buf[pos]
+            if c == '"' and not self.eof:
+                self._fill_until(_STRING_END, pos + 1, 1)
+                buf, pos = self.buf, self.pos
+                end = len(buf)
+            elif c == "/" and buf.startswith("/*", pos):
+                tok = self._comment()
+                if tok is not None:
+                    return tok
+                continue
+
+            for lexre, lexindexfunc in self.lexre:
+                m = lexre.match(buf, pos)
+                if m:
+                    break
+            else:
+                return self._no_match(buf, pos)
+
+            # the match stops at the window edge, more input could extend it (e.g. a name or `==`)
+            if m.end() >= end and not self.eof:
+                self._fill()
+                continue
+
+            tok = LexToken()
+            tok.value = m.group()
+            tok.lineno = self.lineno
+            tok.lexpos = self.base + pos
+            tok.column = tok.lexpos - self.line_start
+            tok.endlineno, tok.endcolumn = self.lineno, self.base + m.end() - self.line_start
+            func, tok.type = lexindexfunc[m.lastindex]
+            self.pos = m.end()
+            if not func:
+                if tok.type:
+                    return tok
+                continue
+
+            tok.lexer = self
+            self.lexmatch = m
+            lineno = self.lineno
+            newtok = func(tok)
+            if newtok:
+                return newtok
+            if self.lineno != lineno:  # t_newline, the match ends right after the last newline
+                self.line_start = self.base + m.end()
+
+    def _comment(self) -> LexToken|None:
+        """ Skip the comment at the read position like brewlex.t_comment. If it is never closed, return the "/"
+        as a DIVIDE token instead. """
+        start = self.lexpos
+        close = -1
+        if start < self.unterminated:
+            if not self.eof:
+                self._fill_until(_COMMENT_END, self.pos + 2, 2)
+            close = self.buf.find("*/", self.pos + 2)
+        buf, pos = self.buf, self.pos
+        if close >= 0:
+            newlines = buf.count("\n", pos, close)
+            if newlines:
+                self.lineno += newlines
+                self.line_start = self.base + buf.rfind("\n", pos, close) + 1
+            self.pos = close + 2
+            return None
+        self.unterminated = min(self.unterminated, start)  # all of the input is in the window now, never search again
+        tok = LexToken()
+        tok.type, tok.value, tok.lineno, tok.lexpos = "DIVIDE", "/", self.lineno, start
+        tok.column = start - self.line_start
+        tok.endlineno, tok.endcolumn = self.lineno, tok.column + 1
+        self.pos = pos + 1
+        return tok
+
+    def _no_match(self, buf: str, pos: int) -> LexToken|None:
+        # mirrors ply.lex.Lexer.token: literals first, then t_error
+        tok = LexToken()
+        tok.lineno = self.lineno
+        tok.lexpos = self.base + pos
+        tok.column = tok.lexpos - self.line_start
+        tok.endlineno, tok.endcolumn = self.lineno, tok.column + 1
+        if buf[pos] in self.lexliterals:
+            tok.value = tok.type = buf[pos]
+            self.pos = pos + 1
+            return tok
+        if self.lexerrorf:
+            tok.value = buf[pos:]
+            tok.type = "error"
+            tok.lexer = self
+            newtok = self.lexerrorf(tok)
+            if self.pos == pos:
+                raise LexError(f"Scanning error. Illegal character '{buf[pos]}'", buf[pos:])
+            return newtok if newtok else self.token()
+        raise LexError(f"Illegal character '{buf[pos]}' at index {self.base + pos}", buf[pos:])
+
+    def _read(self) -> str:
+        """ Decode the next chunk of the source; an empty string at the end. """
+        data = self._reader(self.chunk_size)
+        if not data:
+            self.eof = True
+        if isinstance(data, bytes):
+            return self._decoder.decode(data, final=not data)
+        return data
+
+    def _fill(self) -> None:
+        """ Read the next chunk into the window, dropping what has already been consumed. """
+        text = self._read()
+        if self.pos > 0:
+            self.base += self.pos
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        self.buf += text
+
+    def _fill_until(self, pattern, start: int, width: int) -> None:
+        """ Read until pattern occurs at or after buf[start], or the input ends. Each chunk is searched once, and
+        the chunks are joined once at the end so a huge comment or string is not copied over and over. """
+        if pattern.search(self.buf, start) is not None or self.eof:
+            return
+        if self.pos > 0:  # drop what has been consumed, as _fill does
+            start -= self.pos
+            self.base += self.pos
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        chunks = [self.buf]
+        tail = self.buf[max(start, len(self.buf) - width + 1):]  # a terminator may straddle two chunks
+        while not self.eof:
+            text = self._read()
+            chunks.append(text)
+            tail += text
+            if pattern.search(tail) is not None:
+                break
+            tail = tail[len(tail) - width + 1:] if width > 1 else ""
+        self.buf = "".join(chunks)
+
+    def _open(self, source):
+        if isinstance(source, (str, os.PathLike)):
+            f = open(source, "rb")
+            self._owned.append(f)
+            if os.fstat(f.fileno()).st_size == 0:  # empty files cannot be mapped
+                return f.read
+            source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._owned.append(source)
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = io.BytesIO(source)
+        return source.read
+
+    def close(self) -> None:
+        for owned in reversed(self._owned):
+            owned.close()
+        self._owned.clear()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        tok = self.token()
+        if tok is None:
+            raise StopIteration
+        return tok
+
@@ -0,0 +1,103 @@
+import multiprocessing
+import os
+import time
+
+import brewparse
+from flatast import FlatAST
+
+
+class ParseResult:
+    """ Outcome of parsing one file of a corpus. data is the tree serialized as a flat AST (see flatast), or None
+    if the file could not be read, has a syntax error or failed to parse in any other way; error then holds the
+    message (the first one, for syntax errors). seconds is the time spent
+    parsing, excluding reading the file and serializing the tree. """
+    __slots__ = ("index", "path", "data", "seconds", "error")
+
+    def __init__(self, index: int, path: str, data: bytes|None, seconds: float, error: str|None):
+        self.index = index  # position of the file in the input
+        self.path = path
+        self.data = data
+        self.seconds = seconds
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def ast(self) -> FlatAST|None:
+        """ The tree, mapped over data without copying it or building any per-node objects. """
+        return FlatAST.from_buffer(self.data) if self.data is not None else None
+
+    def __repr__(self):
+        status = "ok" if self.error is None else self.error
+        return f"ParseResult({self.path!r}, {self.seconds * 1000:.2f} ms, {status})"
+
+
+def parse_files(paths, workers: int|None = None, backend: str = "lalr", cache_dir: str|None = None,
+                chunksize: int|None = None):
+    """ Parse many Brewin files with parse_program, fanned out over a pool of worker processes that each build
+    the lexer and parser once. Yields a ParseResult per file as soon as it is done, so in completion order rather
+    than input order (result.index is the position in paths).
+
+    workers defaults to the number of CPUs. With a single worker the files are parsed in this process, which keeps
+    its own cache settings; otherwise cache_dir enables the parse cache in the workers (on disk, so they share it)
+    and by default they do not cache. """
+    paths = [os.fspath(path) for path in paths]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(paths)))
+    jobs = [(index, path, backend) for index, path in enumerate(paths)]
+    if workers == 1:
+        brewparse.build()
+        for job in jobs:
+            yield ParseResult(*_parse_one(job))
+        return
+    if chunksize is None:
+        chunksize = max(1, min(64, len(jobs) // (workers * 8)))  # few round trips, yet an even spread at the end
+    with multiprocessing.Pool(workers, _init_worker, (cache_dir,)) as pool:
+        for result in pool.imap_unordered(_parse_one, jobs, chunksize):
+            yield ParseResult(*result)
+
+
+def parse_directory(root: str, suffix: str = ".br", **kwargs):
+    """ parse_files over every file under root whose name ends with suffix, visited in sorted order. """
+    paths = []
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories.sort()
+        paths.extend(os.path.join(directory, name) for name in sorted(files) if name.endswith(suffix))
+    return parse_files(paths, **kwargs)
+
+
+def _init_worker(cache_dir: str|None) -> None:
+    if cache_dir is not None:
+        brewparse.enable_cache(cache_dir)
+    else:
+        brewparse.disable_cache()
+    brewparse.build()  # once per worker, not in the first job
+
+
+def _parse_one(job: tuple[int, str, str]) -> tuple[int, str, bytes|None, float, str|None]:
+    # runs in a worker: everything returned is pickled back to the parent, so the tree goes as one bytes object
+    index, path, backend = job
+    try:
+        with open(path, encoding="utf-8") as f:
+            program = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        return index, path, None, 0.0, f"{type(e).__name__}: {e}"
+
+    # syntax errors are collected for this parse alone: PLY may recover from them and still return a tree
+    messages = []
+    data = error = None
+    start = time.perf_counter()
+    try:
+        ast = brewparse.parse_program(program, backend=backend, form="flat", on_error=messages.append)
+        seconds = time.perf_counter() - start
+        if not messages:
+            data = ast.to_bytes()
+    except Exception as e:  # any failure is this file's result, the other files still get parsed
+        seconds = time.perf_counter() - start
+        error = f"{type(e).__name__}: {e}"
+    if messages:
+        error = messages[0]
+    return index, path, data, seconds, error
@@ -1,10 +1,24 @@
 class Element:
+    _span = None  # where the node is in the source, packed by pack_span(); set by the parser
+
     def __init__(self, elem_type, **kwargs):
         self.elem_type = elem_type
         self.dict = {}
         for key, value in kwargs.items():
             self.dict[key] = value
 
+    @property
+    def span(self) -> tuple[int, int, int, int]|None:
+        return unpack_span(self._span)
+
+    @span.setter
+    def span(self, span: tuple[int, int, int, int]|None):
+        self._span = pack_span(*span) if span is not None else None
+
+    @property
+    def lineno(self) -> int|None:
+        return self._span >> 96 if self._span is not None else None
+
     def get(self, key):
         if key not in self.dict:
             return None
@@ -27,3 +41,32 @@ class Element:
                 return "[" + s[0:-2] + "]"
             return "[" + s + "]"
         return str(v)
+
+
+class DottedName(str):
+    """ A variable reference like a.b.c. It compares, hashes and prints as the joined string the parser always
+    produced, and carries the interned components in path, so interpreters never split it at run time. """
+    def __new__(cls, path: tuple[str, ...]):
+        name = super().__new__(cls, ".".join(path))
+        name.path = path
+        return name
+
+    def __getnewargs__(self):
+        return (self.path,)
+
+
+# A span is (start line, start column, end line, end column): lines count from 1, columns from 0, and the end column
+# is just past the node. Nodes keep it packed into one int, which takes far less memory than a tuple of four ints.
+def pack_span(start_line: int, start_column: int, end_line: int, end_column: int) -> int:
+    return start_line << 96 | start_column << 64 | end_line << 32 | end_column
+
+
+def unpack_span(packed: int|None) -> tuple[int, int, int, int]|None:
+    if packed is None:
+        return None
+    return packed >> 96, packed >> 64 & 0xFFFFFFFF, packed >> 32 & 0xFFFFFFFF, packed & 0xFFFFFFFF
+
+
+def move_span(packed: int, lines: int) -> int:
+    """ The same span, lines further down (or up, for negative lines). """
+    return packed + lines * (1 << 96 | 1 << 32)
@@ -0,0 +1,291 @@
+import mmap
+import struct
+import sys
+from array import array
+
+from element import DottedName, Element
+from nodes import NODE_CLASSES, BinOpNode
+
+# every node type, its index is the kind stored per node (part of the file format: append only, or bump VERSION)
+KINDS: tuple[str, ...] = (
+    "program", "struct", "fielddef", "func", "arg", "vardef", "=", "if", "for", "try", "catch", "raise", "return",
+    "fcall", "neg", "!", "int", "string", "bool", "nil", "new", "var",
+    "==", "!=", "<", "<=", ">", ">=", "+", "-", "*", "/", "&&", "||",
+)
+KIND_INDEX = {elem_type: i for i, elem_type in enumerate(KINDS)}
+FIELDS: tuple[tuple[str, ...], ...] = tuple(NODE_CLASSES.get(elem_type, BinOpNode)._fields for elem_type in KINDS)
+FIELD_INDEX: tuple[dict[str, int], ...] = tuple({name: i for i, name in enumerate(fields)} for fields in FIELDS)
+
+# a field value is one 64-bit word: payload << 3 | tag
+NONE, NODE, LIST, STR, INT, BOOL, BIGINT, DOTTED = range(8)
+_SMALL = 1 << 59
+
+MAGIC = b"BRWF"
+VERSION = 2
+_HEADER = struct.Struct("<4sIB3xQQQQ")  # magic, version, little endian?, nodes, words, strings, string bytes
+
+
+class FlatAST:
+    """ A whole program in a few flat buffers instead of one object per node:
+
+    kinds    array('B')  node kind, an index into KINDS
+    offsets  array('I')  where each node's fields start in words
+    words    array('q')  tagged field values; a list is stored as its length followed by its items
+    spans    array('I')  four entries per node: start line and column, end line and column (line 0: no span)
+    strings  utf-8 pool, string i is blob[string_offsets[i]:string_offsets[i + 1]]
+
+    Node 0 is the program. The FlatAST answers elem_type and get() like the program Element, and get() returns
+    Cursor objects for child nodes, so interpreters can walk it as they walk Element trees. save() writes the
+    buffers as they are, and load() maps them back without building any per-node objects. """
+    def __init__(self, kinds, offsets, words, blob, string_offsets, spans):
+        self.kinds = kinds
+        self.offsets = offsets
+        self.words = words
+        self.spans = spans
+        self.blob = blob
+        self.string_offsets = string_offsets
+        self._strings: dict[int, str] = {}  # decoded on first use
+        self._dotted: dict[int, DottedName] = {}
+        self._mmap = None
+
+    # ---- program node interface ----
+
+    @property
+    def elem_type(self) -> str:
+        return KINDS[self.kinds[0]]
+
+    @property
+    def span(self) -> tuple[int, int, int, int]|None:
+        return self.node_span(0)
+
+    @property
+    def lineno(self):
+        return self.spans[0] or None
+
+    @property
+    def root(self) -> "Cursor":
+        return Cursor(self, 0)
+
+    def get(self, key):
+        return self.field(0, key)
+
+    @property
+    def dict(self) -> dict:
+        return self.root.dict
+
+    def __str__(self):
+        return str(self.root)
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    # ---- decoding ----
+
+    def field(self, index: int, key: str):
+        i = FIELD_INDEX[self.kinds[index]].get(key)
+        if i is None:
+            return None
+        return self.decode(self.words[self.offsets[index] + i])
+
+    def node_span(self, index: int) -> tuple[int, int, int, int]|None:
+        i = 4 * index
+        span = tuple(self.spans[i:i + 4])
+        return span if span[0] else None
+
+    def decode(self, word: int):
+        tag, payload = word & 7, word >> 3
+        if tag == NODE:
+            return Cursor(self, payload)
+        if tag == LIST:
+            words = self.words
+            return [self.decode(words[i]) for i in range(payload + 1, payload + 1 + words[payload])]
+        if tag == STR:
+            return self.string(payload)
+        if tag == INT:
+            return payload
+        if tag == BOOL:
+            return bool(payload)
+        if tag == DOTTED:
+            name = self._dotted.get(payload)
+            if name is None:
+                name = self._dotted[payload] = DottedName(tuple(map(sys.intern, self.string(payload).split("."))))
+            return name
+        if tag == BIGINT:
+            return int(self.string(payload))
+        return None
+
+    def string(self, i: int) -> str:
+        s = self._strings.get(i)
+        if s is None:
+            s = self._strings[i] = str(self.blob[self.string_offsets[i]:self.string_offsets[i + 1]],
+                                         "utf-8", "surrogatepass")
+        return s
+
+    def to_element(self) -> Element:
+        return self.root.to_element()
+
+    # ---- serialization ----
+
+    def to_bytes(self) -> bytes:
+        parts = [_HEADER.pack(MAGIC, VERSION, sys.byteorder == "little", len(self.kinds), len(self.words),
+                              len(self.string_offsets) - 1, len(self.blob))]
+        for buf in (self.words, self.offsets, self.spans, self.string_offsets, self.kinds, self.blob):
+            data = bytes(buf)
+            parts.append(data + b"\0" * (-len(data) % 8))  # keep every buffer 8-byte aligned
+        return b"".join(parts)
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def from_buffer(cls, buf) -> "FlatAST":
+        """ Wrap serialized buffers without copying them (unless the byte order differs from this machine). """
+        view = memoryview(buf)
+        magic, version, little, num_nodes, num_words, num_strings, blob_size = _HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a flat Brewin AST")
+        swap = little != (sys.byteorder == "little")
+        pos = _HEADER.size
+
+        def take(typecode: str, count: int):
+            nonlocal pos
+            size = count * array(typecode).itemsize
+            chunk = view[pos:pos + size]
+            pos += size + (-size % 8)
+            if typecode == "B":
+                return chunk
+            if swap:
+                copy = array(typecode, chunk)
+                copy.byteswap()
+                return copy
+            return chunk.cast(typecode)
+
+        words = take("q", num_words)
+        offsets = take("I", num_nodes)
+        spans = take("I", 4 * num_nodes)
+        string_offsets = take("I", num_strings + 1)
+        kinds = take("B", num_nodes)
+        blob = take("B", blob_size)
+        return cls(kinds, offsets, words, blob, string_offsets, spans)
+
+    @classmethod
+    def load(cls, path: str) -> "FlatAST":
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        ast = cls.from_buffer(mapped)
+        ast._mmap = mapped  # kept open for as long as the buffers are in use
+        return ast
+
+    def __reduce__(self):
+        # pickles as the serialized buffers, not node by node
+        return FlatAST.from_buffer, (self.to_bytes(),)
+
+
+class Cursor:
+    """ Lightweight handle on one node of a FlatAST, with the Element interface (elem_type, get, dict, str). """
+    __slots__ = ("ast", "index")
+
+    def __init__(self, ast: FlatAST, index: int):
+        self.ast = ast
+        self.index = index
+
+    @property
+    def elem_type(self) -> str:
+        return KINDS[self.ast.kinds[self.index]]
+
+    @property
+    def span(self) -> tuple[int, int, int, int]|None:
+        return self.ast.node_span(self.index)
+
+    @property
+    def lineno(self):
+        return self.ast.spans[4 * self.index] or None
+
+    def get(self, key):
+        return self.ast.field(self.index, key)
+
+    @property
+    def dict(self) -> dict:
+        return {name: self.get(name) for name in FIELDS[self.ast.kinds[self.index]]}
+
+    def __eq__(self, other):
+        return isinstance(other, Cursor) and self.ast is other.ast and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.ast), self.index))
+
+    def __str__(self):
+        return str(self.to_element())
+
+    def to_element(self) -> Element:
+        element = Element(self.elem_type, **{key: _to_element(value) for key, value in self.dict.items()})
+        span = self.span
+        if span is not None:
+            element.span = span
+        return element
+
+
+def _to_element(value):
+    if isinstance(value, Cursor):
+        return value.to_element()
+    if isinstance(value, list):
+        return [_to_element(item) for item in value]
+    return value
+
+
+def from_element(tree) -> FlatAST:
+    """ Pack an Element (or typed node) tree into a FlatAST. """
+    kinds, offsets, words, spans = array("B"), array("I"), array("q"), array("I")
+    strings: dict[str, int] = {}
+
+    def intern(s: str) -> int:
+        i = strings.get(s)
+        if i is None:
+            i = strings[s] = len(strings)
+        return i
+
+    def encode(value) -> int:
+        if value is None:
+            return NONE
+        if isinstance(value, bool):
+            return value << 3 | BOOL
+        if isinstance(value, int):
+            if -_SMALL <= value < _SMALL:
+                return value << 3 | INT
+            return intern(str(value)) << 3 | BIGINT
+        if isinstance(value, DottedName):
+            return intern(value) << 3 | DOTTED
+        if isinstance(value, str):
+            return intern(value) << 3 | STR
+        if isinstance(value, list):
+            start = len(words)
+            words.append(len(value))
+            words.extend([NONE] * len(value))
+            for i, item in enumerate(value):
+                words[start + 1 + i] = encode(item)
+            return start << 3 | LIST
+        return add(value) << 3 | NODE
+
+    def add(node) -> int:
+        kind = KIND_INDEX.get(node.elem_type)
+        if kind is None:
+            raise ValueError(f"Unknown node type: {node.elem_type}")
+        index = len(kinds)
+        kinds.append(kind)
+        start = len(words)
+        offsets.append(start)
+        spans.extend(getattr(node, "span", None) or (0, 0, 0, 0))
+        fields = FIELDS[kind]
+        words.extend([NONE] * len(fields))
+        for i, name in enumerate(fields):
+            words[start + i] = encode(node.get(name))
+        return index
+
+    add(tree)
+    blob = bytearray()
+    string_offsets = array("I", [0])
+    for s in strings:  # dicts keep insertion order, which is the index order
+        blob += s.encode("utf-8", "surrogatepass")
+        string_offsets.append(len(blob))
+    return FlatAST(kinds, offsets, words, bytes(blob), string_offsets, spans)
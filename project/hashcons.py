@@ -0,0 +1,83 @@
+import sys
+
+from element import Element
+from nodes import Node
+
+
+class Interner:
+    """ Hash-consing table for AST subtrees. intern() rebuilds a freshly parsed tree bottom-up so that structurally
+    identical subtrees (`i = i + 1`, `print(x)`, literals) become one shared node, within the program and across
+    every program interned with the same Interner. Works on Element and typed trees; the program node itself is
+    never shared, as it carries per-program attributes such as source.
+
+    With spans=False (the default) spans are not part of a node's identity and are dropped, so shared nodes have
+    no lineno and errors are reported without a line number. spans=True keeps them, but then only subtrees at the
+    same position in the source can be shared.
+
+    Like cached trees, interned trees are shared and must be treated as read-only. """
+    def __init__(self, spans: bool = False):
+        self.spans = spans
+        self.table: dict[tuple, Element|Node] = {}
+        self.strings: dict[str, str] = {}
+        self.nodes = 0  # nodes that went through intern()
+        self.shared = 0  # of those, replaced by an equal node interned earlier
+        self.saved_bytes = 0  # shallow size of the replaced nodes, their dicts and lists
+
+    def intern(self, tree):
+        """ Intern the subtrees of a tree built by the parser and return it. The tree is updated in place, so it
+        must not be in use anywhere else (e.g. in the parse cache). """
+        if isinstance(tree, Element):
+            for key, value in tree.dict.items():
+                tree.dict[key] = self._intern(value)
+        else:
+            for name in tree._fields:
+                setattr(tree, name, self._intern(getattr(tree, name)))
+        if not self.spans:
+            tree._span = None
+        return tree
+
+    def _intern(self, value):
+        if isinstance(value, list):
+            return [self._intern(item) for item in value]
+        if isinstance(value, Element):
+            items = value.dict
+            for key, child in items.items():
+                items[key] = self._intern(child)
+            fields = tuple(items.items())
+        elif isinstance(value, Node):
+            fields = tuple((name, self._intern(getattr(value, name))) for name in value._fields)
+            for name, child in fields:
+                setattr(value, name, child)
+        elif type(value) is str:
+            return self.strings.setdefault(value, value)  # string literals; names are already sys.intern'ed
+        else:
+            return value  # int, bool, None or a DottedName
+
+        # children are canonical by now, so they compare (and hash) by identity in the key
+        key = (value.elem_type, value._span if self.spans else None,
+               tuple((name, tuple(child) if isinstance(child, list) else child) for name, child in fields))
+        canonical = self.table.get(key)
+        if canonical is value:
+            return value  # interned before, e.g. a subtree reused by an incremental reparse
+        self.nodes += 1
+        if canonical is None:
+            if not self.spans:
+                value._span = None
+            self.table[key] = value
+            return value
+        self.shared += 1
+        self.saved_bytes += _shallow_size(value)
+        return canonical
+
+    def stats(self) -> dict:
+        return {"nodes": self.nodes, "shared": self.shared, "unique": len(self.table),
+                "saved_bytes": self.saved_bytes}
+
+
+def _shallow_size(node) -> int:
+    if isinstance(node, Element):
+        values = node.dict.values()
+        return (sys.getsizeof(node) + sys.getsizeof(node.__dict__) + sys.getsizeof(node.dict)
+                + sum(sys.getsizeof(value) for value in values if isinstance(value, list)))
+    return sys.getsizeof(node) + sum(sys.getsizeof(getattr(node, name)) for name in node._fields
+                                     if isinstance(getattr(node, name), list))
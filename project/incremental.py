@@ -0,0 +1,142 @@
+import re
+
+from brewlex import tokenize
+from brewpratt import PrattParser
+from element import Element, move_span
+from intbase import InterpreterBase
+
+# what matters for finding top-level definitions: comments and strings (which may hold braces), braces and the
+# definition keywords. Anything else at the top level is caught as stray text between definitions.
+_SCAN = re.compile(r'/\*[\s\S]*?\*/|"[^"\n]*"|[{}]|\b(?:func|struct)\b')
+_BLANK = " \t\n"  # what brewlex skips between tokens
+
+
+class Definition:
+    """ Source text of one top-level struct or func, with where it starts (offset, line and column). """
+    def __init__(self, kind: str, text: str, start: int, lineno: int, column: int):
+        self.kind = kind
+        self.text = text
+        self.start = start
+        self.lineno = lineno
+        self.column = column
+
+
+def split_definitions(program: str) -> list[Definition]|None:
+    """ Split a program into its top-level definitions. Return None if anything other than definitions,
+    whitespace and comments appears at the top level, or a definition is not closed. """
+    last_open = program.rfind("/*")
+    if last_open >= 0 and program.find("*/", last_open + 2) < 0:
+        return None  # possibly a comment that is never closed, which would make _SCAN rescan the rest every time
+    definitions = []
+    depth = 0
+    start = None  # offset of the keyword of the definition being scanned
+    kind = None
+    last_end = 0
+    lineno, counted = 1, 0  # line number at offset counted
+    for m in _SCAN.finditer(program):
+        piece = m.group()
+        if depth == 0 and start is None:
+            if program[last_end:m.start()].strip(_BLANK):
+                return None  # stray text between definitions
+            last_end = m.end()
+            if piece.startswith("/*"):
+                continue
+            if piece not in (InterpreterBase.FUNC_NODE, InterpreterBase.STRUCT_NODE):
+                return None
+            start, kind = m.start(), piece
+            continue
+
+        if piece == "{":
+            depth += 1
+        elif piece == "}":
+            depth -= 1
+            if depth < 0:
+                return None
+            if depth == 0:
+                lineno += program.count("\n", counted, start)
+                counted = start
+                column = start - program.rfind("\n", 0, start) - 1
+                definitions.append(Definition(kind, program[start:m.end()], start, lineno, column))
+                start = None
+                last_end = m.end()
+
+    if start is not None or program[last_end:].strip(_BLANK):
+        return None
+    return definitions
+
+
+def _parse_definition(program: str, definition: Definition, node) -> Element:
+    tokens = tokenize(program, definition.lineno, definition.start, definition.start + len(definition.text))
+    parser = PrattParser(tokens, node)
+    tree = parser.parse_struct() if definition.kind == InterpreterBase.STRUCT_NODE else parser.parse_func()
+    if parser.peek() != "$end":
+        parser.error()
+    return tree
+
+
+def _moved(value, lines: int, node):
+    """ Copy of a reused subtree with every span moved down by lines. The old tree is left as it is, it may still
+    be in use (or in the AST cache). """
+    if isinstance(value, (str, int)) or value is None:
+        return value
+    if isinstance(value, list):
+        return [_moved(item, lines, node) for item in value]
+    if isinstance(value, Element):
+        moved = Element(value.elem_type)
+        moved.dict = {key: _moved(child, lines, node) for key, child in value.dict.items()}
+    else:
+        moved = node(value.elem_type, **{key: _moved(child, lines, node) for key, child in value.dict.items()})
+    if value._span is not None:
+        moved._span = move_span(value._span, lines)
+    return moved
+
+
+def reparse(program: str, previous: Element, node=Element) -> Element|None:
+    """ Parse program reusing the struct and func subtrees of a previous parse whose source text is unchanged.
+    node builds the new nodes and must match how previous was built (Element or nodes.make_node).
+    Return None when the program has to go through a full parse instead (e.g. it has a syntax error). """
+    old_source = getattr(previous, "source", None)
+    if old_source is None:
+        return None
+    definitions = split_definitions(program)
+    old_definitions = getattr(previous, "definitions", None) or split_definitions(old_source)
+    if not definitions or old_definitions is None:
+        return None
+
+    # structs precede funcs in both the source and the program node
+    old_nodes = previous.get("structs") + previous.get("functions")
+    if len(old_nodes) != len(old_definitions):
+        return None
+    # spans hold lines and columns, so a definition is reused as it is unless lines were added or removed above it
+    reusable: dict[str, list[tuple[Definition, Element]]] = {}
+    for definition, tree in zip(old_definitions, old_nodes):
+        reusable.setdefault(definition.text, []).append((definition, tree))
+
+    structs, functions = [], []
+    reused = 0
+    for definition in definitions:
+        if definition.kind == InterpreterBase.STRUCT_NODE and functions:
+            return None  # structs after funcs is a syntax error, let the full parser report it
+        candidates = reusable.get(definition.text)
+        if candidates and candidates[-1][0].column == definition.column:
+            old, tree = candidates.pop()
+            if old.lineno != definition.lineno:
+                tree = _moved(tree, definition.lineno - old.lineno, node)
+            reused += 1
+        else:
+            try:
+                tree = _parse_definition(program, definition, node)
+            except (SyntaxError, RecursionError):
+                return None
+        (structs if definition.kind == InterpreterBase.STRUCT_NODE else functions).append(tree)
+
+    if not functions:
+        return None
+    ast = node(InterpreterBase.PROGRAM_NODE, structs=structs, functions=functions)
+    first, last = (structs or functions)[0].span, functions[-1].span
+    if first is not None and last is not None:
+        ast.span = first[:2] + last[2:]
+    ast.definitions = definitions  # saves splitting the source again when this tree is the next previous
+    ast.reused_definitions = reused
+    ast.parsed_definitions = len(definitions) - reused
+    return ast
@@ -0,0 +1,229 @@
+from element import Element, pack_span, unpack_span
+from intbase import InterpreterBase
+
+
+class Node:
+    """ Base of the typed AST nodes: one class per node type, with __slots__ instead of a per-instance dict.
+    Children are plain attributes (if_node.condition), and get(), dict and str() behave like element.Element,
+    so interpreters written against Element run unchanged and can move to attribute access where it pays off.
+    Like cached Element trees, typed trees may be shared and must be treated as read-only. """
+    __slots__ = ("_span",)  # as Element._span
+    elem_type = None
+    _fields: tuple[str, ...] = ()
+
+    def __init__(self, **kwargs):
+        self._span = None
+        for name in self._fields:
+            setattr(self, name, kwargs.get(name))
+
+    @property
+    def span(self) -> tuple[int, int, int, int]|None:
+        return unpack_span(self._span)
+
+    @span.setter
+    def span(self, span: tuple[int, int, int, int]|None):
+        self._span = pack_span(*span) if span is not None else None
+
+    @property
+    def lineno(self) -> int|None:
+        return self._span >> 96 if self._span is not None else None
+
+    def get(self, key):
+        return getattr(self, key, None)
+
+    @property
+    def dict(self) -> dict:
+        """ Snapshot of the fields, in the same order as the Element built by the parser. """
+        return {name: getattr(self, name) for name in self._fields}
+
+    def __str__(self):
+        s = f"{self.elem_type}: "
+        for name in self._fields:
+            s += name + ": " + _val(getattr(self, name)) + ", "
+        return s[0:-2]
+
+
+def _val(v) -> str:
+    # same rendering as Element.__val
+    if isinstance(v, (Node, Element)):
+        return "[" + str(v) + "]"
+    if isinstance(v, list):
+        s = ""
+        for i in v:
+            s += str(i) + ", "
+        if len(s) > 0:
+            return "[" + s[0:-2] + "]"
+        return "[" + s + "]"
+    return str(v)
+
+
+class ProgramNode(Node):
+    # __dict__ so the program can carry bookkeeping such as its source text (see brewparse.parse_program)
+    __slots__ = ("structs", "functions", "__dict__")
+    elem_type = InterpreterBase.PROGRAM_NODE
+    _fields = ("structs", "functions")
+
+
+class StructNode(Node):
+    __slots__ = ("name", "fields")
+    elem_type = InterpreterBase.STRUCT_NODE
+    _fields = ("name", "fields")
+
+
+class FieldDefNode(Node):
+    __slots__ = ("name", "var_type")
+    elem_type = InterpreterBase.FIELD_DEF_NODE
+    _fields = ("name", "var_type")
+
+
+class FuncNode(Node):
+    __slots__ = ("name", "args", "return_type", "statements")
+    elem_type = InterpreterBase.FUNC_NODE
+    _fields = ("name", "args", "return_type", "statements")
+
+
+class ArgNode(Node):
+    __slots__ = ("name", "var_type")
+    elem_type = InterpreterBase.ARG_NODE
+    _fields = ("name", "var_type")
+
+
+class VarDefNode(Node):
+    __slots__ = ("name", "var_type")
+    elem_type = InterpreterBase.VAR_DEF_NODE
+    _fields = ("name", "var_type")
+
+
+class AssignNode(Node):
+    __slots__ = ("name", "expression")
+    elem_type = "="
+    _fields = ("name", "expression")
+
+
+class IfNode(Node):
+    __slots__ = ("condition", "statements", "else_statements")
+    elem_type = InterpreterBase.IF_NODE
+    _fields = ("condition", "statements", "else_statements")
+
+
+class ForNode(Node):
+    __slots__ = ("init", "condition", "update", "statements")
+    elem_type = InterpreterBase.FOR_NODE
+    _fields = ("init", "condition", "update", "statements")
+
+
+class TryNode(Node):
+    __slots__ = ("statements", "catchers")
+    elem_type = InterpreterBase.TRY_NODE
+    _fields = ("statements", "catchers")
+
+
+class CatchNode(Node):
+    __slots__ = ("exception_type", "statements")
+    elem_type = InterpreterBase.CATCH_NODE
+    _fields = ("exception_type", "statements")
+
+
+class RaiseNode(Node):
+    __slots__ = ("exception_type",)
+    elem_type = InterpreterBase.RAISE_NODE
+    _fields = ("exception_type",)
+
+
+class ReturnNode(Node):
+    __slots__ = ("expression",)
+    elem_type = InterpreterBase.RETURN_NODE
+    _fields = ("expression",)
+
+
+class FCallNode(Node):
+    __slots__ = ("name", "args")
+    elem_type = InterpreterBase.FCALL_NODE
+    _fields = ("name", "args")
+
+
+class BinOpNode(Node):
+    """ Arithmetic, comparison and logical operators; elem_type is the operator, e.g. "+" or "&&". """
+    __slots__ = ("elem_type", "op1", "op2")
+    _fields = ("op1", "op2")
+
+    def __init__(self, elem_type: str, **kwargs):
+        self.elem_type = elem_type
+        super().__init__(**kwargs)
+
+
+class UnaryOpNode(Node):
+    """ neg and !. """
+    __slots__ = ("elem_type", "op1")
+    _fields = ("op1",)
+
+    def __init__(self, elem_type: str, **kwargs):
+        self.elem_type = elem_type
+        super().__init__(**kwargs)
+
+
+class ValueNode(Node):
+    """ int, string and bool literals. """
+    __slots__ = ("elem_type", "val")
+    _fields = ("val",)
+
+    def __init__(self, elem_type: str, **kwargs):
+        self.elem_type = elem_type
+        super().__init__(**kwargs)
+
+
+class NilNode(Node):
+    __slots__ = ()
+    elem_type = InterpreterBase.NIL_NODE
+
+
+class NewNode(Node):
+    __slots__ = ("var_type",)
+    elem_type = InterpreterBase.NEW_NODE
+    _fields = ("var_type",)
+
+
+class VarNode(Node):
+    __slots__ = ("name",)
+    elem_type = InterpreterBase.VAR_NODE
+    _fields = ("name",)
+
+
+NODE_CLASSES: dict[str, type[Node]] = {
+    cls.elem_type: cls for cls in Node.__subclasses__() if isinstance(cls.elem_type, str)
+}
+for _elem_type in (InterpreterBase.NEG_NODE, InterpreterBase.NOT_NODE):
+    NODE_CLASSES[_elem_type] = UnaryOpNode
+for _elem_type in (InterpreterBase.INT_NODE, InterpreterBase.STRING_NODE, InterpreterBase.BOOL_NODE):
+    NODE_CLASSES[_elem_type] = ValueNode
+
+
+def make_node(elem_type: str, **kwargs) -> Node:
+    """ Drop-in for Element(elem_type, **kwargs) that builds the typed node instead. """
+    cls = NODE_CLASSES.get(elem_type, BinOpNode)  # every other node type is a binary operator
+    if isinstance(cls.elem_type, str):
+        return cls(**kwargs)
+    return cls(elem_type, **kwargs)  # the class covers several node types
+
+
+def from_element(value):
+    """ Convert an Element tree (or a list of them) to typed nodes. Typed subtrees are returned as they are. """
+    if isinstance(value, Element):
+        node = make_node(value.elem_type, **{key: from_element(child) for key, child in value.dict.items()})
+        node._span = value._span
+        return node
+    if isinstance(value, list):
+        return [from_element(child) for child in value]
+    return value
+
+
+def to_element(value):
+    """ Convert typed nodes back to an Element tree, e.g. for code that inspects Element.dict. """
+    if isinstance(value, Node):
+        element = Element(value.elem_type, **{name: to_element(getattr(value, name)) for name in value._fields})
+        if value._span is not None:
+            element._span = value._span
+        return element
+    if isinstance(value, list):
+        return [to_element(child) for child in value]
+    return value
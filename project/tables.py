@@ -0,0 +1,96 @@
+import os
+
+# Prebuilt lexer and LALR tables live here. They are named by the signature of the rules they were built
+# from, so a directory can be shared between checkouts and a stale table is never picked up.
+_cache_dir: str|None = os.environ.get("BREWIN_TABLE_DIR")
+
+
+def set_cache_dir(path: str|None) -> None:
+    """ Use path for the generated tables. None restores the default lookup. """
+    global _cache_dir
+    _cache_dir = path
+
+
+def _search_dirs() -> list[str]:
+    if _cache_dir:
+        return [_cache_dir]
+    # never a shared directory such as the system temp dir: table modules are executed and pickles loaded, so
+    # anyone who can write a file there could run code in every process that parses
+    return [
+        os.path.dirname(os.path.abspath(__file__)),
+        os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "brewin"),
+    ]
+
+
+def cache_dir() -> str|None:
+    """ The first writable table directory: the configured one, next to this module, or the user cache.
+    Return None if nothing is writable, in which case tables are rebuilt in memory. """
+    for path in _search_dirs():
+        try:
+            os.makedirs(path, exist_ok=True)
+        except OSError:
+            continue
+        if os.access(path, os.W_OK):
+            return path
+    return None
+
+
+def find_table(name: str) -> str|None:
+    """ Locate a prebuilt table file in any of the known directories (read-only installs included). """
+    for path in _search_dirs():
+        filename = os.path.join(path, name)
+        if os.path.isfile(filename):
+            return filename
+    return None
+
+
+def load_module(filename: str, name: str):
+    """ Import a generated table module from an arbitrary path, without touching sys.path. """
+    import importlib.util
+
+    spec = importlib.util.spec_from_file_location(name, filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def grammar_signature(pdict: dict) -> str:
+    """ Signature of the grammar defined in a parser module: tokens, precedence and every rule's production. """
+    import hashlib
+
+    parts = [repr(pdict.get("tokens")), repr(pdict.get("precedence")), repr(pdict.get("AST_VERSION"))]
+    for name in sorted(pdict):
+        if name.startswith("p_") and callable(pdict[name]):
+            parts.append(f"{name}:{pdict[name].__doc__}")
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def lexer_signature(ldict: dict) -> str:
+    """ Signature of the token rules defined in a lexer module, in definition order since PLY tries them in order. """
+    import hashlib
+
+    parts = [repr(ldict.get("tokens")), repr(ldict.get("literals")), repr(ldict.get("t_ignore"))]
+    for name in ldict:
+        if name.startswith("t_"):
+            rule = ldict[name]
+            parts.append(f"{name}:{rule.__doc__ if callable(rule) else rule}")
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def source_signature(module_names: list[str]) -> str:
+    """ Signature of the source files of some modules, found without importing them. A module whose source
+    cannot be read signs as its name alone. """
+    import hashlib
+    import importlib.util
+
+    digest = hashlib.sha256()
+    for name in module_names:
+        digest.update(name.encode() + b"\0")
+        spec = importlib.util.find_spec(name)
+        try:
+            with open(spec.origin, "rb") as f:
+                digest.update(f.read())
+        except (AttributeError, TypeError, OSError):
+            pass
+        digest.update(b"\0")
+    return digest.hexdigest()
@@ -17,11 +17,11 @@ class Interpreter(InterpreterBase):
     def __set_variable(self, key: str, val=None) -> None:
         self.__variables[key] = val
 
-    def __get_variable(self, key: str):
+    def __get_variable(self, key: str, line_num: int|None = None):
         try:
             return self.__variables[key]
         except:
-            super().error(ErrorType.NAME_ERROR, f"Variable {key} has not been defined")
+            super().error(ErrorType.NAME_ERROR, f"Variable {key} has not been defined", line_num)
 
     def run(self, program) -> None:
         ast = parse_program(program)  # generate Abstract Syntax Tree of the program
@@ -34,7 +34,7 @@ class Interpreter(InterpreterBase):
         for func in ast.get("functions"):
             func_name = func.get("name")
             if func_name in self.__functions:
-                super().error(ErrorType.NAME_ERROR, f"Function {func_name} defined more than once")
+                super().error(ErrorType.NAME_ERROR, f"Function {func_name} defined more than once", func.lineno)
 
             self.__functions[func_name] = func
 
@@ -59,13 +59,13 @@ class Interpreter(InterpreterBase):
             case NODE_TYPE.FUNC_CALL:  # print("Hello, World!");
                 self.do_func_call(statement_node)
             case _:
-                super().error(ErrorType.TYPE_ERROR, f"Unknown statement type: {category}")
+                super().error(ErrorType.TYPE_ERROR, f"Unknown statement type: {category}", statement_node.lineno)
 
     # -- Statement node handlers-- #
     def do_var_definition(self, vardef_node: Element) -> None:
         var_name: str = vardef_node.get("name")
         if var_name in self.__variables: # check if variable is already defined
-            super().error(ErrorType.NAME_ERROR, f"Variable {var_name} defined more than once")
+            super().error(ErrorType.NAME_ERROR, f"Variable {var_name} defined more than once", vardef_node.lineno)
 
         self.__set_variable(var_name)
 
@@ -73,7 +73,7 @@ class Interpreter(InterpreterBase):
         var_name: str = assignment_node.get("name")  # lfs
         expression_node: Element = assignment_node.get("expression")  # rhs
         if var_name not in self.__variables: # check if variable is defined
-            super().error(ErrorType.NAME_ERROR, f"Variable {var_name} has not been defined")
+            super().error(ErrorType.NAME_ERROR, f"Variable {var_name} has not been defined", assignment_node.lineno)
 
         self.__set_variable(var_name, self.evaluate_expression(expression_node))
 
@@ -90,7 +90,7 @@ class Interpreter(InterpreterBase):
                 try:
                     return self.run_func_node(self.__functions[func_name], args)
                 except:
-                    super().error(ErrorType.NAME_ERROR, f"Function {func_name} has not been defined")
+                    super().error(ErrorType.NAME_ERROR, f"Function {func_name} has not been defined", fcall_node.lineno)
 
 
     def run_expression_node(self, expression_node: Element) -> Any:
@@ -99,7 +99,7 @@ class Interpreter(InterpreterBase):
         op1_val, op2_val = self.evaluate_expression(op1), self.evaluate_expression(op2)
 
         if type(op1_val) != type(op2_val):
-            super().error(ErrorType.TYPE_ERROR, "Incompatible types for arithmetic operation")
+            super().error(ErrorType.TYPE_ERROR, "Incompatible types for arithmetic operation", expression_node.lineno)
 
         category: str = expression_node.elem_type
         match category:
@@ -108,20 +108,20 @@ class Interpreter(InterpreterBase):
             case NODE_TYPE.SUBTRACTION:
                 return op1_val - op2_val
             case _:
-                super().error(ErrorType.TYPE_ERROR, f"Unknown expression type: {category}")
+                super().error(ErrorType.TYPE_ERROR, f"Unknown expression type: {category}", expression_node.lineno)
                 
     def evaluate_expression(self, node: Element) -> Any:
         match node.elem_type:
             case NODE_TYPE.INT_VALUE | NODE_TYPE.STRING_VALUE:
                 return node.get("val")
             case NODE_TYPE.VARIABLE:
-                return self.__get_variable(node.get("name"))
+                return self.__get_variable(node.get("name"), node.lineno)
             case NODE_TYPE.FUNC_CALL:
                 return self.do_func_call(node)
             case NODE_TYPE.ADDITION | NODE_TYPE.SUBTRACTION:
                 return self.run_expression_node(node)
             case _:
-                super().error(ErrorType.TYPE_ERROR, f"Unknown operand type: {node.elem_type}")
+                super().error(ErrorType.TYPE_ERROR, f"Unknown operand type: {node.elem_type}", node.lineno)
 
 
     # -- Pre-defined functions -- #
@@ -133,7 +133,7 @@ class Interpreter(InterpreterBase):
 
     def inputi(self, args: list[Element]) -> int:  # get int input from user
         if len(args) > 1:
-            super().error(ErrorType.NAME_ERROR, "inputi() function found that takes > 1 parameter")
+            super().error(ErrorType.NAME_ERROR, "inputi() function found that takes > 1 parameter", args[1].lineno)
 
         if args:
             prompt = self.evaluate_expression(args[0]) # NOTE: assume the prompt is a string
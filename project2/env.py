@@ -6,48 +6,35 @@ from type import Type, Value
 # anything you like. In our implementation we pass in a Value object which holds a type
 # and a value (e.g., Int, 10).
 class EnvironmentManager:
-    def __init__(self, enclosing=None):
-        self.environment = {}
-        self.enclosing = enclosing # parent environment
+    # a frame for one function call: a slot per variable of the function, where the resolver put it (see resolve.py),
+    # so variables are read and assigned by index, with no lookup by name
+    def __init__(self, size=0):
+        self.environment = [None] * size
 
-    # Gets the data associated a variable name
-    def get(self, symbol: str) -> Value | None:
-        if symbol in self.environment:
-            return self.environment[symbol]
-        if self.enclosing:
-            return self.enclosing.get(symbol)
-        return None
+    # Gets the data associated a variable
+    def get(self, slot: int | None) -> Value | None:
+        if slot is None:
+            return None
+        return self.environment[slot]
 
-    # assign a value to a variable name
-    def assign(self, symbol: str, value: Value) -> bool:
-        if symbol in self.environment:
-            self.environment[symbol] = value
-            return True
-        if self.enclosing:
-            self.enclosing.assign(symbol, value)
-            return True
-        return False
+    # assign a value to a variable
+    def assign(self, slot: int | None, value: Value) -> bool:
+        if slot is None:
+            return False
+        self.environment[slot] = value
+        return True
 
     # variable declaration
-    def create(self, symbol: str, val=None) -> bool:
+    def create(self, slot: int | None, val=None) -> bool:
         if val is None: val = Value(Type.NIL, None)
-        if symbol not in self.environment:
-            self.environment[symbol] = val
-            return True
-        return False
-    
-    def begin_scope(self):
-        return EnvironmentManager(self)
-    
-    def end_scope(self):
-        return self.enclosing if self.enclosing else self
+        if slot is None:
+            return False
+        self.environment[slot] = val
+        return True
 
-    def _print(self, env_name='ENV'):
+    def _print(self, names: dict[str, int], env_name='ENV'):
         print(f"{'=' * 4} {env_name:^10} {'=' * 4}")
-        if self.enclosing:
-            print(f"| 👉 {'Enclosing':<10}|")
-            self.enclosing._print()
         print(f"| 👉 {'Local':<14} |")
-        for key, item in self.environment.items():
-            print(f"|  {key:<5}: {item.value():<10}|")
+        for key, slot in names.items():
+            print(f"|  {key:<5}: {self.environment[slot].value():<10}|")
         print(f"{'=' * 20}")
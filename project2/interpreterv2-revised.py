@@ -2,6 +2,7 @@ from brewparse import parse_program
 from element import Element
 from env import EnvironmentManager
 from intbase import ErrorType, InterpreterBase
+from resolve import Annotator
 from type import *
 
 
@@ -11,6 +12,7 @@ class Interpreter(InterpreterBase):
         self.trace_output = trace_output  # debug purpose
         self.env = EnvironmentManager()  # store variables
         self.func_table: dict[tuple[str, int], Element] = {}  # key: (func name, arg count)
+        self.resolved: dict[tuple[str, int], tuple] = {}  # key: (func name, arg count), see __resolve
 
     def run(self, program) -> None:
         ast = parse_program(program)  # generate Abstract Syntax Tree of the program
@@ -22,7 +24,7 @@ class Interpreter(InterpreterBase):
         for func_node in ast.get("functions"):
             func_name = func_node.get("name")
             if func_name in self.func_table:
-                super().error(ErrorType.NAME_ERROR, f"Function {func_name} defined more than once")
+                super().error(ErrorType.NAME_ERROR, f"Function {func_name} defined more than once", func_node.lineno)
 
             self.func_table[(func_name, len(func_node.get("args")))] = func_node
 
@@ -32,6 +34,17 @@ class Interpreter(InterpreterBase):
 
         return self.func_table[func_key]
 
+    def __resolve(self, func_hash: tuple[str, int], func_node: Element) -> tuple[dict, list, list[Element], int]:
+        """ Resolve a function before its first call (see resolve.Annotator): the slots of its parameters, by name
+        and in order, its statements with the slots of their variables and the size of its frame. """
+        if func_hash not in self.resolved:
+            param_names = [arg_node.get("name") for arg_node in func_node.get("args")]
+            annotator = Annotator(param_names)
+            statements = annotator.block(func_node.get("statements"))
+            params = {name: slot for name, slot in zip(param_names, annotator.resolver.params) if slot is not None}
+            self.resolved[func_hash] = params, annotator.resolver.params, statements, annotator.resolver.size
+        return self.resolved[func_hash]
+
     def __run_statements(self, statement_nodes: list[Element]) -> tuple[Value, ExecStatus]:
         for statement in statement_nodes:
             if self.trace_output: print(" 👩‍💻 ", statement)  # debug
@@ -55,20 +68,20 @@ class Interpreter(InterpreterBase):
                 case Statement.RETURN:  # return immediately
                     return self.__call_return(statement)
                 case _:
-                    super().error(ErrorType.TYPE_ERROR, f"Unknown statement type: {category}")
+                    super().error(ErrorType.TYPE_ERROR, f"Unknown statement type: {category}", statement.lineno)
 
         return create_value(Type.NIL), ExecStatus.CONTINUE
 
     def __var_def(self, vardef_node: Element) -> None:
         var_name = vardef_node.get("name")
-        if not self.env.create(var_name):
-            super().error(ErrorType.NAME_ERROR, f"Variable {var_name} has already been defined")
+        if not self.env.create(vardef_node.slot):
+            super().error(ErrorType.NAME_ERROR, f"Variable {var_name} has already been defined", vardef_node.lineno)
 
     def __assign(self, assign_node: Element) -> None:
         var_name = assign_node.get("name")
         var_value = self.__eval_expr(assign_node.get("expression"))
-        if not self.env.assign(var_name, var_value):
-            super().error(ErrorType.NAME_ERROR, f"Variable {var_name} has not been defined")
+        if not self.env.assign(assign_node.slot, var_value):
+            super().error(ErrorType.NAME_ERROR, f"Variable {var_name} has not been defined", assign_node.lineno)
 
     def __call_func(self, fcall_node: Element) -> Value|None:
         func_name = fcall_node.get("name")
@@ -80,23 +93,21 @@ class Interpreter(InterpreterBase):
             case _:  # user-defined function
                 func_hash = (func_name, len(fcall_node.get("args")))
                 if func_hash not in self.func_table:
-                    super().error(ErrorType.NAME_ERROR, f"Function {func_name} not found")
+                    super().error(ErrorType.NAME_ERROR, f"Function {func_name} not found", fcall_node.lineno)
 
                 func_node = self.func_table[func_hash]
-                param_names = [arg_node.get("name") for arg_node in func_node.get("args")]
+                params, param_slots, statements, size = self.__resolve(func_hash, func_node)
                 arg_values = [self.__eval_expr(arg) for arg in fcall_node.get("args")]
 
-                self.env.push_env()  # new environment for function call
+                self.env.push_env(size)  # new environment for function call
 
                 # map arguments to parameters and add to environment
-                for param_name, arg_value in zip(param_names, arg_values):
-                    self.env.create(param_name, arg_value)
+                for slot, arg_value in zip(param_slots, arg_values):
+                    self.env.create(slot, arg_value)
 
-                if self.trace_output: self.env.print(func_name)  # debug
+                if self.trace_output: self.env.print(params, func_name)  # debug
 
-                self.env.push_block()
-                result, _ = self.__run_statements(func_node.get("statements"))
-                self.env.pop_block()
+                result, _ = self.__run_statements(statements)
 
                 self.env.pop_env()
                 return result
@@ -104,9 +115,7 @@ class Interpreter(InterpreterBase):
     def __call_if(self, if_node: Element) -> tuple[Value, ExecStatus]:
         condition = self.__eval_expr(if_node.get("condition"))
         if condition.type != Type.BOOL:
-            super().error(ErrorType.TYPE_ERROR, "If condition must be a boolean")
-
-        self.env.push_block()  # new child scope for if statement body
+            super().error(ErrorType.TYPE_ERROR, "If condition must be a boolean", if_node.get("condition").lineno)
 
         result, ret = create_value(Type.NIL), ExecStatus.CONTINUE
         if condition.value:
@@ -114,8 +123,6 @@ class Interpreter(InterpreterBase):
         elif if_node.get("else_statements"):
             result, ret = self.__run_statements(if_node.get("else_statements"))
 
-        self.env.pop_block()
-
         return result, ret
 
     def __call_for(self, for_node: Element) -> tuple[Value, ExecStatus]:
@@ -124,9 +131,9 @@ class Interpreter(InterpreterBase):
         update: Element = for_node.get("update")
 
         if init.elem_type != Statement.ASSIGNMENT:
-            super().error(ErrorType.TYPE_ERROR, "For loop initialization must be a variable declaration")
+            super().error(ErrorType.TYPE_ERROR, "For loop initialization must be a variable declaration", init.lineno)
         if update.elem_type != Statement.ASSIGNMENT:
-            super().error(ErrorType.TYPE_ERROR, "For loop update must be an assignment")
+            super().error(ErrorType.TYPE_ERROR, "For loop update must be an assignment", update.lineno)
 
         self.__assign(init)
         result, ret = create_value(Type.NIL), ExecStatus.CONTINUE
@@ -134,12 +141,10 @@ class Interpreter(InterpreterBase):
         while True:
             condition_result = self.__eval_expr(condition)
             if condition_result.type != Type.BOOL:
-                super().error(ErrorType.TYPE_ERROR, "For loop condition must be a boolean")
+                super().error(ErrorType.TYPE_ERROR, "For loop condition must be a boolean", condition.lineno)
             if condition_result.value is False: break
 
-            self.env.push_block()  # new child scope for for loop body
             result, ret = self.__run_statements(for_node.get("statements"))
-            self.env.pop_block()
             if ret == ExecStatus.RETURN: break
 
             self.__assign(update)
@@ -161,9 +166,9 @@ class Interpreter(InterpreterBase):
             return create_value(expr, expr_node.get("val"))
         if expr == "var":
             var_name: str = expr_node.get("name")
-            val = self.env.get(var_name)
+            val = self.env.get(expr_node.slot)
             if val is None:
-                super().error(ErrorType.NAME_ERROR, f"Variable {var_name} not found")
+                super().error(ErrorType.NAME_ERROR, f"Variable {var_name} not found", expr_node.lineno)
             return val
         if expr == Statement.FUNC_CALL:
             return self.__call_func(expr_node)
@@ -172,13 +177,14 @@ class Interpreter(InterpreterBase):
         if expr in BinaryOps:
             return self.__eval_op(expr_node)
 
-        super().error(ErrorType.TYPE_ERROR, f"Unknown operand type: {expr}")
+        super().error(ErrorType.TYPE_ERROR, f"Unknown operand type: {expr}", expr_node.lineno)
 
     def __eval_unary_op(self, expr_node: Element) -> Value:  # neg, !
         val = self.__eval_expr(expr_node.get("op1"))
         op_func = get_operator_lambda(val.type, expr_node.elem_type)
         if op_func is None:
-            super().error(ErrorType.TYPE_ERROR, f"Incompatible types for '{expr_node.elem_type}' operation")
+            super().error(ErrorType.TYPE_ERROR, f"Incompatible types for '{expr_node.elem_type}' operation",
+                          expr_node.lineno)
         return op_func(val)
 
     def __eval_op(self, expr_node: Element) -> Value:
@@ -187,12 +193,12 @@ class Interpreter(InterpreterBase):
 
         # only equality check is allowed for different types
         if oper not in EqualOps and lhs.type != rhs.type:
-            super().error(ErrorType.TYPE_ERROR, f"Incompatible types for {oper} operation")
+            super().error(ErrorType.TYPE_ERROR, f"Incompatible types for {oper} operation", expr_node.lineno)
 
         op_func = get_operator_lambda(lhs.type, oper)
         if op_func is None:
             super().error(ErrorType.TYPE_ERROR,
-                          f"Incompatible types '{lhs.type}' and '{rhs.type}' for '{oper}' operation")
+                          f"Incompatible types '{lhs.type}' and '{rhs.type}' for '{oper}' operation", expr_node.lineno)
         return op_func(lhs, rhs)
 
     def __call_print(self, fcall_node: Element) -> Value:
@@ -201,7 +207,7 @@ class Interpreter(InterpreterBase):
         for arg in args:
             printable = get_printable(self.__eval_expr(arg))
             if printable is None:
-                super().error(ErrorType.TYPE_ERROR, "Non-printable type for print()")
+                super().error(ErrorType.TYPE_ERROR, "Non-printable type for print()", arg.lineno)
             s += printable
         super().output(s)
         return create_value(Type.NIL)
@@ -209,7 +215,7 @@ class Interpreter(InterpreterBase):
     def __call_input(self, fcall_node: Element) -> Value:
         args = fcall_node.get("args")
         if len(args) > 1:
-            super().error(ErrorType.NAME_ERROR, "inputi() function got more than one parameter")
+            super().error(ErrorType.NAME_ERROR, "inputi() function got more than one parameter", fcall_node.lineno)
 
         if args:
             prompt = get_printable(self.__eval_expr(args[0]))
@@ -4,6 +4,7 @@ from brewparse import parse_program
 from element import Element
 from env import EnvironmentManager
 from intbase import ErrorType, InterpreterBase
+from resolve import Annotator
 from type import *
 
 
@@ -13,18 +14,21 @@ class Interpreter(InterpreterBase):
         self.trace_output = trace_output # debug purpose
         self.env = EnvironmentManager() # store variables
         self.function_table: dict[tuple[str, int], Element] = {} # key: (func name, arg count)
+        self.resolved: dict[tuple[str, int], tuple] = {} # key: (func name, arg count), see __resolve
 
     def run(self, program) -> None:
         ast = parse_program(program) # generate Abstract Syntax Tree of the program
         self.__set_function_table(ast)
         main_func = self.__get_func_by_name(("main", 0))
-        self.__run_statements(main_func.get("statements"))
+        _, _, statements, size = self.__resolve(("main", 0), main_func)
+        self.env = EnvironmentManager(size)
+        self.__run_statements(statements)
 
     def __set_function_table(self, ast: Element) -> None:
         for func_node in ast.get("functions"):
             func_name = func_node.get("name")
             if func_name in self.function_table:
-                super().error(ErrorType.NAME_ERROR, f"Function {func_name} defined more than once")
+                super().error(ErrorType.NAME_ERROR, f"Function {func_name} defined more than once", func_node.lineno)
 
             self.function_table[(func_name, len(func_node.get("args")))] = func_node
 
@@ -34,6 +38,17 @@ class Interpreter(InterpreterBase):
             
         return self.function_table[func_key]
     
+    def __resolve(self, func_hash: tuple[str, int], func_node: Element) -> tuple[dict, list, list[Element], int]:
+        """ Resolve a function before its first call (see resolve.Annotator): the slots of its parameters, by name
+        and in order, its statements with the slots of their variables and the size of its frame. """
+        if func_hash not in self.resolved:
+            param_names = [arg_node.get("name") for arg_node in func_node.get("args")]
+            annotator = Annotator(param_names)
+            statements = annotator.block(func_node.get("statements"))
+            params = {name: slot for name, slot in zip(param_names, annotator.resolver.params) if slot is not None}
+            self.resolved[func_hash] = params, annotator.resolver.params, statements, annotator.resolver.size
+        return self.resolved[func_hash]
+
     def __run_statements(self, statement_nodes: list[Element]) -> tuple[Value, ExecStatus]:      
         for statement in statement_nodes:
             if self.trace_output: print(" 👩‍💻 ", statement) # debug
@@ -57,20 +72,20 @@ class Interpreter(InterpreterBase):
                 case Statement.RETURN: # return immediately
                     return self.__call_return(statement), ExecStatus.RETURN
                 case _:
-                    super().error(ErrorType.TYPE_ERROR, f"Unknown statement type: {category}")
+                    super().error(ErrorType.TYPE_ERROR, f"Unknown statement type: {category}", statement.lineno)
                     
         return Value(Type.NIL, None), ExecStatus.CONTINUE
 
     def __var_def(self, vardef_node: Element) -> None:
         var_name = vardef_node.get("name")
-        if not self.env.create(var_name):
-            super().error(ErrorType.NAME_ERROR, f"Variable {var_name} has already been defined")
+        if not self.env.create(vardef_node.slot):
+            super().error(ErrorType.NAME_ERROR, f"Variable {var_name} has already been defined", vardef_node.lineno)
 
     def __assign(self, assign_node: Element) -> None:
         var_name = assign_node.get("name")
         var_value = self.__eval_expr(assign_node.get("expression"))
-        if not self.env.assign(var_name, var_value):
-            super().error(ErrorType.NAME_ERROR, f"Variable {var_name} has not been defined")
+        if not self.env.assign(assign_node.slot, var_value):
+            super().error(ErrorType.NAME_ERROR, f"Variable {var_name} has not been defined", assign_node.lineno)
 
     def __call_func(self, fcall_node: Element) -> tuple[Value, ExecStatus]:
         func_name = fcall_node.get("name")
@@ -82,26 +97,23 @@ class Interpreter(InterpreterBase):
             case _: # user-defined function
                 func_hash = (func_name, len(fcall_node.get("args")))
                 if func_hash not in self.function_table:
-                    super().error(ErrorType.NAME_ERROR, f"Function {func_name} not found")
+                    super().error(ErrorType.NAME_ERROR, f"Function {func_name} not found", fcall_node.lineno)
                 
                 func_node = self.function_table[func_hash]
-                param_names = [arg_node.get("name") for arg_node in func_node.get("args")]
+                params, param_slots, statements, size = self.__resolve(func_hash, func_node)
                 arg_values = [self.__eval_expr(arg) for arg in fcall_node.get("args")]
                 
                 # new environment for function call
                 prev_env = self.env
-                self.env = EnvironmentManager()
+                self.env = EnvironmentManager(size)
                 
                 # map arguments to parameters
-                for param_name, arg_value in zip(param_names, arg_values):
-                    self.env.create(param_name, arg_value)
+                for slot, arg_value in zip(param_slots, arg_values):
+                    self.env.create(slot, arg_value)
 
-                if self.trace_output: self.env._print(func_name) # debug
+                if self.trace_output: self.env._print(params, func_name) # debug
                 
-                # new child scope for function body
-                self.env = self.env.begin_scope()
-                result, ret = self.__run_statements(func_node.get("statements"))
-                self.env = self.env.end_scope()
+                result, ret = self.__run_statements(statements)
 
                 # restore previous environment
                 self.env = prev_env
@@ -111,10 +123,7 @@ class Interpreter(InterpreterBase):
     def __call_if(self, if_node: Element) -> tuple[Value, ExecStatus]:
         condition = self.__eval_expr(if_node.get("condition"))
         if condition.type() != Type.BOOL:
-            super().error(ErrorType.TYPE_ERROR, "If condition must be a boolean")
-        
-        # new child scope for if statement body
-        self.env = self.env.begin_scope()
+            super().error(ErrorType.TYPE_ERROR, "If condition must be a boolean", if_node.get("condition").lineno)
         
         result, ret = Value(Type.NIL, None), ExecStatus.CONTINUE
         if condition.value():
@@ -122,8 +131,6 @@ class Interpreter(InterpreterBase):
         elif if_node.get("else_statements"):
             result, ret = self.__run_statements(if_node.get("else_statements"))
 
-        self.env = self.env.pop_block()
-
         return result, ret
     
     def __call_for(self, for_node: Element) -> tuple[Value, ExecStatus]:
@@ -132,9 +139,9 @@ class Interpreter(InterpreterBase):
         update: Element = for_node.get("update") 
 
         if init.elem_type != Statement.ASSIGNMENT:
-            super().error(ErrorType.TYPE_ERROR, "For loop initialization must be a variable declaration")
+            super().error(ErrorType.TYPE_ERROR, "For loop initialization must be a variable declaration", init.lineno)
         if update.elem_type != Statement.ASSIGNMENT:
-            super().error(ErrorType.TYPE_ERROR, "For loop update must be an assignment")
+            super().error(ErrorType.TYPE_ERROR, "For loop update must be an assignment", update.lineno)
         
         self.__assign(init)
         result, ret = Value(Type.NIL, None), ExecStatus.CONTINUE
@@ -142,13 +149,10 @@ class Interpreter(InterpreterBase):
         while True:
             condition_result = self.__eval_expr(condition)
             if condition_result.type() != Type.BOOL:
-                super().error(ErrorType.TYPE_ERROR, "For loop condition must be a boolean")
+                super().error(ErrorType.TYPE_ERROR, "For loop condition must be a boolean", condition.lineno)
             if condition_result.value() is False: break
             
-            # new child scope for for loop body
-            self.env = self.env.push_block()
             result, ret = self.__run_statements(for_node.get("statements"))
-            self.env = self.env.pop_block()
             if ret == ExecStatus.RETURN: break
             
             self.__assign(update)
@@ -169,9 +173,9 @@ class Interpreter(InterpreterBase):
             return Value(expr, None)
         if expr == Type.VARIABLE:
             var_name: str = expr_node.get("name")
-            val = self.env.get(var_name)
+            val = self.env.get(expr_node.slot)
             if val is None:
-                super().error(ErrorType.NAME_ERROR, f"Variable {var_name} not found")
+                super().error(ErrorType.NAME_ERROR, f"Variable {var_name} not found", expr_node.lineno)
             return val
         if expr == Statement.FUNC_CALL:
             return self.__call_func(expr_node)[0]
@@ -180,14 +184,15 @@ class Interpreter(InterpreterBase):
         if expr in Operator.BIN_OPS:
             return self.__eval_op(expr_node)
         
-        super().error(ErrorType.TYPE_ERROR, f"Unknown operand type: {expr}")
+        super().error(ErrorType.TYPE_ERROR, f"Unknown operand type: {expr}", expr_node.lineno)
 
     def __eval_unary_op(self, expr_node: Element) -> Value: # neg, !
         op = self.__eval_expr(expr_node.get("op1"))
         try:
             return Operator.OP_TO_LAMBDA[op.type()][expr_node.elem_type](op)
         except KeyError:
-            super().error(ErrorType.TYPE_ERROR, f"Incompatible operator {expr_node.elem_type} for type {op.type()}")
+            super().error(ErrorType.TYPE_ERROR, f"Incompatible operator {expr_node.elem_type} for type {op.type()}",
+                          expr_node.lineno)
         
     def __eval_op(self, expr_node: Element) -> Value:
         oper = expr_node.elem_type
@@ -199,12 +204,12 @@ class Interpreter(InterpreterBase):
                 return Value(Type.BOOL, lhs.type() == rhs.type())
             if oper == "!=":
                 return Value(Type.BOOL, lhs.type() != rhs.type())
-            super().error(ErrorType.TYPE_ERROR, f"Incompatible types for {oper} operation")
+            super().error(ErrorType.TYPE_ERROR, f"Incompatible types for {oper} operation", expr_node.lineno)
         
         try:
             return Operator.OP_TO_LAMBDA[lhs.type()][oper](lhs, rhs)
         except KeyError:
-            super().error(ErrorType.TYPE_ERROR, f"Incompatible operator {oper} for type {lhs.type()}")
+            super().error(ErrorType.TYPE_ERROR, f"Incompatible operator {oper} for type {lhs.type()}", expr_node.lineno)
 
     def __call_print(self, fcall_node) -> Value:
         args = fcall_node.get("args")
@@ -215,7 +220,7 @@ class Interpreter(InterpreterBase):
     def __call_input(self, fcall_node) -> Value:
         args = fcall_node.get("args")
         if len(args) > 1:
-            super().error(ErrorType.NAME_ERROR, "inputi() function that takes > 1 parameter")
+            super().error(ErrorType.NAME_ERROR, "inputi() function that takes > 1 parameter", fcall_node.lineno)
             
         if args:
             prompt = get_printable(self.__eval_expr(args[0]))
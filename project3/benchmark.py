@@ -0,0 +1,821 @@
+""" Interpreter benchmarks for Brewin v3. Run with: python benchmark.py <name> [...] """
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "project"))
+
+import brewparse
+from brewgen import generate
+import interpreterv3
+from element import DottedName, Element
+from env import EnvironmentManager
+from intbase import ErrorType
+from interpreterv3 import Interpreter
+from optimize import CommonSubexpressions, ConstantFolder, Inliner, LoopInvariants, Optimizer
+from transpile import PythonTranspiler
+from type import BasicType
+from vm import VM, disassemble
+
+
+def linked_list_program(length: int = 300, rounds: int = 20) -> str:
+    """ Builds a linked list and walks it over and over, so nearly every statement reads or writes a.b fields. """
+    return f"""
+struct node {{ value: int; next: node; }}
+struct holder {{ head: node; count: int; }}
+func main(): void {{
+  var h: holder;
+  var cur: node;
+  var i: int;
+  var r: int;
+  var total: int;
+  h = new holder;
+  h.head = new node;
+  cur = h.head;
+  for (i = 0; i < {length}; i = i + 1) {{
+    cur.next = new node;
+    cur.next.value = i;
+    h.head.next.value = h.head.next.value + cur.value;
+    cur = cur.next;
+    h.count = h.count + 1;
+  }}
+  for (r = 0; r < {rounds}; r = r + 1) {{
+    total = 0;
+    for (cur = h.head.next; cur != nil; cur = cur.next) {{
+      total = total + cur.value;
+    }}
+  }}
+  print(total, " ", h.count);
+}}"""
+
+
+def timed(fn, repeat: int = 5) -> float:
+    """ Best wall time of fn() over a few runs, in seconds. """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(ast, engine: str = "ast", optimize: bool = False, env: EnvironmentManager|None = None) -> list:
+    """ Run a parsed program and return its output, with the variables in env if one is given. """
+    parse_program = interpreterv3.parse_program
+    interpreterv3.parse_program = lambda program: ast
+    try:
+        interpreter = Interpreter(console_output=False, engine=engine, optimize=optimize)
+        if env is not None:
+            interpreter.env = env
+        interpreter.run("")
+    finally:
+        interpreterv3.parse_program = parse_program
+    return interpreter.get_output()
+
+
+def plain_names(value):
+    """ Copy of a tree with dotted names as plain strings, the way the parser produced them before. """
+    if isinstance(value, DottedName):
+        return str(value)
+    if isinstance(value, Element):
+        return Element(value.elem_type, **{key: plain_names(child) for key, child in value.dict.items()})
+    if isinstance(value, list):
+        return [plain_names(child) for child in value]
+    return value
+
+
+class SplitEnvironment(EnvironmentManager):
+    """ EnvironmentManager as it was before the parser split dotted names: _traverse_scope splits every name it is
+    given and walks the fields of a plain one too. """
+    def _traverse_scope(self, symbol: str) -> tuple[dict|None, str, ErrorType|None]:
+        fields = symbol.split('.')
+        scope = self._find_scope(fields[0])
+
+        if scope is None:
+            return None, '', ErrorType.NAME_ERROR
+
+        # traverse nested fields up to the second-to-last field
+        for field in fields[:-1]:
+            if field not in scope: # field existence check
+                return None, '', ErrorType.NAME_ERROR
+
+            scope = scope.get(field)
+            if scope.type == BasicType.NIL: # nil check
+                return None, '', ErrorType.FAULT_ERROR
+
+            scope = scope.value # step into the next scope
+            if scope is None: # nil check
+                return None, '', ErrorType.FAULT_ERROR
+            if not isinstance(scope, dict): # struct type check
+                return None, '', ErrorType.TYPE_ERROR
+
+        return scope, fields[-1], None
+
+
+def bench_dotted() -> None:
+    """ Struct field access in the tree walker: the parser's old string names on the old lookup, which splits them
+    on every access, vs. the names it splits up front on the current one. """
+    ast = brewparse.parse_program(linked_list_program())
+    before = plain_names(ast)
+    assert run(ast) == run(before, env=SplitEnvironment())
+    split = presplit = float("inf")
+    for _ in range(10):  # alternated, so that both see the same load on the machine
+        split = min(split, timed(lambda: run(before, env=SplitEnvironment()), 1))
+        presplit = min(presplit, timed(lambda: run(ast), 1))
+    print(f"output: {run(ast)}")
+    print(f"split per access: {split * 1000:8.1f} ms")
+    print(f"pre-split paths : {presplit * 1000:8.1f} ms ({split / presplit:.2f}x)")
+
+
+# programs that fail at run time, each in a different check, on a line of its own
+ERROR_PROGRAMS = [
+    "func main(): void {\nvar x: int;\nx = \"a\";\n}",
+    "func main(): void {\nvar x: int;\nvar x: bool;\n}",
+    "func main(): void {\ny = 1;\n}",
+    "func main(): void {\nvar x: int;\nx = y;\n}",
+    "func main(): void {\nprint(f(1));\n}",
+    "func f(a: int): int {\nreturn true;\n} func main(): void {\nprint(f(1));\n}",
+    "func f(a: bool): int {\nreturn 1;\n} func main(): void {\nprint(f(\"s\"));\n}",
+    "func main(): void {\nif (\"s\") {\nprint(1);\n} }",
+    "func main(): void {\nvar i: int;\nfor (i = 0; \"s\"; i = i + 1) {\nprint(i);\n} }",
+    "func main(): void {\nprint(1 + true);\n}",
+    "func main(): void {\nprint(-true);\n}",
+    "func main(): void {\nprint(!\"s\");\n}",
+    "func main(): void {\nprint(\"a\" - \"b\");\n}",
+    "func main(): void {\nprint(1 / 0);\n}",
+    "struct a {\nx: int;\n} struct b {\nx: int;\n} "
+    "func main(): void {\nvar p: a;\nvar q: b;\np = new a;\nq = new b;\nprint(p == q);\n}",
+    "struct a {\nx: int;\nn: a;\n} func main(): void {\nvar p: a;\np = new a;\np.n.x = 1;\n}",
+    "struct a {\nx: int;\n} func main(): void {\nvar p: a;\np = new a;\np.y = 1;\n}",
+    "struct a {\nx: int;\n} func main(): void {\nvar p: a;\nprint(p);\np = new a;\nprint(p);\n}",
+    "func main(): void {\nvar x: foo;\n}",
+    "func g(): void {\nreturn;\n} func main(): void {\nprint(g());\n}",
+    "func main(): int {\nprint(inputi(\"a\", \"b\"));\n}",
+    "func main(): int {\nreturn \"s\";\n}",
+]
+
+
+# programs through the corners of v3's semantics; only the last one fails, in its last statement
+EDGE_PROGRAMS = [
+    # int to bool coercion in assignments, parameters, returns, conditions and logic operators
+    """func flip(b: bool): bool {
+  return !b;
+}
+func truth(n: int): bool {
+  return n;
+}
+func main(): void {
+  var b: bool;
+  var i: int;
+  b = 5;
+  print(b, " ", flip(0), " ", truth(3), " ", 1 && true, " ", 0 || 0, " ", !0, " ", 1 == true, " ", 2 != false);
+  for (i = 3; i; i = i - 1) {
+    if (i - 2) { print("i ", i); } else { print("two"); }
+  }
+  print("a" + "b", " ", "a" == "a", " ", -(3 - 10) / 2, " ", 7 / -2, " ", true != false);
+}""",
+    # struct identity, nil and the mix of both
+    """struct node { value: int; next: node; }
+struct other { value: int; }
+func make(v: int): node {
+  var n: node;
+  n = new node;
+  n.value = v;
+  return n;
+}
+func empty(): node {
+  return;
+}
+func main(): void {
+  var a: node;
+  var b: node;
+  var o: other;
+  print(a == nil, " ", nil == a, " ", a == b, " ", a != b);
+  a = make(1);
+  b = a;
+  print(a == b, " ", a == make(1), " ", a != nil, " ", a == 1, " ", "x" != a, " ", empty() == nil);
+  a.next = make(2);
+  b = a.next;
+  b.value = 20;
+  print(a.next.value, " ", a.next.next, " ", a.next.next == nil, " ", nil == nil);
+  a.next.next = nil;
+  print(o == nil);
+}""",
+    # shadowing across blocks, definitions in loop bodies, parameters shadowed by the body
+    """func f(x: int, x: int): int {
+  var x: string;
+  x = "body";
+  print(x);
+  return 1;
+}
+func g(n: int): int {
+  if (n > 0) { var n: int; n = 100; print("inner ", n); }
+  return n;
+}
+func main(): void {
+  var x: int;
+  var i: int;
+  x = 1;
+  if (true) {
+    var x: bool;
+    x = 5;
+    print(x);
+    if (x) { var x: string; x = "s"; print(x); }
+    print(x);
+  }
+  print(x, " ", f(1, 2), " ", g(5));
+  for (i = 0; i < 3; i = i + 1) {
+    var y: int;
+    y = y + i;
+    print(y);
+  }
+}""",
+    # void results, default returns, struct arguments and results of other types
+    """struct s { v: int; w: bool; t: string; }
+func nothing(): void {
+  print("nothing");
+}
+func fallthrough(): int {
+  var q: int;
+  q = 3;
+}
+func voidret(): int {
+  return nothing();
+}
+func defaults(): string {
+  return;
+}
+func set(p: s, v: int): void {
+  p.v = v;
+  p.w = v;
+  return;
+}
+func main(): void {
+  var p: s;
+  p = new s;
+  set(p, 7);
+  print(fallthrough(), " ", voidret(), " [", defaults(), "] ", p.v, " ", p.w, " [", p.t, "]");
+  set(p, 0);
+  print(p.w);
+}""",
+    # the expression changes the path of the field being assigned
+    """struct node { value: int; next: node; }
+func cut(n: node): int {
+  n.next = nil;
+  return 5;
+}
+func swap(n: node): int {
+  var m: node;
+  m = new node;
+  m.value = 99;
+  n.next = m;
+  return 6;
+}
+func main(): void {
+  var n: node;
+  var keep: node;
+  n = new node;
+  n.next = new node;
+  keep = n.next;
+  n.next.value = swap(n);
+  print(n.next.value, " ", keep.value);
+  n.next.value = cut(n);
+}""",
+]
+
+
+def outcome(ast, engine: str, optimize: bool = False, inp: list[str]|None = None,
+            env: EnvironmentManager|None = None) -> tuple[list, str|None]:
+    """ Output of a program and the error it stops with, if any. """
+    interpreter = Interpreter(console_output=False, inp=inp, engine=engine, optimize=optimize)
+    if env is not None:
+        interpreter.env = env
+    parse_program = interpreterv3.parse_program
+    interpreterv3.parse_program = lambda program: ast
+    try:
+        interpreter.run("")
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        interpreterv3.parse_program = parse_program
+    return interpreter.get_output(), error
+
+
+def recursion_program(n: int = 17) -> str:
+    """ Naive Fibonacci: nothing but calls, returns and a few int operations. """
+    return f"""
+func fib(n: int): int {{
+  if (n < 2) {{ return n; }}
+  return fib(n - 1) + fib(n - 2);
+}}
+func main(): void {{
+  print(fib({n}));
+}}"""
+
+
+WORKLOADS = {
+    "recursion": lambda: recursion_program(),
+    "loops": lambda: generate(3, functions=20, depth=3, trips=20, structs=0, seed=1),
+    "structs": lambda: linked_list_program(),
+}
+
+
+def checked_programs(extra: list[str] = ()) -> list:
+    """ Generated, struct-heavy, recursive and failing programs, and the extra ones. """
+    programs = [generate(3, functions=8, depth=depth, trips=4, structs=structs, seed=seed)
+                for seed in range(10) for depth in (1, 2, 3) for structs in (0, 2)]
+    return programs + [linked_list_program(50, 3), recursion_program(10)] + EDGE_PROGRAMS + ERROR_PROGRAMS + list(extra)
+
+
+def check_engine(engine: str, optimize: bool = False, extra: list[str] = (), form: str = "element") -> None:
+    """ Run generated, struct-heavy, recursive and failing programs through an engine and the tree walker, and
+    check they print the same and stop with the same error. An extra program can come with its input lines, as a
+    (program, lines) pair. The engine runs the program parsed to the given AST form, the tree walker always runs
+    Element trees. """
+    programs = checked_programs(extra)
+    for program in programs:
+        program, inp = program if isinstance(program, tuple) else (program, None)
+        ast = brewparse.parse_program(program)
+        expected = outcome(ast, "ast", inp=inp)
+        got = outcome(ast if form == "element" else brewparse.parse_program(program, form=form), engine, optimize, inp)
+        assert got == expected, (program, expected, got)
+    print(f"{len(programs)} programs ({len(ERROR_PROGRAMS)} failing): same output and errors as the tree walker"
+          + (", optimized" if optimize else "") + ("" if form == "element" else f", {form} AST"))
+
+
+def compare_engines(engines: list[str]) -> None:
+    print(f"{'':10} {'tree walker':>12}" + "".join(f" {engine:>16}" for engine in engines))
+    for label, program in WORKLOADS.items():
+        ast = brewparse.parse_program(program())
+        walk = timed(lambda: run(ast), 3)
+        times = [timed(lambda: run(ast, engine), 3) for engine in engines]
+        print(f"{label:10} {walk * 1000:9.1f} ms"
+              + "".join(f" {t * 1000:7.1f} ms {walk / t:5.2f}x" for t in times))
+
+
+def bench_closure() -> None:
+    """ The closure engine against the tree walker: same output and errors, then time. """
+    check_engine("closure")
+    compare_engines(["closure"])
+
+
+def bench_vm() -> None:
+    """ The bytecode VM against the tree walker: same output and errors, the code of a function, then time. """
+    check_engine("vm")
+    machine = VM(Interpreter(console_output=False))
+    ast = brewparse.parse_program(recursion_program())
+    machine.interpreter.func_table = {(func.get("name"), len(func.get("args"))): func for func in ast.get("functions")}
+    print(disassemble(machine.code(machine.function(("fib", 1)))))
+    compare_engines(["closure", "vm"])
+
+
+def bench_python() -> None:
+    """ The Python transpiler against the tree walker: same output and errors, translation and cached runs, then
+    time against every engine. """
+    check_engine("python")
+    program = generate(3, functions=20, depth=3, trips=20, seed=1)
+    ast = brewparse.parse_program(program)
+    interpreter = Interpreter(console_output=False)
+    interpreter.struct_table = {}
+    interpreter.func_table = {(func.get("name"), len(func.get("args"))): func for func in ast.get("functions")}
+    source = PythonTranspiler(interpreter).translate()
+    translate = timed(lambda: compile(PythonTranspiler(interpreter).translate(), "<brewin>", "exec"), 3)
+    print(f"{len(program.splitlines())} Brewin lines -> {len(source.splitlines())} Python lines, "
+          f"translated and compiled in {translate * 1000:.1f} ms (once per program, then cached)")
+    compare_engines(["closure", "vm", "python"])
+
+
+# literal arithmetic, constant conditions and the operations on literals the interpreter fails on
+FOLD_PROGRAMS = [
+    """func main(): void {
+  var x: int;
+  x = 2 * 3 + -4;
+  print(x - -5, " ", "a" + "b", " ", 1 == true, " ", !0, " ", nil == nil, " ", 7 / 2 * 2);
+  if (1) { print("one"); } else { print("never"); }
+  if (false) { print("no"); }
+  if (3 > 4 || false) { print("no"); } else { var x: string; x = "shadowed"; print(x); }
+  for (x = 3; 1 == 2; x = x + 1) { print("loop"); }
+  print(x);
+}""",
+    "func main(): void {\nprint(\"a\" + 1);\n}",
+    "func main(): void {\nvar x: int;\nx = 1;\nprint(x + 2 / (1 - 1));\n}",
+    "func main(): void {\nif (2 - 2) {\nprint(1);\n}\nif (\"s\" + \"t\") {\nprint(2);\n} }",
+    "func main(): void {\nvar i: int;\nfor (i = 0; true && false; i = i + 1 / 0) {\nprint(i);\n}\nprint(-(true));\n}",
+]
+
+
+def constants_program(trips: int = 2000) -> str:
+    """ A loop full of literal arithmetic and branches on constant conditions, as configuration values produce. """
+    return f"""
+func main(): void {{
+  var i: int;
+  var total: int;
+  for (i = 0; i < {trips}; i = i + 1) {{
+    total = total + 60 * 60 * 24 / (2 + 2) - (3 * 4 + 5);
+    if (1 + 1 == 3) {{ print("debug ", i); }}
+    if (10 > 2 * 4) {{ total = total - 1; }} else {{ total = total + 1; }}
+    if (!(2 < 1) && "a" + "b" == "ab") {{ total = total + i * (8 / 4); }}
+  }}
+  print(total);
+}}"""
+
+
+def bench_optimize() -> None:
+    """ Constant folding: every engine, optimized, against the unoptimized tree walker, then time with and
+    without it. """
+    ast = brewparse.parse_program(FOLD_PROGRAMS[0])
+    before = str(ast)
+    folder = ConstantFolder()
+    folded = folder.program(ast)
+    assert str(ast) == before, "the parsed tree was modified"
+    print(f"{folder.folded} operations folded, {folder.pruned} branches pruned")
+    for engine in Interpreter.ENGINES:
+        check_engine(engine, optimize=True, extra=FOLD_PROGRAMS)
+        for form in ("typed", "flat"):  # every pass, on the other forms parse_program returns
+            check_engine(engine, optimize=True, extra=FOLD_PROGRAMS + CSE_PROGRAMS + LICM_PROGRAMS, form=form)
+    assert str(folded) != before
+    ast = brewparse.parse_program(constants_program())
+    print(f"{'':10} {'plain':>10} {'optimized':>17}")
+    for engine in Interpreter.ENGINES:
+        plain, optimized = timed(lambda: run(ast, engine), 3), timed(lambda: run(ast, engine, optimize=True), 3)
+        print(f"{engine:10} {plain * 1000:7.1f} ms {optimized * 1000:7.1f} ms {plain / optimized:5.2f}x")
+
+
+# repeated pure expressions, and everything that must stop a value from being reused
+CSE_PROGRAMS = [
+    # fields changed through an alias, by a call, and in a branch; a variable shadowed and reassigned
+    """struct point { x: int; y: int; }
+struct box { p: point; q: point; }
+func move(p: point): void { p.x = p.x + 100; }
+func main(): void {
+  var b: box;
+  var a: point;
+  var n: int;
+  b = new box;
+  b.p = new point;
+  b.q = b.p;
+  b.p.x = 3;
+  n = 2;
+  print(b.p.x * n + b.q.x, " ", b.p.x * n + b.q.x);
+  b.q.x = 5;
+  print(b.p.x * n, " ", b.p.x * n);
+  move(b.q);
+  print(b.p.x * n);
+  a = b.p;
+  if (b.p.x * n > 0) { print(b.p.x * n); a.x = 1; print(b.p.x * n); }
+  print(b.p.x * n);
+  n = n + 1;
+  print(b.p.x * n);
+  if (true) { var n: int; n = 10; print(b.p.x * n, " ", b.p.x * n); }
+  print(b.p.x * n, " ", -n + n, " ", -n + n, " ", !(n > 2), " ", !(n > 2));
+}""",
+    # reuse across a for condition and its body, with the body changing what the condition reads
+    """struct node { value: int; next: node; }
+func main(): void {
+  var head: node;
+  var i: int;
+  var total: int;
+  head = new node;
+  head.next = new node;
+  head.next.value = 1;
+  for (i = 0; head.next.value < 50; i = i + head.next.value) {
+    total = total + head.next.value * head.next.value;
+    head.next.value = head.next.value * 2;
+    total = total + head.next.value * head.next.value;
+  }
+  print(i, " ", total, " ", head.next.value + i, " ", head.next.value + i);
+}""",
+    # the first occurrence fails on a nil struct: the error is raised where it was
+    "struct node {\nvalue: int;\nnext: node;\n} func main(): void {\nvar n: node;\nn = new node;\n"
+    "print(n.value + 1);\nprint(n.next.value + 1, n.next.value + 1);\n}",
+]
+
+
+def struct_fields_program(length: int = 200, rounds: int = 10) -> str:
+    """ Walks a linked list of points, reading the same fields of the current node in several statements. """
+    return f"""
+struct point {{ x: int; y: int; }}
+struct node {{ p: point; next: node; }}
+func main(): void {{
+  var head: node;
+  var n: node;
+  var i: int;
+  var r: int;
+  var total: int;
+  var inside: int;
+  for (i = 0; i < {length}; i = i + 1) {{
+    n = new node;
+    n.p = new point;
+    n.p.x = i;
+    n.p.y = {length} - i;
+    n.next = head;
+    head = n;
+  }}
+  for (r = 0; r < {rounds}; r = r + 1) {{
+    n = head;
+    for (i = 0; n != nil; i = i + 1) {{
+      total = total + n.p.x * n.p.x + n.p.y * n.p.y;
+      if (n.p.x * n.p.x + n.p.y * n.p.y < {length * length // 2}) {{ inside = inside + 1; }}
+      if (n.p.x - n.p.y > r) {{ total = total - (n.p.x - n.p.y); }}
+      n = n.next;
+    }}
+  }}
+  print(total, " ", inside);
+}}"""
+
+
+def bench_cse() -> None:
+    """ Common subexpressions: every engine against the unoptimized tree walker, then time on struct field reads
+    with and without the pass. """
+    ast = brewparse.parse_program(struct_fields_program())
+    sharing = CommonSubexpressions()
+    sharing.program(ast)
+    print(f"{sharing.shared} repeated expressions reused in the struct fields workload")
+    for engine in Interpreter.ENGINES:
+        check_engine(engine, optimize=True, extra=CSE_PROGRAMS)
+    print(f"{'':10} {'plain':>10} {'optimized':>17}")
+    for engine in Interpreter.ENGINES:
+        plain, optimized = timed(lambda: run(ast, engine), 3), timed(lambda: run(ast, engine, optimize=True), 3)
+        print(f"{engine:10} {plain * 1000:7.1f} ms {optimized * 1000:7.1f} ms {plain / optimized:5.2f}x")
+
+
+# loops with invariant expressions, and everything that keeps an expression from being one
+LICM_PROGRAMS = [
+    # nested loops and scopes: bounds invariant in the inner loop only, names shadowed or redefined in the body
+    """func main(): void {
+  var n: int;
+  var i: int;
+  var j: int;
+  var m: int;
+  var total: int;
+  n = 3;
+  for (i = 0; i < n * 2; i = i + 1) {
+    m = i * 3;
+    for (j = 0; j < m / 2 + n; j = j + 1) {
+      total = total + n * n + m;
+    }
+    if (i == 2) { var n: int; n = 100; total = total + n * 2; }
+  }
+  print(total, " ", n * 2);
+  for (i = 0; i < n * 4; i = i + 1) {
+    if (i == 5) { n = 1; }
+    print(i, " ", n * 4);
+  }
+}""",
+    # struct fields: changed through an alias, by a call, on another struct with the same field name
+    """struct cell { value: int; next: cell; }
+struct config { limit: cell; scale: cell; }
+func bump(c: config): void { c.scale.value = c.scale.value + 1; }
+func main(): void {
+  var cfg: config;
+  var alias: cell;
+  var other: cell;
+  var i: int;
+  var total: int;
+  cfg = new config;
+  cfg.limit = new cell;
+  cfg.scale = new cell;
+  cfg.limit.value = 4;
+  cfg.scale.value = 10;
+  other = new cell;
+  for (i = 0; i < cfg.limit.value; i = i + 1) { total = total + cfg.scale.value * 2; }
+  print(total);
+  alias = cfg.limit;
+  for (i = 0; i < cfg.limit.value; i = i + 1) { if (i == 1) { alias.value = 2; } }
+  print(i);
+  for (i = 0; i < cfg.limit.value + 3; i = i + 1) { total = total + cfg.scale.value; bump(cfg); }
+  print(total, " ", cfg.scale.value);
+  for (i = 0; i < 3; i = i + 1) { other.value = i; total = total + cfg.scale.value * cfg.limit.value; }
+  print(total);
+  for (i = 0; i < 3; i = i + 1) { cfg.limit = new cell; cfg.limit.value = i; print(cfg.limit.value + 1); }
+}""",
+    # a loop that never runs its body does not evaluate what is in it; recursion in the loop
+    """struct cell { value: int; next: cell; }
+func depth(c: cell, n: int): int {
+  var i: int;
+  var total: int;
+  for (i = 0; i < n * 2; i = i + 1) {
+    if (i == 1 && n > 0) { total = total + depth(c, n - 1); }
+    total = total + c.value * n;
+  }
+  return total;
+}
+func main(): void {
+  var c: cell;
+  var i: int;
+  c = new cell;
+  c.value = 2;
+  for (i = 0; i < 0; i = i + 1) { print(c.next.value + 1); }
+  print(depth(c, 3));
+}""",
+    # the first evaluation faults, after the body has printed
+    "struct cell {\nvalue: int;\nnext: cell;\n} func main(): void {\nvar c: cell;\nvar i: int;\nc = new cell;\n"
+    "for (i = 0; i < 3; i = i + 1) {\nprint(i);\nprint(c.next.value * 2);\n}\n}",
+    "func main(): void {\nvar i: int;\nvar z: int;\nfor (i = 0; i < 3; i = i + 1) {\nprint(i);\n"
+    "print(i + 10 / z);\nprint(10 / z);\n}\n}",
+]
+
+
+def invariants_program(trips: int = 400, rounds: int = 10) -> str:
+    """ Loops whose bounds and scale factors are read through struct fields and arithmetic they never change. """
+    return f"""
+struct cell {{ value: int; }}
+struct config {{ limit: cell; scale: cell; }}
+func main(): void {{
+  var cfg: config;
+  var n: int;
+  var r: int;
+  var i: int;
+  var total: int;
+  cfg = new config;
+  cfg.limit = new cell;
+  cfg.scale = new cell;
+  cfg.limit.value = {trips};
+  cfg.scale.value = 3;
+  n = {trips // 2};
+  for (r = 0; r < {rounds}; r = r + 1) {{
+    for (i = 0; i < n * 2 && i < cfg.limit.value; i = i + 1) {{
+      total = total + cfg.scale.value * cfg.scale.value + i;
+      if (i > cfg.limit.value - cfg.scale.value) {{ total = total - n * cfg.scale.value; }}
+    }}
+  }}
+  print(total);
+}}"""
+
+
+def bench_licm() -> None:
+    """ Loop-invariant code motion: every engine against the unoptimized tree walker, then time on loops with
+    invariant bounds and field reads with and without the passes. """
+    ast = brewparse.parse_program(invariants_program())
+    invariants = LoopInvariants()
+    invariants.program(ast)
+    print(f"{invariants.hoisted} expressions computed once per loop in the invariants workload")
+    for engine in Interpreter.ENGINES:
+        check_engine(engine, optimize=True, extra=LICM_PROGRAMS)
+    print(f"{'':10} {'plain':>10} {'optimized':>17}")
+    for engine in Interpreter.ENGINES:
+        plain, optimized = timed(lambda: run(ast, engine), 3), timed(lambda: run(ast, engine, optimize=True), 3)
+        print(f"{engine:10} {plain * 1000:7.1f} ms {optimized * 1000:7.1f} ms {plain / optimized:5.2f}x")
+
+
+# calls to small functions: conversions, scopes and returns the inlined bodies must keep, and what is not inlined
+INLINE_PROGRAMS = [
+    # coercions of arguments and results, parameters shadowing the caller's names, struct arguments assigned to,
+    # default results, returns from loops, inline bodies inside inline bodies and inside expressions
+    """struct cell { value: int; next: cell; }
+func truthy(x: bool): bool { return x; }
+func flag(x: int): bool { return x; }
+func twice(n: int): int { var t: int; t = n * 2; return t; }
+func shadow(total: int): int { var n: int; n = total + 1; if (n > 3) { var n: int; n = 1; } return n; }
+func bump(c: cell, by: int): void { c.value = c.value + by; by = 0; }
+func first(c: cell, n: int): int {
+  var i: int;
+  for (i = 0; i < n; i = i + 1) { if (i * i > c.value) { return i; } }
+}
+func nothing(): int { return; }
+func pick(b: bool, c: cell): cell { if (b) { return c; } return nil; }
+func main(): void {
+  var n: int;
+  var total: int;
+  var by: int;
+  var c: cell;
+  var d: cell;
+  c = new cell;
+  c.value = 10;
+  n = 5;
+  total = 7;
+  by = 1;
+  print(truthy(3), " ", flag(0), " ", twice(twice(n)), " ", shadow(n), " ", n, " ", total);
+  bump(c, 4);
+  bump(c, twice(by));
+  print(c.value, " ", by, " ", 1 + first(c, 10), " ", first(c, 2), " ", nothing());
+  d = pick(true, c);
+  print(d == c, " ", pick(false, c) == nil, " ", pick(0, c) == nil);
+  for (n = 0; n < 4; n = n + 1) { total = total + twice(n) + first(c, n); }
+  print(total);
+}""",
+    # recursion, direct and mutual, is not inlined; callers of recursive functions are
+    """func fib(n: int): int { if (n < 2) { return n; } return fib(n - 1) + fib(n - 2); }
+func even(n: int): bool { if (n == 0) { return true; } return odd(n - 1); }
+func odd(n: int): bool { if (n == 0) { return false; } return even(n - 1); }
+func both(n: int): int { if (even(n)) { return fib(n); } return 0 - fib(n); }
+func main(): void { print(both(10), " ", both(7), " ", odd(3)); }""",
+    # a function reading a variable it does not define fails even where the caller has one
+    "func leak(): int {\nreturn secret;\n}\nfunc main(): void {\nvar secret: int;\nsecret = 3;\nprint(leak());\n}",
+    # repeated parameter names, and functions defined twice: the last definition is the one called
+    """func dup(a: int, a: int): int { return a; }
+func f(x: int): int { return x + 1; }
+func f(x: int): int { return x + 2; }
+func main(): void { print(dup(1, 2), " ", f(1)); }""",
+    # arguments are all evaluated before the first conversion fails
+    "func say(s: string): string {\nprint(s);\nreturn s;\n}\nfunc g(x: int, y: int): int {\nreturn x + y;\n}\n"
+    "func main(): void {\nprint(g(say(\"a\"), say(\"b\")));\n}",
+    # a result that does not convert, and errors in the body, on their own lines
+    "func h(x: int): string {\nreturn x;\n}\nfunc main(): void {\nprint(\"before\");\nprint(h(1));\n}",
+    "func bad(): int {\nvar x: int;\nvar x: int;\nreturn x;\n}\nfunc main(): void {\nprint(1 + bad());\n}",
+    "func div(a: int, b: int): int {\nreturn a / b;\n}\nfunc main(): void {\nprint(div(4, 2));\nprint(div(1, 0));\n}",
+    # functions named like the builtins are never called: the builtins are
+    ("""func print(a: int): int { return 5; }
+func inputi(a: string): int { return 5; }
+func inputs(a: string): string { return "user"; }
+func main(): void { print(1); print(inputi("prompt "), " ", inputs("again ")); }""", ["42", "text"]),
+]
+
+
+def helpers_program(trips: int = 300, rounds: int = 10) -> str:
+    """ A loop that spends its time in calls to one-line helpers on ints and struct fields. """
+    return f"""
+struct point {{ x: int; y: int; }}
+func sq(n: int): int {{ return n * n; }}
+func max(a: int, b: int): int {{ if (a > b) {{ return a; }} return b; }}
+func clamp(n: int, lo: int, hi: int): int {{ return max(lo, 0 - max(0 - n, 0 - hi)); }}
+func dist(p: point): int {{ return sq(p.x) + sq(p.y); }}
+func move(p: point, dx: int): void {{ p.x = clamp(p.x + dx, 0, 50); p.y = clamp(p.y - dx, 0, 50); }}
+func main(): void {{
+  var p: point;
+  var r: int;
+  var i: int;
+  var total: int;
+  p = new point;
+  for (r = 0; r < {rounds}; r = r + 1) {{
+    for (i = 0; i < {trips}; i = i + 1) {{
+      move(p, i - r);
+      total = total + dist(p) + max(i, r);
+    }}
+  }}
+  print(total);
+}}"""
+
+
+def bench_inline() -> None:
+    """ Inlining of small functions: what the pass inlines in the helpers workload, every engine against the
+    unoptimized tree walker (with the default size limit, with one high enough to inline every candidate, and on
+    typed and flat trees), then time without the passes, with all of them but the inliner and with all of them. """
+    summaries = set()
+    for form in ("element", "typed", "flat"):
+        inliner = Inliner()
+        inliner.program(brewparse.parse_program(helpers_program(), form=form))
+        summaries.add(inliner.summary())
+    assert len(summaries) == 1, summaries
+    print(*summaries)
+    ast = brewparse.parse_program(helpers_program())
+    for engine in Interpreter.ENGINES:
+        check_engine(engine, optimize=True, extra=INLINE_PROGRAMS)
+        check_engine(engine, optimize=Optimizer(inline_size=1000), extra=INLINE_PROGRAMS)
+        for form in ("typed", "flat"):  # the same sizes and the same calls inlined whatever the form
+            check_engine(engine, optimize=True, extra=INLINE_PROGRAMS, form=form)
+    print(f"{'':10} {'plain':>10} {'no inlining':>19} {'optimized':>19} {'inlining':>9}")
+    for engine in Interpreter.ENGINES:
+        plain = without = optimized = float("inf")
+        for _ in range(5):  # alternated, so that all three see the same load on the machine
+            plain = min(plain, timed(lambda: run(ast, engine), 1))
+            without = min(without, timed(lambda: run(ast, engine, optimize=no_inlining()), 1))
+            optimized = min(optimized, timed(lambda: run(ast, engine, optimize=True), 1))
+        print(f"{engine:10} {plain * 1000:7.1f} ms {without * 1000:7.1f} ms {plain / without:5.2f}x "
+              f"{optimized * 1000:7.1f} ms {plain / optimized:5.2f}x {without / optimized:8.2f}x")
+
+
+def no_inlining() -> Optimizer:
+    """ The default passes but the inliner. """
+    optimizer = Optimizer()
+    optimizer.passes.remove(optimizer.inliner)
+    return optimizer
+
+
+def bench_frames() -> None:
+    """ The tree walker on slot frames against the dict per block it keeps for tracing: same output and errors in
+    every AST form, optimized or not, then the time of each workload. """
+    programs = checked_programs(FOLD_PROGRAMS + CSE_PROGRAMS + LICM_PROGRAMS + INLINE_PROGRAMS)
+    for program in programs:
+        program, inp = program if isinstance(program, tuple) else (program, None)
+        for form in ("element", "typed", "flat"):
+            ast = brewparse.parse_program(program, form=form)
+            for optimize in (False, True):
+                expected = outcome(ast, "ast", optimize, inp, env=EnvironmentManager())
+                assert outcome(ast, "ast", optimize, inp) == expected, (program, form, optimize, expected)
+    print(f"{len(programs)} programs in every AST form, optimized or not: same output and errors on frames")
+    print(f"{'':10} {'dict blocks':>12} {'slot frames':>18}")
+    for name, workload in WORKLOADS.items():
+        ast = brewparse.parse_program(workload())
+        blocks, frames = timed(lambda: run(ast, env=EnvironmentManager()), 3), timed(lambda: run(ast), 3)
+        print(f"{name:10} {blocks * 1000:9.1f} ms {frames * 1000:9.1f} ms {blocks / frames:5.2f}x")
+
+
+BENCHMARKS = {
+    "dotted": bench_dotted,
+    "closure": bench_closure,
+    "vm": bench_vm,
+    "python": bench_python,
+    "optimize": bench_optimize,
+    "cse": bench_cse,
+    "licm": bench_licm,
+    "inline": bench_inline,
+    "frames": bench_frames,
+}
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print(f"== {name} ==")
+        BENCHMARKS[name]()
@@ -0,0 +1,493 @@
+import operator
+
+from element import DottedName
+from env import get_field, traverse_fields
+from intbase import ErrorType
+from resolve import Resolver
+from type import *
+
+INT, BOOL, STRING, NIL, VOID = BasicType.INT, BasicType.BOOL, BasicType.STRING, BasicType.NIL, BasicType.VOID
+
+# binary operators that skip the generic checks when both operands have this type: (type, raw operator, result type),
+# the same results as OP_TO_LAMBDA gives for two operands of one type
+FAST_BINARY = {
+    "+": (INT, operator.add, INT),
+    "-": (INT, operator.sub, INT),
+    "*": (INT, operator.mul, INT),
+    "/": (INT, operator.floordiv, INT),
+    "<": (INT, operator.lt, BOOL),
+    "<=": (INT, operator.le, BOOL),
+    ">": (INT, operator.gt, BOOL),
+    ">=": (INT, operator.ge, BOOL),
+    "==": (INT, operator.eq, BOOL),
+    "!=": (INT, operator.ne, BOOL),
+    "&&": (BOOL, lambda x, y: x and y, BOOL),
+    "||": (BOOL, lambda x, y: x or y, BOOL),
+}
+
+
+class ClosureCompiler:
+    """ Execution engine that compiles each function of a v3 program, the first time it is called, into a tree of
+    Python closures: one per AST node, bound to its child closures, names, types and line numbers. Running them
+    skips the elem_type dispatch, set membership tests and get() calls the tree-walking interpreter repeats on every
+    execution of a node. Variables are resolved as the body is compiled (see resolve.py): a call runs its closures
+    on a frame, a list with a slot per variable, rather than on the interpreter's EnvironmentManager.
+
+    Semantics are the interpreter's, down to the order of evaluation and of the checks: every error is still raised
+    through Interpreter.error, at run time, with the same message and line. Statement closures take the frame and
+    return None to carry on, or the Value of an executed return statement. """
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.error = interpreter.error
+        self.functions = {}  # (name, arg count) -> invoke(arg values, line of the call)
+        self.resolver: Resolver|None = None  # of the function being compiled
+        self.temporaries: dict[int, int] = {}  # id of a cached node -> its slot, in the function being compiled
+        self.invariants: dict[int, int] = {}  # id of a loop invariant -> its slot, likewise
+
+    def run(self, main_func) -> None:
+        # like Interpreter.run, main's own node stands in for the call
+        self.function(("main", 0))([], main_func.lineno)
+
+    def get_type(self, var_type: str) -> Type|ErrorType:
+        if BasicType.contains(var_type):
+            return BasicType(var_type)
+        if var_type in self.interpreter.struct_table:
+            return StructType(var_type)
+        return ErrorType.TYPE_ERROR
+
+    # ---- functions ----
+
+    def function(self, key: tuple[str, int]):
+        """ The invoke closure of a user function, or None if there is no such function. The body is compiled on
+        the first call, so recursive functions and functions that are never called cost nothing up front. """
+        invoke = self.functions.get(key)
+        if invoke is None:
+            func_node = self.interpreter.func_table.get(key)
+            if func_node is None:
+                return None
+            invoke = self.functions[key] = self.compile_function(func_node)
+        return invoke
+
+    def compile_function(self, func_node):
+        error = self.error
+        func_name = func_node.get("name")
+        # a dict, as in Interpreter.__call_func: a repeated parameter name is bound once
+        params = {arg_node.get("name"): self.get_type(arg_node.get("var_type")) for arg_node in func_node.get("args")}
+        params = [(name, create_value(param_type)) for name, param_type in params.items()]
+        return_type = self.get_type(func_node.get("return_type"))
+        default = create_value(return_type)  # values are never modified, so one default serves every call
+        void = create_value(VOID)
+        body = size = None
+
+        def invoke(arg_values, lineno):
+            nonlocal body, size
+            if body is None:
+                self.resolver = Resolver([(name, param_value.t) for name, param_value in params])
+                self.temporaries, self.invariants = {}, {}
+                body = self.block(func_node.get("statements"))
+                size = self.resolver.size
+            frame = [None] * size  # the parameters come first
+            for slot, ((param_name, param_value), arg_value) in enumerate(zip(params, arg_values)):
+                if arg_value.t is not param_value.t:
+                    arg_value, converted = try_conversion(arg_value, param_value)
+                    if converted.type != arg_value.type:
+                        error(ErrorType.TYPE_ERROR,
+                              f"Function '{func_name}' expects '{converted.type}' type for '{param_name}'", lineno)
+                frame[slot] = arg_value
+            result = body(frame)
+
+            if result is None:
+                result = void
+            if result.t is return_type:
+                return result
+            return convert_result(error, func_name, default, result, lineno)
+        return invoke
+
+    # ---- statements ----
+
+    def block(self, statement_nodes):
+        self.resolver.push()
+        statements = tuple(self.statement(node) for node in statement_nodes)
+        self.resolver.pop()
+        if len(statements) == 1:
+            return statements[0]
+
+        def run_block(frame):
+            for statement in statements:
+                result = statement(frame)
+                if result is not None:
+                    return result
+        return run_block
+
+    def statement(self, node):
+        category = node.elem_type
+        if category == Statement.VAR_DEF:
+            return self.var_def(node)
+        if category == Statement.ASSIGNMENT:
+            return self.assign(node)
+        if category in (Statement.FUNC_CALL, Statement.INLINE):
+            call = self.call(node) if category == Statement.FUNC_CALL else self.inline(node)
+
+            def call_statement(frame):
+                call(frame)
+            return call_statement
+        if category == Statement.IF_STATEMENT:
+            return self.if_statement(node)
+        if category == Statement.FOR_STATEMENT:
+            return self.for_statement(node)
+        if category == Statement.RETURN:
+            return self.return_statement(node)
+        return self.failure(ErrorType.TYPE_ERROR, f"Statement '{category}' is unknown", node.lineno)
+
+    def failure(self, error_type, description, lineno, *operands):
+        """ A closure that raises the error when it runs, for code that can be compiled but fails when executed:
+        after evaluating the operands, if the interpreter evaluates them before it fails. """
+        error = self.error
+
+        def fail(frame):
+            for operand in operands:
+                operand(frame)
+            error(error_type, description, lineno)
+        return fail
+
+    def var_def(self, node):
+        var_name, lineno = node.get("name"), node.lineno
+        var_type = self.get_type(node.get("var_type"))
+        if isinstance(var_type, ErrorType):
+            return self.failure(var_type, f"Variable '{var_name}' has invalid type '{node.get('var_type')}'", lineno)
+        variable = self.resolver.define(var_name, var_type)
+        if variable is None:
+            return self.failure(ErrorType.NAME_ERROR, f"Variable '{var_name}' defined more than once", lineno)
+        slot, default = variable.slot, create_value(var_type)
+
+        def var_def(frame):
+            frame[slot] = default
+        return var_def
+
+    def assign(self, node):
+        var_name, lineno = node.get("name"), node.lineno
+        expression = self.expression(node.get("expression"))
+        error = self.error
+        variable = self.resolver.lookup(var_name)
+        if variable is None:  # the interpreter fails once it has evaluated the expression
+            return self.failure(ErrorType.NAME_ERROR, f"Variable '{var_name}' not found", lineno, expression)
+        slot = variable.slot
+
+        if isinstance(var_name, DottedName) or "." in var_name:
+            fields = var_name.path if isinstance(var_name, DottedName) else var_name.split(".")
+
+            def assign_field(frame):
+                var_def = get_field(frame[slot], fields)  # looked up before the expression runs, as in the interpreter
+                value = expression(frame)
+                if isinstance(var_def, ErrorType):
+                    error(var_def, f"Variable '{var_name}' not found", lineno)
+                if value.t is not var_def.t:
+                    value, var_def = try_conversion(value, var_def)
+                    if var_def.type != value.type:
+                        error(ErrorType.TYPE_ERROR, f"Cannot assign '{value.type}' to variable '{var_name}'", lineno)
+                scope, res = traverse_fields(frame[slot], fields)  # the expression may have changed the path
+                if res is not None:
+                    error(res, f"Cannot assign '{value.type}' to variable '{var_name}'", lineno)
+                scope[fields[-1]] = value
+            return assign_field
+
+        def assign_variable(frame):
+            value = expression(frame)
+            var_def = frame[slot]
+            if value.t is not var_def.t:
+                value, var_def = try_conversion(value, var_def)
+                if var_def.type != value.type:
+                    error(ErrorType.TYPE_ERROR, f"Cannot assign '{value.type}' to variable '{var_name}'", lineno)
+            frame[slot] = value
+        return assign_variable
+
+    def condition(self, node, description: str):
+        """ A closure for a condition, with the int to bool conversion and the check of the interpreter. """
+        expression = self.expression(node)
+        error, lineno = self.error, node.lineno
+        template = create_value(BOOL)
+
+        def condition(frame):
+            value = expression(frame)
+            if value.t is not BOOL:
+                value, _ = try_conversion(value, template)
+                if value.type != BOOL:
+                    error(ErrorType.TYPE_ERROR, description, lineno)
+            return value.v
+        return condition
+
+    def if_statement(self, node):
+        condition = self.condition(node.get("condition"), "'if' condition must be a boolean")
+        statements = self.block(node.get("statements"))
+        else_statements = self.block(node.get("else_statements")) if node.get("else_statements") else None
+
+        def if_statement(frame):
+            if condition(frame):
+                return statements(frame)
+            if else_statements is not None:
+                return else_statements(frame)
+        return if_statement
+
+    def for_statement(self, node):
+        init, update = node.get("init"), node.get("update")
+        if init.elem_type != Statement.ASSIGNMENT:
+            return self.failure(ErrorType.TYPE_ERROR, "'for' loop initialization must be a variable declaration",
+                                init.lineno)
+        if update.elem_type != Statement.ASSIGNMENT:
+            return self.failure(ErrorType.TYPE_ERROR, "'for' loop update must be an assignment", update.lineno)
+        invariants = [self.invariants.setdefault(invariant, self.resolver.temporary())
+                      for invariant in node.get("invariants") or ()]
+        init, update = self.assign(init), self.assign(update)
+        condition = self.condition(node.get("condition"), "'for' loop condition must be a boolean")
+        statements = self.block(node.get("statements"))
+
+        def for_statement(frame):
+            for slot in invariants:
+                frame[slot] = None  # computed again in this run of the loop
+            init(frame)
+            while condition(frame) is not False:
+                result = statements(frame)
+                if result is not None:
+                    return result
+                update(frame)
+        return for_statement
+
+    def return_statement(self, node):
+        if not node.get("expression"):
+            void = create_value(VOID)
+            return lambda frame: void
+        return self.expression(node.get("expression"))
+
+    # ---- expressions ----
+
+    def expression(self, node):
+        """ A closure that evaluates the expression node to a Value. """
+        expr = node.elem_type
+        if expr in VarType:
+            value = create_value(BasicType(expr), node.get("val"))
+            return lambda frame: value
+        if expr == BasicType.NIL.value:
+            value = create_value(NIL)
+            return lambda frame: value
+        if expr == "var":
+            return self.variable(node)
+        if expr in UnaryOps:
+            return self.unary_op(node)
+        if expr in BinaryOps:
+            return self.binary_op(node)
+        if expr == Statement.FUNC_CALL:
+            return self.call(node)
+        if expr == Statement.NEW:
+            return self.new_struct(node)
+        if expr == Statement.CACHED:
+            return self.cached(node)
+        if expr == Statement.INVARIANT:
+            return self.invariant(node)
+        if expr == Statement.INLINE:
+            return self.inline(node)
+        return self.failure(ErrorType.TYPE_ERROR, f"Operand '{expr}' is unknown", node.lineno)
+
+    def variable(self, node):
+        var_name, lineno = node.get("name"), node.lineno
+        variable = self.resolver.lookup(var_name)
+        if variable is None:
+            return self.failure(ErrorType.NAME_ERROR, f"Variable '{var_name}' not found", lineno)
+        slot = variable.slot
+        if isinstance(var_name, DottedName) or "." in var_name:
+            fields = var_name.path if isinstance(var_name, DottedName) else var_name.split(".")
+            error = self.error
+
+            def field(frame):
+                value = get_field(frame[slot], fields)
+                if isinstance(value, ErrorType):
+                    error(value, f"Variable '{var_name}' not found", lineno)
+                return value
+            return field
+
+        def variable(frame):
+            return frame[slot]
+        return variable
+
+    def cached(self, node):
+        """ A value kept in a slot of the frame where it is first computed, and read from it where it is reused
+        (see optimize.CommonSubexpressions): the reuse is compiled later, in the same block or a nested one. """
+        if node.get("expression") is None:
+            slot = self.temporaries[node.get("id")]
+            return lambda frame: frame[slot]
+        expression = self.expression(node.get("expression"))
+        slot = self.temporaries[node.get("id")] = self.resolver.temporary()
+
+        def cached(frame):
+            value = frame[slot] = expression(frame)
+            return value
+        return cached
+
+    def invariant(self, node):
+        """ A value computed the first time it is needed in a run of the loop that lists it, kept in a slot the loop
+        clears when it starts (see optimize.LoopInvariants). """
+        slot = self.invariants[node.get("id")]
+        expression = self.expression(node.get("expression"))
+
+        def invariant(frame):
+            value = frame[slot]
+            if value is None:
+                value = frame[slot] = expression(frame)
+            return value
+        return invariant
+
+    def new_struct(self, node):
+        struct_name = node.get("var_type")
+        struct_fields = self.interpreter.struct_table.get(struct_name)
+        if struct_fields is None:
+            return self.failure(ErrorType.TYPE_ERROR, f"Struct '{struct_name}' not found", node.lineno)
+        struct_type = StructType(struct_name)
+        return lambda frame: Value(struct_type, dict(struct_fields))
+
+    def unary_op(self, node):
+        oper, lineno = node.elem_type, node.lineno
+        operand = self.expression(node.get("op1"))
+        error = self.error
+        template = create_value(BOOL) if oper == "!" else create_value(INT)
+        fast_type = template.t
+
+        def unary_op(frame):
+            value = operand(frame)
+            if value.t is fast_type:
+                return Value(fast_type, not value.v if fast_type is BOOL else -value.v)
+            value, _ = try_conversion(value, template)
+            op_func = get_operator_lambda(value.type, oper)
+            if op_func is None:
+                error(ErrorType.TYPE_ERROR, f"Incompatible types for '{oper}' operation", lineno)
+            return op_func(value)
+        return unary_op
+
+    def binary_op(self, node):
+        oper, lineno = node.elem_type, node.lineno
+        left, right = self.expression(node.get("op1")), self.expression(node.get("op2"))
+        error = self.error
+        fast_type, raw, result_type = FAST_BINARY.get(oper, (None, None, None))
+
+        def binary_op(frame):
+            lhs, rhs = left(frame), right(frame)
+            if lhs.t is fast_type and rhs.t is fast_type:
+                return Value(result_type, raw(lhs.v, rhs.v))
+            return apply_binary(error, oper, lhs, rhs, lineno)
+        return binary_op
+
+    def call(self, node):
+        func_name, lineno = node.get("name"), node.lineno
+        if func_name == "print":
+            return self.print_call(node)
+        if func_name in ("inputi", "inputs"):
+            return self.input_call(node)
+        args = node.get("args")
+        invoke = self.function((func_name, len(args)))
+        if invoke is None:  # looked up before the arguments are evaluated
+            return self.failure(ErrorType.NAME_ERROR, f"Function '{func_name}' with {len(args)} params not found",
+                                lineno)
+        args = [self.expression(arg) for arg in args]
+        return lambda frame: invoke([arg(frame) for arg in args], lineno)
+
+    def inline(self, node):
+        """ A call the optimizer replaced with the function's body (see optimize.Inliner), compiled into the frame
+        of the caller: its parameters and variables get slots in blocks of their own, as they would in a call. """
+        func_name, lineno = node.get("name"), node.lineno
+        args = [self.expression(arg) for arg in node.get("args")]
+        error = self.error
+        return_type = self.get_type(node.get("return_type"))
+        default = create_value(return_type)
+        void = create_value(VOID)
+        self.resolver.push()
+        params = []
+        for param_name, param_type in node.get("params"):
+            param_type = self.get_type(param_type)
+            params.append((self.resolver.define(param_name, param_type).slot, param_name, create_value(param_type)))
+        body = self.block(node.get("statements"))
+        self.resolver.pop()
+
+        def inline(frame):
+            arg_values = [arg(frame) for arg in args]
+            for (slot, param_name, param_value), arg_value in zip(params, arg_values):
+                if arg_value.t is not param_value.t:
+                    arg_value, converted = try_conversion(arg_value, param_value)
+                    if converted.type != arg_value.type:
+                        error(ErrorType.TYPE_ERROR,
+                              f"Function '{func_name}' expects '{converted.type}' type for '{param_name}'", lineno)
+                frame[slot] = arg_value
+            result = body(frame)
+
+            if result is None:
+                result = void
+            if result.t is return_type:
+                return result
+            return convert_result(error, func_name, default, result, lineno)
+        return inline
+
+    def print_call(self, node):
+        args = [(self.expression(arg_node), arg_node.lineno) for arg_node in node.get("args")]
+        error, output = self.error, self.interpreter.output
+        void = create_value(VOID)
+
+        def print_call(frame):
+            s = ""
+            for arg, lineno in args:
+                printable = get_printable(arg(frame))
+                if printable is None:
+                    error(ErrorType.TYPE_ERROR, "Non-printable type for print()", lineno)
+                s += printable
+            output(s)
+            return void
+        return print_call
+
+    def input_call(self, node):
+        if len(node.get("args")) > 1:
+            return self.failure(ErrorType.NAME_ERROR, "inputi() can take only one parameter", node.lineno)
+        args = [self.expression(arg) for arg in node.get("args")]
+        interpreter = self.interpreter
+        func_name = node.get("name")
+
+        def input_call(frame):
+            if args:
+                interpreter.output(get_printable(args[0](frame)))
+            usr_input = interpreter.get_input()
+            if func_name == "inputi":
+                return create_value(INT, int(usr_input))
+            return create_value(STRING, usr_input)
+        return input_call
+
+
+def convert_result(error, func_name: str, default: Value, result: Value, lineno) -> Value:
+    """ The value a call returns, from the result of the function's body: Interpreter.__return_value. """
+    return_type = default.type
+    if result.type == VOID and result.type != return_type:
+        return default  # no return statement, or a return without a value
+    result, _ = try_conversion(result, default)
+    if result.type != return_type:
+        error(ErrorType.TYPE_ERROR, f"Function '{func_name}' must return '{return_type}' type", lineno)
+    return result
+
+
+def apply_binary(error, oper: str, lhs: Value, rhs: Value, lineno) -> Value:
+    """ Interpreter.__eval_op once both operands are evaluated: coercions, struct and nil equality, and its checks. """
+    if oper in EqualOps:
+        if isinstance(lhs.type, StructType) or isinstance(rhs.type, StructType):
+            if isinstance(lhs.type, StructType) and isinstance(rhs.type, StructType) and lhs.type != rhs.type:
+                error(ErrorType.TYPE_ERROR, f"Incompatible types '{lhs.type}' and '{rhs.type}' for '{oper}' operation",
+                      lineno)
+            lhs, rhs = normalize_struct(lhs), normalize_struct(rhs)
+            if isinstance(lhs.type, StructType) or isinstance(rhs.type, StructType):
+                return get_operator_lambda(StructType.STRUCT, oper)(lhs, rhs)
+        else:
+            lhs, rhs = coercion_by_priority(lhs, rhs)
+    elif oper in LogicOps:
+        lhs, _ = try_conversion(lhs, create_value(BOOL))
+        rhs, _ = try_conversion(rhs, create_value(BOOL))
+    else:
+        lhs, rhs = coercion_by_priority(lhs, rhs)
+
+    if lhs.type != rhs.type:
+        error(ErrorType.TYPE_ERROR, f"Incompatible types '{lhs.type}' and '{rhs.type}' for '{oper}' operation", lineno)
+    op_func = get_operator_lambda(lhs.type, oper)
+    if op_func is None:
+        error(ErrorType.TYPE_ERROR, f"Incompatible types '{lhs.type}' and '{rhs.type}' for '{oper}' operation", lineno)
+    return op_func(lhs, rhs)
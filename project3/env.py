@@ -1,8 +1,11 @@
+from element import DottedName
 from intbase import ErrorType
 from type import *
 
 class EnvironmentManager:
     """ The EnvironmentManager class keeps a mapping between each variable (aka symbol) in a Brewin program and the value of that variable """
+    # variables are found by name, in a dict per block, which print() shows; the slots the resolver gives them (see
+    # FrameManager) are ignored
     def __init__(self):
         self.environment = [[{}]] # [[{}], [{},{}], ...]
 
@@ -13,30 +16,24 @@ class EnvironmentManager:
         return None
 
     def _traverse_scope(self, symbol: str) -> tuple[dict|None, str, ErrorType|None]:
-        fields = symbol.split('.')
+        if isinstance(symbol, DottedName): # the parser splits a.b.c up front
+            fields = symbol.path
+        elif '.' in symbol:
+            fields = symbol.split('.')
+        else: # plain variable, the common case
+            scope = self._find_scope(symbol)
+            if scope is None:
+                return None, '', ErrorType.NAME_ERROR
+            return scope, symbol, None
         scope = self._find_scope(fields[0])
 
         if scope is None:
             return None, '', ErrorType.NAME_ERROR
 
-        # traverse nested fields up to the second-to-last field
-        for field in fields[:-1]:
-            if field not in scope: # field existence check
-                return None, '', ErrorType.NAME_ERROR
-
-            scope = scope.get(field)
-            if scope.type == BasicType.NIL: # nil check
-                return None, '', ErrorType.FAULT_ERROR
-
-            scope = scope.value # step into the next scope
-            if scope is None: # nil check
-                return None, '', ErrorType.FAULT_ERROR
-            if not isinstance(scope, dict): # struct type check
-                return None, '', ErrorType.TYPE_ERROR
+        scope, error = traverse_fields(scope[fields[0]], fields)
+        return scope, fields[-1], error
 
-        return scope, fields[-1], None
-
-    def get(self, symbol: str) -> Value|ErrorType:
+    def get(self, symbol: str, slot: int|None = None) -> Value|ErrorType:
         """ Gets the data associated a variable name. Return ErrorType if the variable does not exist. """
         scope, field, error = self._traverse_scope(symbol)
         if error is not None: return error
@@ -44,14 +41,14 @@ class EnvironmentManager:
         val = scope.get(field)
         return val if val is not None else ErrorType.NAME_ERROR
 
-    def assign(self, symbol: str, value: Value) -> ErrorType|None:
+    def assign(self, symbol: str, value: Value, slot: int|None = None) -> ErrorType|None:
         """ Assign a value to a variable name. Return ErrorType if the variable does not exist. """
         scope, field, error = self._traverse_scope(symbol)
         if error is not None: return error
 
         scope[field] = value
 
-    def create(self, symbol: str, val: Value) -> bool:
+    def create(self, symbol: str, val: Value, slot: int|None = None) -> bool:
         """ Declare a variable at the top environment with a given value. Return False if the variable already exists. """
         # if val is None: val = Value(BasicType.NIL, None) # v3 must declare type in a variable declaration
         curr_env = self.environment[-1][-1]
@@ -60,7 +57,11 @@ class EnvironmentManager:
             return True
         return False # variable already declared
 
-    def push_env(self):
+    def set_local(self, symbol: str, val: Value, slot: int|None = None) -> None:
+        """ Bind a variable at the top environment, whether or not it already exists. """
+        self.environment[-1][-1][symbol] = val
+
+    def push_env(self, size: int = 0):
         self.environment.append([{}])
 
     def pop_env(self):
@@ -88,3 +89,89 @@ class EnvironmentManager:
                 self.__print_value(sub_key, sub_item, indent + 2)
         elif isinstance(item, Value):
             print(f"|{' ' * indent}  {key:<6}: {item.type} {str(item.value):<{max(0, 12-indent)}}|")
+
+
+class FrameManager:
+    """ The variables of the function calls being run, with the interface of EnvironmentManager: each call has a
+    frame, a list with a slot per variable of the function, and every variable comes with the slot the resolver
+    gave it before the function ran (see resolve.Annotator), None if it has no definition in scope. Reading or
+    assigning one is an index into the frame, with no dict probe per block; the name only matters for its fields. """
+    def __init__(self):
+        self.frames = [[]]
+        self.frame = self.frames[-1]
+
+    def get(self, symbol: str, slot: int|None) -> Value|ErrorType:
+        """ Gets the data associated a variable name. Return ErrorType if the variable does not exist. """
+        if slot is None: return ErrorType.NAME_ERROR
+
+        val = self.frame[slot]
+        if isinstance(symbol, DottedName):
+            return get_field(val, symbol.path)
+        if '.' in symbol:
+            return get_field(val, symbol.split('.'))
+        return val if val is not None else ErrorType.NAME_ERROR
+
+    def assign(self, symbol: str, value: Value, slot: int|None) -> ErrorType|None:
+        """ Assign a value to a variable name. Return ErrorType if the variable does not exist. """
+        if slot is None: return ErrorType.NAME_ERROR
+
+        if isinstance(symbol, DottedName) or '.' in symbol:
+            fields = symbol.path if isinstance(symbol, DottedName) else symbol.split('.')
+            scope, error = traverse_fields(self.frame[slot], fields)
+            if error is not None: return error
+            scope[fields[-1]] = value
+        else:
+            self.frame[slot] = value
+
+    def create(self, symbol: str, val: Value, slot: int|None) -> bool:
+        """ Declare a variable with a given value. Return False if the variable is already defined in its block. """
+        if slot is None: return False # the resolver found it defined before
+        self.frame[slot] = val
+        return True
+
+    def set_local(self, symbol: str, val: Value, slot: int) -> None:
+        self.frame[slot] = val
+
+    def push_env(self, size: int = 0):
+        self.frame = [None] * size
+        self.frames.append(self.frame)
+
+    def pop_env(self):
+        self.frames.pop()
+        self.frame = self.frames[-1]
+
+    def push_block(self):
+        pass # blocks have their slots in the frame of the call
+
+    def pop_block(self):
+        pass
+
+
+def traverse_fields(value: Value, fields: list[str]) -> tuple[dict|None, ErrorType|None]:
+    """ Follow a.b.c from the value of variable a: the fields of the struct holding c, or the error on the way. """
+    scope = None
+    for index, field in enumerate(fields[:-1]):
+        if index: # the variable itself was found by the caller
+            if field not in scope: # field existence check
+                return None, ErrorType.NAME_ERROR
+            value = scope.get(field)
+
+        if value.type == BasicType.NIL: # nil check
+            return None, ErrorType.FAULT_ERROR
+
+        scope = value.value # step into the next scope
+        if scope is None: # nil check
+            return None, ErrorType.FAULT_ERROR
+        if not isinstance(scope, dict): # struct type check
+            return None, ErrorType.TYPE_ERROR
+
+    return scope, None
+
+
+def get_field(value: Value, fields: list[str]) -> Value|ErrorType:
+    """ Like EnvironmentManager.get for a.b.c, from the value of variable a. """
+    scope, error = traverse_fields(value, fields)
+    if error is not None: return error
+
+    val = scope.get(fields[-1])
+    return val if val is not None else ErrorType.NAME_ERROR
@@ -1,24 +1,62 @@
 from brewparse import parse_program
+from compiler import ClosureCompiler
 from element import Element
-from env import EnvironmentManager
+from env import EnvironmentManager, FrameManager
 from intbase import InterpreterBase, ErrorType
+from optimize import Optimizer
+from resolve import Annotator
+from transpile import PythonTranspiler, cache_key, cached_code
 from type import *
+from vm import VM
 
 
 class Interpreter(InterpreterBase):
-    def __init__(self, console_output=True, inp=None, trace_output=False):
+    ENGINES = ("ast", "closure", "vm", "python")
+
+    def __init__(self, console_output=True, inp=None, trace_output=False, engine="ast", optimize=False):
         super().__init__(console_output, inp)
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown engine: {engine}")
         self.trace_output = trace_output # debug purpose
-        self.env = EnvironmentManager() # store variables
+        # "ast" walks the tree; "closure" compiles each function into closures first (see compiler.py), "vm" into
+        # bytecode for a stack machine (see vm.py), "python" into Python code (see transpile.py); tracing always
+        # walks the tree
+        self.engine = engine
+        # fold constants, inline small functions, mark loop invariants and share common subexpressions (see
+        # optimize.py): True for the default settings, or an Optimizer, which keeps the statistics of each pass
+        self.optimize = optimize
+        # store variables: in slot frames (see resolve.py), or by name in a dict per block, which tracing prints
+        self.env = EnvironmentManager() if trace_output else FrameManager()
         self.func_table: dict[tuple[str, int], Element] = {} # {(func_name, arg_count): func_node}
         self.struct_table: dict[str, dict[str, Value]] = {} # {struct_name: {field_name: Value}}
+        self.resolved: dict[tuple[str, int], tuple] = {} # {(func_name, arg_count): (params, statements, frame size)}
 
     def run(self, program) -> None:
         ast = parse_program(program) # generate Abstract Syntax Tree of the program
+        optimizer = None
+        if self.optimize:
+            optimizer = self.optimize if isinstance(self.optimize, Optimizer) else Optimizer()
+        python = self.engine == "python" and not self.trace_output
+        if python and self.optimize is True:
+            # the translation keeps an inlined body as a call (see transpile.py), so inlining would only cost time
+            optimizer.passes.remove(optimizer.inliner)
+        key = None
+        if python:
+            key = cache_key(getattr(ast, "source", None), optimizer.settings() if optimizer else "")
+        # a program translated before runs its cached code, so its tree is only optimized for the translation
+        if optimizer and cached_code(key) is None:
+            ast = optimizer.program(ast)
         self.__set_struct_table(ast.get("structs"))
         self.__set_function_table(ast.get("functions"))
         main_func = self.__get_func_by_name(("main", 0))
-        self.__call_func(main_func)
+        if self.engine == "closure" and not self.trace_output:
+            ClosureCompiler(self).run(main_func)
+        elif self.engine == "vm" and not self.trace_output:
+            VM(self).run(main_func)
+        elif python:
+            PythonTranspiler(self).run(main_func, key)
+        else:
+            self.__call_func(main_func)
 
     def __set_function_table(self, func_nodes: list[Element]) -> None:
         for func_node in func_nodes:
@@ -27,15 +65,17 @@ class Interpreter(InterpreterBase):
             return_type = func_node.get("return_type")
 
             if func_name in self.func_table: # check duplicated function
-                super().error(ErrorType.NAME_ERROR, f"Function '{func_name}' defined more than once")
+                super().error(ErrorType.NAME_ERROR, f"Function '{func_name}' defined more than once", func_node.lineno)
             if return_type not in FuncType and return_type not in self.struct_table: # check return type
-                super().error(ErrorType.TYPE_ERROR, f"Function '{func_name}' has invalid return type '{return_type}'")
+                super().error(ErrorType.TYPE_ERROR, f"Function '{func_name}' has invalid return type '{return_type}'",
+                              func_node.lineno)
 
             for param in params: # check param types
                 param_type = param.get("var_type")
                 if param_type not in VarType and param_type not in self.struct_table:
                     super().error(ErrorType.TYPE_ERROR,
-                                  f"Function '{func_name}' has invalid parameter type '{param_type}' for '{param.get('name')}'")
+                                  f"Function '{func_name}' has invalid parameter type '{param_type}' for '{param.get('name')}'",
+                                  param.lineno)
 
             self.func_table[(func_name, len(func_node.get("args")))] = func_node
 
@@ -44,9 +84,9 @@ class Interpreter(InterpreterBase):
             struct_name = struct_node.get("name")
 
             if BasicType.contains(struct_name):
-                super().error(ErrorType.NAME_ERROR, f"Struct '{struct_name}' is invalid name")
+                super().error(ErrorType.NAME_ERROR, f"Struct '{struct_name}' is invalid name", struct_node.lineno)
             if struct_name in self.struct_table:
-                super().error(ErrorType.NAME_ERROR, f"Struct '{struct_name}' defined more than once")
+                super().error(ErrorType.NAME_ERROR, f"Struct '{struct_name}' defined more than once", struct_node.lineno)
 
             self.struct_table[struct_name] = {} # hold namespace in case a field type references itself (ex. List{next:List})
 
@@ -57,7 +97,8 @@ class Interpreter(InterpreterBase):
 
                 if isinstance(var_type, ErrorType): # or var_type in [BasicType.NIL, BasicType.VOID] ?
                     super().error(var_type,
-                                  f"Struct '{struct_name}' has invalid type '{field_node.get('var_type')}' for '{field_name}'")
+                                  f"Struct '{struct_name}' has invalid type '{field_node.get('var_type')}' for '{field_name}'",
+                                  field_node.lineno)
 
                 fields[field_name] = create_value(var_type)
 
@@ -71,13 +112,27 @@ class Interpreter(InterpreterBase):
         else:
             return ErrorType.TYPE_ERROR
 
-    def __get_func_by_name(self, func_key: tuple[str, int]) -> Element:
+    def __get_func_by_name(self, func_key: tuple[str, int], line_num: int|None = None) -> Element:
         func_name, arg_count = func_key
         if func_key not in self.func_table:
-            super().error(ErrorType.NAME_ERROR, f"Function '{func_name}' with {arg_count} params not found")
+            super().error(ErrorType.NAME_ERROR, f"Function '{func_name}' with {arg_count} params not found", line_num)
 
         return self.func_table[func_key]
 
+    def __resolve(self, func_hash: tuple[str, int], func_node: Element) -> tuple[list, list[Element], int]:
+        """ A function as its calls run it, resolved before the first one (see resolve.Annotator): its parameters
+        with their types and slots, its statements with the slots of their variables, and the size of its frame. """
+        if func_hash not in self.resolved:
+            # no need to check invalid parameter type since it's already checked in __set_function_table
+            params = {arg_node.get("name"): self.__get_type(arg_node.get("var_type")) for arg_node in func_node.get("args")}
+            annotator = Annotator(list(params.items()))
+            statements = annotator.block(func_node.get("statements"))
+            params = [(param_name, param_type, variable.slot)
+                      for (param_name, param_type), variable in zip(params.items(), annotator.resolver.params)]
+            self.resolved[func_hash] = params, statements, annotator.resolver.size
+
+        return self.resolved[func_hash]
+
     def __run_statements(self, statement_nodes: list[Element]) -> tuple[Value, ExecStatus]:
         for statement in statement_nodes:
             if self.trace_output: print(" 👩‍💻 ", statement)
@@ -90,6 +145,8 @@ class Interpreter(InterpreterBase):
                     self.__assign(statement)
                 case Statement.FUNC_CALL:
                     self.__call_func(statement)
+                case Statement.INLINE:
+                    self.__call_inline(statement)
                 case Statement.IF_STATEMENT:
                     result, ret = self.__call_if(statement)
                     if ret == ExecStatus.RETURN: # return early if return statement is encountered
@@ -101,7 +158,7 @@ class Interpreter(InterpreterBase):
                 case Statement.RETURN: # return immediately
                     return self.__call_return(statement)
                 case _:
-                    super().error(ErrorType.TYPE_ERROR, f"Statement '{category}' is unknown")
+                    super().error(ErrorType.TYPE_ERROR, f"Statement '{category}' is unknown", statement.lineno)
 
             if self.trace_output: self.env.print(category)
 
@@ -112,29 +169,31 @@ class Interpreter(InterpreterBase):
         var_type = self.__get_type(vardef_node.get("var_type"))
 
         if isinstance(var_type, ErrorType):
-            super().error(var_type, f"Variable '{var_name}' has invalid type '{vardef_node.get('var_type')}'")
+            super().error(var_type, f"Variable '{var_name}' has invalid type '{vardef_node.get('var_type')}'",
+                          vardef_node.lineno)
 
         var_value = create_value(var_type)
 
-        if not self.env.create(var_name, var_value):
-            super().error(ErrorType.NAME_ERROR, f"Variable '{var_name}' defined more than once")
+        if not self.env.create(var_name, var_value, vardef_node.slot):
+            super().error(ErrorType.NAME_ERROR, f"Variable '{var_name}' defined more than once", vardef_node.lineno)
 
     def __assign(self, assign_node: Element) -> None:
         var_name = assign_node.get("name")
-        var_def = self.env.get(var_name)
+        var_def = self.env.get(var_name, assign_node.slot)
         value = self.__eval_expr(assign_node.get("expression"))
 
         if isinstance(var_def, ErrorType):
-            super().error(var_def, f"Variable '{var_name}' not found")
+            super().error(var_def, f"Variable '{var_name}' not found", assign_node.lineno)
 
         value, var_def = try_conversion(value, var_def)
         if var_def.type != value.type:
-            super().error(ErrorType.TYPE_ERROR, f"Cannot assign '{value.type}' to variable '{var_name}'")
+            super().error(ErrorType.TYPE_ERROR, f"Cannot assign '{value.type}' to variable '{var_name}'",
+                          assign_node.lineno)
 
-        res = self.env.assign(var_name, value)
+        res = self.env.assign(var_name, value, assign_node.slot)
 
         if isinstance(res, ErrorType):
-            super().error(res, f"Cannot assign '{value.type}' to variable '{var_name}'")
+            super().error(res, f"Cannot assign '{value.type}' to variable '{var_name}'", assign_node.lineno)
 
     def __call_func(self, fcall_node: Element) -> Value:
         func_name = fcall_node.get("name")
@@ -145,51 +204,75 @@ class Interpreter(InterpreterBase):
                 return self.__call_input(fcall_node)
             case _: # user-defined function
                 func_hash = (func_name, len(fcall_node.get("args")))
-                func_node = self.__get_func_by_name(func_hash)
-
-                # no need to check invalid parameter type since it's already checked in __set_function_table
-                params = {arg_node.get("name"): self.__get_type(arg_node.get("var_type")) for arg_node in func_node.get("args")}
+                func_node = self.__get_func_by_name(func_hash, fcall_node.lineno)
+                params, statements, size = self.__resolve(func_hash, func_node)
                 arg_values = [self.__eval_expr(arg) for arg in fcall_node.get("args")]
 
-                self.env.push_env() # new environment for function call
-
-                # map arguments to parameters and add to environment
-                for (param_name,param_type), arg_value in zip(params.items(), arg_values):
-                    param_value = create_value(param_type)
-                    if param_value != arg_value.type:
-                        arg_value, param_value = try_conversion(arg_value, param_value)
-                        if param_value.type != arg_value.type:
-                            super().error(ErrorType.TYPE_ERROR,
-                                          f"Function '{func_name}' expects '{param_value.type}' type for '{param_name}'")
-                    self.env.create(param_name, arg_value)
+                self.env.push_env(size) # new environment for function call
+                self.__bind_params(func_name, params, arg_values, fcall_node.lineno)
 
                 if self.trace_output: self.env.print(func_name) # debug
 
                 self.env.push_block()
-                result, _ = self.__run_statements(func_node.get("statements"))
+                result, _ = self.__run_statements(statements)
                 self.env.pop_block()
                 self.env.pop_env()
 
-                # no need to check invalid return type since it's already checked in __set_function_table
-                return_type = self.__get_type(func_node.get("return_type"))
-                return_value = create_value(return_type)
+                return self.__return_value(func_name, func_node.get("return_type"), result, fcall_node.lineno)
+
+    def __call_inline(self, inline_node: Element) -> Value:
+        """ A call the optimizer replaced with the function's body (see optimize.Inliner): it runs in blocks pushed
+        on the caller's environment, since it reads no variable of the caller. """
+        func_name = inline_node.get("name")
+        params = getattr(inline_node, "typed_params", None)
+        if params is None: # typed on the first run, as __resolve types the parameters of a function
+            params = [(param_name, self.__get_type(param_type), slot)
+                      for (param_name, param_type), slot in zip(inline_node.get("params"), inline_node.slots)]
+            inline_node.typed_params = params # the node is the Annotator's copy, which only this interpreter runs
+        arg_values = [self.__eval_expr(arg) for arg in inline_node.get("args")]
+
+        self.env.push_block() # the parameters
+        self.__bind_params(func_name, params, arg_values, inline_node.lineno)
+        self.env.push_block()
+        result, _ = self.__run_statements(inline_node.get("statements"))
+        self.env.pop_block()
+        self.env.pop_block()
+
+        return self.__return_value(func_name, inline_node.get("return_type"), result, inline_node.lineno)
+
+    def __bind_params(self, func_name: str, params, arg_values: list[Value], lineno: int) -> None:
+        # map arguments to parameters and add to environment
+        for (param_name,param_type,slot), arg_value in zip(params, arg_values):
+            param_value = create_value(param_type)
+            if param_value != arg_value.type:
+                arg_value, param_value = try_conversion(arg_value, param_value)
+                if param_value.type != arg_value.type:
+                    super().error(ErrorType.TYPE_ERROR,
+                                  f"Function '{func_name}' expects '{param_value.type}' type for '{param_name}'",
+                                  lineno)
+            self.env.create(param_name, arg_value, slot)
+
+    def __return_value(self, func_name: str, return_type: str, result: Value, lineno: int) -> Value:
+        # no need to check invalid return type since it's already checked in __set_function_table
+        return_type = self.__get_type(return_type)
+        return_value = create_value(return_type)
 
-                # if function has no return statement or simply return without value, return default value
-                if result.type == BasicType.VOID and result.type != return_type:
-                    return return_value
+        # if function has no return statement or simply return without value, return default value
+        if result.type == BasicType.VOID and result.type != return_type:
+            return return_value
 
-                result, _ = try_conversion(result, return_value)
-                if result.type != return_type:
-                    super().error(ErrorType.TYPE_ERROR, f"Function '{func_name}' must return '{return_type}' type")
+        result, _ = try_conversion(result, return_value)
+        if result.type != return_type:
+            super().error(ErrorType.TYPE_ERROR, f"Function '{func_name}' must return '{return_type}' type", lineno)
 
-                return result
+        return result
 
     def __call_if(self, if_node: Element) -> tuple[Value, ExecStatus]:
         condition = self.__eval_expr(if_node.get("condition"))
         if condition.type != BasicType.BOOL:
             condition, _ = try_conversion(condition, create_value(BasicType.BOOL))
             if condition.type != BasicType.BOOL:
-                super().error(ErrorType.TYPE_ERROR, "'if' condition must be a boolean")
+                super().error(ErrorType.TYPE_ERROR, "'if' condition must be a boolean", if_node.get("condition").lineno)
 
         self.env.push_block() # new child scope for if statement body
 
@@ -209,10 +292,12 @@ class Interpreter(InterpreterBase):
         update: Element = for_node.get("update")
 
         if init.elem_type != Statement.ASSIGNMENT:
-            super().error(ErrorType.TYPE_ERROR, "'for' loop initialization must be a variable declaration")
+            super().error(ErrorType.TYPE_ERROR, "'for' loop initialization must be a variable declaration", init.lineno)
         if update.elem_type != Statement.ASSIGNMENT:
-            super().error(ErrorType.TYPE_ERROR, "'for' loop update must be an assignment")
+            super().error(ErrorType.TYPE_ERROR, "'for' loop update must be an assignment", update.lineno)
 
+        for invariant, slot in zip(for_node.get("invariants") or (), for_node.slots): # values the loop computes once
+            self.env.set_local(f"%{invariant}", None, slot) # (see optimize.py)
         self.__assign(init)
         result, ret = create_value(BasicType.VOID), ExecStatus.CONTINUE
 
@@ -221,7 +306,7 @@ class Interpreter(InterpreterBase):
             if condition_result.type != BasicType.BOOL:
                 condition_result, _ = try_conversion(condition_result, create_value(BasicType.BOOL))
                 if condition_result.type != BasicType.BOOL:
-                    super().error(ErrorType.TYPE_ERROR, "'for' loop condition must be a boolean")
+                    super().error(ErrorType.TYPE_ERROR, "'for' loop condition must be a boolean", condition.lineno)
             if condition_result.value is False: break
 
             self.env.push_block() # new child scope for for loop body
@@ -248,9 +333,9 @@ class Interpreter(InterpreterBase):
             return create_value(BasicType.NIL)
         if expr == "var": # can be struct type
             var_name = expr_node.get("name")
-            val = self.env.get(var_name)
+            val = self.env.get(var_name, expr_node.slot)
             if isinstance(val, ErrorType):
-                super().error(val, f"Variable '{var_name}' not found")
+                super().error(val, f"Variable '{var_name}' not found", expr_node.lineno)
             return val
         if expr in UnaryOps:
             return self.__eval_unary_op(expr_node)
@@ -260,14 +345,36 @@ class Interpreter(InterpreterBase):
             return self.__call_func(expr_node)
         if expr == Statement.NEW:
             return self.__new_struct(expr_node)
-
-        super().error(ErrorType.TYPE_ERROR, f"Operand '{expr}' is unknown")
+        if expr == Statement.CACHED:
+            return self.__eval_cached(expr_node)
+        if expr == Statement.INVARIANT:
+            return self.__eval_invariant(expr_node)
+        if expr == Statement.INLINE:
+            return self.__call_inline(expr_node)
+
+        super().error(ErrorType.TYPE_ERROR, f"Operand '{expr}' is unknown", expr_node.lineno)
+
+    def __eval_cached(self, expr_node: Element) -> Value:
+        name = f"#{expr_node.get('id')}" # no variable name can clash with it
+        if expr_node.get("expression") is None: # computed earlier in this block or an enclosing one
+            return self.env.get(name, expr_node.slot)
+        value = self.__eval_expr(expr_node.get("expression"))
+        self.env.set_local(name, value, expr_node.slot)
+        return value
+
+    def __eval_invariant(self, expr_node: Element) -> Value:
+        name = f"%{expr_node.get('id')}"
+        value = self.env.get(name, expr_node.slot)
+        if isinstance(value, ErrorType): # the first time in this run of the loop
+            value = self.__eval_expr(expr_node.get("expression"))
+            self.env.assign(name, value, expr_node.slot)
+        return value
 
     def __new_struct(self, expr_node: Element) -> Value:
         struct_name = expr_node.get("var_type")
 
         if struct_name not in self.struct_table:
-            super().error(ErrorType.TYPE_ERROR, f"Struct '{struct_name}' not found")
+            super().error(ErrorType.TYPE_ERROR, f"Struct '{struct_name}' not found", expr_node.lineno)
 
         struct_fields = self.struct_table[struct_name]
         value = { field: value for field, value in struct_fields.items() }
@@ -284,7 +391,8 @@ class Interpreter(InterpreterBase):
                 # check first if both struct types are different but uninitialized before normalization
                 if isinstance(lhs.type, StructType) and isinstance(rhs.type, StructType) and lhs.type != rhs.type:
                     super().error(ErrorType.TYPE_ERROR,
-                                  f"Incompatible types '{lhs.type}' and '{rhs.type}' for '{oper}' operation")
+                                  f"Incompatible types '{lhs.type}' and '{rhs.type}' for '{oper}' operation",
+                                  expr_node.lineno)
 
                 lhs, rhs = normalize_struct(lhs), normalize_struct(rhs) # normalize None value structs to NIL value
                 # return now in case comparing uninitialized struct with NIL
@@ -304,12 +412,12 @@ class Interpreter(InterpreterBase):
         # types must match except for equality operators
         if lhs.type != rhs.type:
             super().error(ErrorType.TYPE_ERROR,
-                          f"Incompatible types '{lhs.type}' and '{rhs.type}' for '{oper}' operation")
+                          f"Incompatible types '{lhs.type}' and '{rhs.type}' for '{oper}' operation", expr_node.lineno)
 
         op_func = get_operator_lambda(lhs.type, oper)
         if op_func is None:
             super().error(ErrorType.TYPE_ERROR,
-                          f"Incompatible types '{lhs.type}' and '{rhs.type}' for '{oper}' operation")
+                          f"Incompatible types '{lhs.type}' and '{rhs.type}' for '{oper}' operation", expr_node.lineno)
         return op_func(lhs, rhs)
 
     def __eval_unary_op(self, expr_node: Element) -> Value: # neg for INT, ! for BOOL
@@ -318,7 +426,8 @@ class Interpreter(InterpreterBase):
 
         op_func = get_operator_lambda(val.type, expr_node.elem_type)
         if op_func is None:
-            super().error(ErrorType.TYPE_ERROR, f"Incompatible types for '{expr_node.elem_type}' operation")
+            super().error(ErrorType.TYPE_ERROR, f"Incompatible types for '{expr_node.elem_type}' operation",
+                          expr_node.lineno)
         return op_func(val)
 
     def __call_print(self, fcall_node: Element) -> Value:
@@ -327,7 +436,7 @@ class Interpreter(InterpreterBase):
         for arg in args:
             printable = get_printable(self.__eval_expr(arg))
             if printable is None:
-                super().error(ErrorType.TYPE_ERROR, "Non-printable type for print()")
+                super().error(ErrorType.TYPE_ERROR, "Non-printable type for print()", arg.lineno)
             s += printable
         super().output(s)
 
@@ -336,7 +445,7 @@ class Interpreter(InterpreterBase):
     def __call_input(self, fcall_node: Element) -> Value:
         args = fcall_node.get("args")
         if len(args) > 1:
-            super().error(ErrorType.NAME_ERROR, "inputi() can take only one parameter")
+            super().error(ErrorType.NAME_ERROR, "inputi() can take only one parameter", fcall_node.lineno)
 
         if args:
             prompt = get_printable(self.__eval_expr(args[0])) # arg is always a string
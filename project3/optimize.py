@@ -0,0 +1,681 @@
+from compiler import apply_binary
+from element import DottedName, Element
+from resolve import Resolver, place, rebuild
+from type import *
+
+
+BUILTINS = ("print", "inputi", "inputs")  # always called as builtins, even where the program defines them
+
+
+class NotConstant(Exception):
+    """ An operation on literals that fails in the interpreter: it is left in the tree, to fail at run time. """
+
+
+def refuse(error_type, description, lineno):
+    raise NotConstant(description)
+
+
+def constant(node) -> Value|None:
+    """ The value of a literal, None for any other expression. """
+    expr = node.elem_type
+    if expr in VarType:
+        return create_value(BasicType(expr), node.get("val"))
+    if expr == BasicType.NIL.value:
+        return create_value(BasicType.NIL)
+    return None
+
+
+def literal(value: Value, node) -> Element:
+    """ The literal for a folded value, standing where the expression it replaces was. """
+    if value.type == BasicType.NIL:
+        new = Element(BasicType.NIL.value)
+    else:
+        new = Element(value.type.value, val=value.value)
+    return place(new, node)
+
+
+class ConstantFolder:
+    """ AST pass that evaluates the operations whose operands are all literals, replacing them with the literal of
+    their value, and removes the code a constant condition makes dead: the branch of an if/else that is never taken
+    and the body of a for loop that never runs.
+
+    Values are computed by the interpreter's own rules (try_conversion, coercion_by_priority and OP_TO_LAMBDA
+    through apply_binary), so 1 == true folds to true. An operation the interpreter would fail on, such as 1 + "a"
+    or a division by zero, is left as it is, to raise the same error on the same line when it runs. Operands are
+    never dropped unless they are literals: x && false still evaluates x, as the interpreter does.
+
+    The pass builds new nodes for what it changes and shares the rest, so the tree it is given, which may be held
+    by the parse cache, is never modified. """
+    def __init__(self):
+        self.folded = 0  # operations replaced by a literal
+        self.pruned = 0  # if statements and for loops with a constant condition
+
+    def program(self, ast):
+        new = rebuild(ast, functions=[rebuild(func_node, statements=self.statements(func_node.get("statements")))
+                                      for func_node in ast.get("functions")])
+        new.source = getattr(ast, "source", None)
+        return new
+
+    # ---- statements ----
+
+    def statements(self, statement_nodes) -> list:
+        folded = []
+        for node in statement_nodes:
+            category = node.elem_type
+            if category == Statement.ASSIGNMENT:
+                folded.append(self.assign(node))
+            elif category == Statement.FUNC_CALL:
+                folded.append(self.expression(node))
+            elif category == Statement.IF_STATEMENT:
+                folded += self.if_statement(node)
+            elif category == Statement.FOR_STATEMENT:
+                folded.append(self.for_statement(node))
+            elif category == Statement.RETURN and node.get("expression"):
+                folded.append(rebuild(node, expression=self.expression(node.get("expression"))))
+            else:
+                folded.append(node)
+        return folded
+
+    def assign(self, node):
+        return rebuild(node, expression=self.expression(node.get("expression")))
+
+    def truth(self, condition) -> bool|None:
+        """ Whether a folded condition is always true or always false; None if that is only known at run time,
+        or if it is not a boolean, which is an error the interpreter raises when it runs. """
+        value = constant(condition)
+        if value is None:
+            return None
+        value, _ = try_conversion(value, create_value(BasicType.BOOL))
+        return value.value if value.type == BasicType.BOOL else None
+
+    def if_statement(self, node) -> list:
+        """ The statements that replace an if statement. """
+        condition = self.expression(node.get("condition"))
+        statements = self.statements(node.get("statements"))
+        else_statements = self.statements(node.get("else_statements") or [])
+        taken = self.truth(condition)
+        if taken is None:
+            return [rebuild(node, condition=condition, statements=statements, else_statements=else_statements or None)]
+
+        self.pruned += 1
+        branch = statements if taken else else_statements
+        if any(statement.elem_type == Statement.VAR_DEF for statement in branch):
+            # its variables must stay in a block of their own: keep an if that always takes it
+            return [rebuild(node, condition=literal(create_value(BasicType.BOOL, True), condition),
+                            statements=branch, else_statements=None)]
+        return branch
+
+    def for_statement(self, node):
+        init, update = node.get("init"), node.get("update")
+        if init.elem_type != Statement.ASSIGNMENT or update.elem_type != Statement.ASSIGNMENT:
+            return node  # the interpreter fails on the loop before running any of it
+        condition = self.expression(node.get("condition"))
+        if self.truth(condition) is False:
+            self.pruned += 1
+            return self.assign(init)  # the only part of the loop that runs
+        return rebuild(node, init=self.assign(init), condition=condition, update=self.assign(update),
+                       statements=self.statements(node.get("statements")))
+
+    # ---- expressions ----
+
+    def expression(self, node):
+        expr = node.elem_type
+        if expr in UnaryOps:
+            return self.unary_op(node)
+        if expr in BinaryOps:
+            return self.binary_op(node)
+        if expr == Statement.FUNC_CALL:
+            return rebuild(node, args=[self.expression(arg) for arg in node.get("args")])
+        return node
+
+    def unary_op(self, node):
+        oper = node.elem_type
+        operand = self.expression(node.get("op1"))
+        value = constant(operand)
+        if value is not None:
+            value, _ = try_conversion(value, create_value(BasicType.BOOL if oper == "!" else BasicType.INT))
+            op_func = get_operator_lambda(value.type, oper)
+            if op_func is not None:
+                self.folded += 1
+                return literal(op_func(value), node)
+        return rebuild(node, op1=operand)
+
+    def binary_op(self, node):
+        oper = node.elem_type
+        left, right = self.expression(node.get("op1")), self.expression(node.get("op2"))
+        lhs, rhs = constant(left), constant(right)
+        if lhs is not None and rhs is not None:
+            try:
+                value = apply_binary(refuse, oper, lhs, rhs, node.lineno)
+            except (NotConstant, ZeroDivisionError):
+                pass
+            else:
+                self.folded += 1
+                return literal(value, node)
+        return rebuild(node, op1=left, op2=right)
+
+
+class CommonSubexpressions:
+    """ AST pass that evaluates a pure expression once when a block computes it again before anything it reads can
+    have changed, as with a.b.c + x in two statements in a row. Pure expressions are made of variables, struct
+    fields, literals and operators; calls and new never are, and plain variables and literals are not worth it.
+
+    The first occurrence becomes a cached node (Statement.CACHED) that evaluates the expression and keeps its
+    Value, and the later ones cached nodes with the same id and no expression, which reuse it. A value is reused
+    in the rest of the block that computed it, and at the start of the body of an if or for in that block. An
+    assignment to a variable drops the expressions that read it. An assignment to a field drops those that read a
+    field of that name, whatever the struct. A call to a user function drops every expression reading a field,
+    since it can assign to the fields of any struct it is given. Loops are barriers: their bodies and updates
+    only reuse what they computed themselves in the same iteration.
+
+    Brewin never short-circuits && or ||, so every operand in a statement runs before the next statement, and a
+    reused value is always the one the interpreter would have computed again. If computing it failed, the
+    program stopped there. """
+    def __init__(self):
+        self.shared = 0  # occurrences that reuse a value
+        self.planning = False
+        self.resolver: Resolver|None = None
+        self.available: dict[tuple, tuple[int, set, set]] = {}  # key -> (occurrence, variables read, fields read)
+        self.occurrences = 0  # pure expressions seen so far in the function
+        self.kept: set[int] = set()  # occurrences whose value is reused
+
+    def program(self, ast):
+        new = rebuild(ast, functions=[self.function(func_node) for func_node in ast.get("functions")])
+        new.source = getattr(ast, "source", None)
+        return new
+
+    def function(self, func_node):
+        # two walks in the same order: the first finds which values are reused, the second marks them
+        self.kept = set()
+        for self.planning in (True, False):
+            self.resolver = Resolver([(arg.get("name"), None) for arg in func_node.get("args")])
+            self.available = {}
+            self.occurrences = 0
+            statements = self.block(func_node.get("statements"))
+        return rebuild(func_node, statements=statements)
+
+    # ---- statements ----
+
+    def block(self, statement_nodes) -> list:
+        self.resolver.push()
+        statements = [self.statement(node) for node in statement_nodes]
+        self.resolver.pop()
+        return statements
+
+    def statement(self, node):
+        category = node.elem_type
+        if category == Statement.VAR_DEF:
+            self.resolver.define(node.get("name"))
+            return node
+        if category == Statement.ASSIGNMENT:
+            return self.assign(node)
+        if category in (Statement.FUNC_CALL, Statement.INLINE):
+            return self.expression(node)
+        if category == Statement.IF_STATEMENT:
+            condition = self.expression(node.get("condition"))
+            available = self.available
+            self.available = dict(available)
+            statements = self.block(node.get("statements"))
+            else_statements = None
+            if node.get("else_statements"):
+                self.available = dict(available)
+                else_statements = self.block(node.get("else_statements"))
+            self.available = {}  # either branch may have assigned anything
+            return rebuild(node, condition=condition, statements=statements, else_statements=else_statements)
+        if category == Statement.FOR_STATEMENT:
+            init, update = node.get("init"), node.get("update")
+            if init.elem_type != Statement.ASSIGNMENT or update.elem_type != Statement.ASSIGNMENT:
+                return node  # the interpreter fails on the loop before running any of it
+            init = self.assign(init)
+            self.available = {}
+            condition = self.expression(node.get("condition"))
+            statements = self.block(node.get("statements"))
+            self.available = {}
+            update = self.assign(update)
+            self.available = {}
+            return rebuild(node, init=init, condition=condition, statements=statements, update=update)
+        if category == Statement.RETURN and node.get("expression"):
+            return rebuild(node, expression=self.expression(node.get("expression")))
+        return node
+
+    def assign(self, node):
+        expression = self.expression(node.get("expression"))
+        var_name = node.get("name")
+        variable = self.resolver.lookup(var_name)
+        if isinstance(var_name, DottedName) or "." in var_name:
+            self.forget(field=str(var_name).split(".")[-1])
+        elif variable is not None:
+            self.forget(variable=variable)
+        return rebuild(node, expression=expression)
+
+    def forget(self, variable=None, field=None, fields=False) -> None:
+        """ Drop the values that read the variable, a field with that name, or any field. """
+        self.available = {key: entry for key, entry in self.available.items()
+                          if variable not in entry[1] and field not in entry[2] and not (fields and entry[2])}
+
+    # ---- expressions ----
+
+    def key(self, node) -> tuple[tuple, set, set]|None:
+        """ What a pure expression computes, the same for two expressions that compute the same value from the
+        same variables, with the variables and field names it reads; None if the expression is not pure. """
+        expr = node.elem_type
+        if expr in VarType:
+            return (expr, node.get("val")), set(), set()
+        if expr == BasicType.NIL.value:
+            return (expr,), set(), set()
+        if expr == "var":
+            var_name = node.get("name")
+            variable = self.resolver.lookup(var_name)
+            if variable is None:
+                return None
+            fields = var_name.path if isinstance(var_name, DottedName) else tuple(var_name.split("."))
+            return (expr, variable, fields[1:]), {variable}, set(fields[1:])
+        if expr in UnaryOps or expr in BinaryOps:
+            operands = [self.key(node.get(name)) for name in ("op1", "op2") if node.get(name) is not None]
+            if None in operands:
+                return None
+            return ((expr,) + tuple(key for key, _, _ in operands), set().union(*(v for _, v, _ in operands)),
+                    set().union(*(f for _, _, f in operands)))
+        return None
+
+    def expression(self, node):
+        expr = node.elem_type
+        found = None
+        if expr in UnaryOps or expr in BinaryOps or expr == "var" and "." in node.get("name"):
+            found = self.key(node)
+        if found is not None:
+            occurrence = self.occurrences
+            self.occurrences += 1
+            key, variables, fields = found
+            entry = self.available.get(key)
+            if entry is not None:
+                if self.planning:
+                    self.kept.add(entry[0])
+                    return node
+                self.shared += 1
+                new = Element(Statement.CACHED, id=entry[0])
+                return place(new, node)
+
+        if expr in UnaryOps:
+            node = rebuild(node, op1=self.expression(node.get("op1")))
+        elif expr in BinaryOps:
+            node = rebuild(node, op1=self.expression(node.get("op1")), op2=self.expression(node.get("op2")))
+        elif expr == Statement.FUNC_CALL:
+            node = rebuild(node, args=[self.expression(arg) for arg in node.get("args")])
+            if node.get("name") not in BUILTINS:
+                self.forget(fields=True)
+        elif expr == Statement.INLINE:  # its body is left as it is, but it may assign to fields as the call did
+            node = rebuild(node, args=[self.expression(arg) for arg in node.get("args")])
+            self.forget(fields=True)
+
+        if found is not None:
+            self.available[key] = (occurrence, variables, fields)
+            if not self.planning and occurrence in self.kept:
+                new = Element(Statement.CACHED, id=occurrence, expression=node)
+                return place(new, node)
+        return node
+
+
+class LoopInvariants:
+    """ AST pass that computes the pure expressions a for loop cannot change, like the n * 2 of i < n * 2 or a
+    field read through a struct path the loop never assigns to, once each time the loop runs instead of once per
+    iteration.
+
+    Such an expression becomes an invariant node (Statement.INVARIANT), and the loop lists the ids of its
+    invariants: the engines forget their values when the loop starts, compute each one the first time it is
+    evaluated and reuse it until the loop ends. The value is not computed ahead of the loop, which might not run
+    its body at all: it is computed where the interpreter computes it first, so errors and output keep their order.
+
+    An expression is invariant in a loop if no variable it reads is assigned or defined anywhere in the loop's
+    condition, body or update (by name, whatever the scope), no field it reads has the name of a field assigned
+    there, and, if it reads fields, the loop calls no user function, which could assign to any of them. Each
+    expression is attached to the outermost loop it is invariant in, and equal expressions of a loop share one
+    value. """
+    def __init__(self):
+        self.hoisted = 0  # expressions computed once per loop
+        self.ids = 0
+        # for each enclosing loop: the names and the field names it assigns, whether it calls a user function, and
+        # the ids of its invariants
+        self.loops: list[tuple[set[str], set[str], bool, dict[tuple, int]]] = []
+
+    def program(self, ast):
+        new = rebuild(ast, functions=[rebuild(func_node, statements=self.statements(func_node.get("statements")))
+                                      for func_node in ast.get("functions")])
+        new.source = getattr(ast, "source", None)
+        return new
+
+    # ---- statements ----
+
+    def statements(self, statement_nodes) -> list:
+        return [self.statement(node) for node in statement_nodes]
+
+    def statement(self, node):
+        category = node.elem_type
+        if category == Statement.ASSIGNMENT:
+            return rebuild(node, expression=self.expression(node.get("expression")))
+        if category in (Statement.FUNC_CALL, Statement.INLINE):
+            return self.expression(node)
+        if category == Statement.IF_STATEMENT:
+            return rebuild(node, condition=self.expression(node.get("condition")),
+                           statements=self.statements(node.get("statements")),
+                           else_statements=self.statements(node.get("else_statements") or []) or None)
+        if category == Statement.FOR_STATEMENT:
+            return self.for_statement(node)
+        if category == Statement.RETURN and node.get("expression"):
+            return rebuild(node, expression=self.expression(node.get("expression")))
+        return node
+
+    def for_statement(self, node):
+        init, update = node.get("init"), node.get("update")
+        if init.elem_type != Statement.ASSIGNMENT or update.elem_type != Statement.ASSIGNMENT:
+            return node  # the interpreter fails on the loop before running any of it
+        init = rebuild(init, expression=self.expression(init.get("expression")))  # runs once per loop
+        names, fields = set(), set()
+        calls = self.scan([node.get("condition")], names, fields)
+        calls |= self.scan(node.get("statements") + [update], names, fields)
+        invariants = {}
+        self.loops.append((names, fields, calls, invariants))
+        condition = self.expression(node.get("condition"))
+        statements = self.statements(node.get("statements"))
+        update = rebuild(update, expression=self.expression(update.get("expression")))
+        self.loops.pop()
+        return rebuild(node, init=init, condition=condition, statements=statements, update=update,
+                       invariants=list(invariants.values()))
+
+    def scan(self, nodes, names: set[str], fields: set[str]) -> bool:
+        """ Add the variables and the fields the statements and expressions assign to; whether they call a user
+        function. """
+        calls = False
+        for node in nodes:
+            category = node.elem_type
+            if category == Statement.VAR_DEF:
+                names.add(node.get("name"))
+            elif category == Statement.ASSIGNMENT:
+                var_name = str(node.get("name"))
+                if "." in var_name:
+                    fields.add(var_name.split(".")[-1])
+                else:
+                    names.add(var_name)
+                calls |= self.scan([node.get("expression")], names, fields)
+            elif category == Statement.FUNC_CALL:
+                calls |= node.get("name") not in BUILTINS
+                calls |= self.scan(node.get("args"), names, fields)
+            elif category == Statement.INLINE:  # its body only assigns its own variables, and fields
+                self.scan(node.get("args"), names, fields)
+                calls = True
+            elif category == Statement.IF_STATEMENT:
+                calls |= self.scan([node.get("condition")] + node.get("statements")
+                                   + (node.get("else_statements") or []), names, fields)
+            elif category == Statement.FOR_STATEMENT:
+                calls |= self.scan([node.get("init"), node.get("condition"), node.get("update")]
+                                   + node.get("statements"), names, fields)
+            elif category == Statement.RETURN:
+                calls |= self.scan([node.get("expression")] if node.get("expression") else [], names, fields)
+            elif category in UnaryOps or category in BinaryOps:
+                calls |= self.scan([node.get("op1")] + ([node.get("op2")] if node.get("op2") else []), names, fields)
+        return calls
+
+    # ---- expressions ----
+
+    def reads(self, node) -> tuple[tuple, set[str], set[str]]|None:
+        """ What a pure expression computes, the variables and the field names it reads; None if it is not pure.
+        Equal keys compute the same value in a loop where none of the variables is defined or assigned. """
+        expr = node.elem_type
+        if expr in VarType:
+            return (expr, node.get("val")), set(), set()
+        if expr == BasicType.NIL.value:
+            return (expr,), set(), set()
+        if expr == "var":
+            fields = str(node.get("name")).split(".")
+            return (expr, tuple(fields)), {fields[0]}, set(fields[1:])
+        if expr in UnaryOps or expr in BinaryOps:
+            operands = [self.reads(node.get(name)) for name in ("op1", "op2") if node.get(name) is not None]
+            if None in operands:
+                return None
+            return ((expr,) + tuple(key for key, _, _ in operands), set().union(*(v for _, v, _ in operands)),
+                    set().union(*(f for _, _, f in operands)))
+        return None
+
+    def expression(self, node):
+        expr = node.elem_type
+        if self.loops and (expr in UnaryOps or expr in BinaryOps or expr == "var" and "." in node.get("name")):
+            found = self.reads(node)
+            if found is not None:
+                key, names, fields = found
+                for assigned, assigned_fields, calls, invariants in self.loops:
+                    if not names & assigned and not fields & assigned_fields and not (fields and calls):
+                        if key not in invariants:
+                            invariants[key] = self.ids
+                            self.ids += 1
+                        self.hoisted += 1
+                        new = Element(Statement.INVARIANT, id=invariants[key], expression=node)
+                        return place(new, node)
+
+        if expr in UnaryOps:
+            return rebuild(node, op1=self.expression(node.get("op1")))
+        if expr in BinaryOps:
+            return rebuild(node, op1=self.expression(node.get("op1")), op2=self.expression(node.get("op2")))
+        if expr in (Statement.FUNC_CALL, Statement.INLINE):
+            return rebuild(node, args=[self.expression(arg) for arg in node.get("args")])
+        return node
+
+
+INLINE_SIZE = 40  # default for the most AST nodes in a function body the inliner copies to a call site
+
+
+def is_node(value) -> bool:
+    """ Whether a value in a tree is an AST node, in any form parse_program returns, or a node a pass built. """
+    return getattr(value, "elem_type", None) is not None
+
+
+def size(node) -> int:
+    """ The number of AST nodes in a subtree, or in a list of them. """
+    if isinstance(node, list):
+        return sum(size(item) for item in node)
+    if not is_node(node):
+        return 0
+    return 1 + sum(size(value) for value in node.dict.values())
+
+
+class Inliner:
+    """ AST pass that replaces the calls to small user functions with their bodies. The call becomes an inline node
+    (Statement.INLINE) holding its arguments and the function's parameters, return type and statements, which the
+    engines run as they run the call, without looking the function up or making it a frame of its own.
+
+    The semantics of the call are kept: the arguments are evaluated, then converted to the parameter types with the
+    same errors on the line of the call; the parameters are bound in a block of their own, so they shadow the
+    caller's variables, and the body runs in a block inside it; a return ends the body, and its value, or the
+    default value of the return type when it has none, is converted as the call converts it.
+
+    A function is inlined if it is not recursive, directly or through the functions it calls, if no parameter name
+    is repeated, if its body reads and assigns no variable besides its parameters and its own (in an inline node,
+    the caller's variables are in scope where the interpreter raises NAME_ERROR), and if its body has at most
+    max_size nodes once the calls in it are inlined. """
+    def __init__(self, max_size: int = INLINE_SIZE):
+        self.max_size = max_size
+        self.sites = 0  # calls replaced
+        self.inlined: dict[str, int] = {}  # name/arg count -> calls replaced
+        self.skipped: dict[str, str] = {}  # name/arg count -> why the calls to it are kept
+        self.functions: dict[tuple[str, int], Element] = {}
+        self.bodies: dict[tuple[str, int], list|None] = {}  # the statements to inline, None if its calls are kept
+        self.rewritten: dict[tuple[str, int], list] = {}  # the statements of the function, with calls inlined
+
+    def program(self, ast):
+        self.functions = {(func_node.get("name"), len(func_node.get("args"))): func_node
+                          for func_node in ast.get("functions")}  # the last definition wins, as in the interpreter
+        self.bodies, self.rewritten = {}, {}
+        new = rebuild(ast, functions=[rebuild(func_node, statements=self.function(func_node))
+                                      for func_node in ast.get("functions")])
+        new.source = getattr(ast, "source", None)
+        return new
+
+    def summary(self) -> str:
+        inlined = ", ".join(f"{label} x{count}" for label, count in self.inlined.items()) or "none"
+        skipped = ", ".join(f"{label} ({reason})" for label, reason in self.skipped.items()) or "none"
+        return f"{self.sites} calls inlined: {inlined}; not inlined: {skipped}"
+
+    # ---- functions ----
+
+    def function(self, func_node) -> list:
+        """ The statements of a function, with the calls in them inlined. """
+        key = (func_node.get("name"), len(func_node.get("args")))
+        if self.functions[key] != func_node:  # a definition the interpreter replaces (flat cursors compare equal)
+            return self.statements(func_node.get("statements"))
+        if key not in self.rewritten:
+            self.rewritten[key] = self.statements(func_node.get("statements"))
+        return self.rewritten[key]
+
+    def body(self, key: tuple[str, int]) -> list|None:
+        """ The statements that replace a call to the function, or None if its calls are kept. """
+        if key not in self.bodies:
+            func_node = self.functions[key]
+            label = f"{key[0]}/{key[1]}"
+            names = [arg.get("name") for arg in func_node.get("args")]
+            statements = None
+            if self.recursive(key):
+                self.skipped[label] = "recursive"
+            elif len(set(names)) != len(names):
+                self.skipped[label] = "repeated parameter"
+            elif not self.closed(func_node):
+                self.skipped[label] = "undefined variable"
+            else:
+                statements = self.function(func_node)
+                if size(statements) > self.max_size:
+                    self.skipped[label] = f"size {size(statements)} > {self.max_size}"
+                    statements = None
+            self.bodies[key] = statements
+        return self.bodies[key]
+
+    def recursive(self, key: tuple[str, int]) -> bool:
+        """ Whether the function can call itself, through the functions it calls. """
+        seen = set()
+        stack = [self.functions[key]]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, list):
+                stack += node
+            elif is_node(node):
+                if node.elem_type == Statement.FUNC_CALL:
+                    callee = (node.get("name"), len(node.get("args")))
+                    if callee[0] in BUILTINS:
+                        pass
+                    elif callee == key:
+                        return True
+                    elif callee in self.functions and callee not in seen:
+                        seen.add(callee)
+                        stack.append(self.functions[callee])
+                stack += node.dict.values()
+        return False
+
+    def closed(self, func_node) -> bool:
+        """ Whether every variable the body reads or assigns is one of its parameters or of its own variables. """
+        resolver = Resolver([(arg.get("name"), None) for arg in func_node.get("args")])
+
+        def block(statement_nodes) -> bool:
+            resolver.push()
+            closed = all(statement(node) for node in statement_nodes)
+            resolver.pop()
+            return closed
+
+        def statement(node) -> bool:
+            category = node.elem_type
+            if category == Statement.VAR_DEF:
+                resolver.define(node.get("name"))
+                return True
+            if category == Statement.ASSIGNMENT:
+                return resolver.lookup(node.get("name")) is not None and expression(node.get("expression"))
+            if category == Statement.IF_STATEMENT:
+                return (expression(node.get("condition")) and block(node.get("statements"))
+                        and block(node.get("else_statements") or []))
+            if category == Statement.FOR_STATEMENT:
+                return (statement(node.get("init")) and expression(node.get("condition"))
+                        and block(node.get("statements")) and statement(node.get("update")))
+            if category == Statement.RETURN:
+                return node.get("expression") is None or expression(node.get("expression"))
+            return expression(node)
+
+        def expression(node) -> bool:
+            expr = node.elem_type
+            if expr == "var":
+                return resolver.lookup(node.get("name")) is not None
+            if expr in UnaryOps or expr in BinaryOps:
+                return all(expression(node.get(name)) for name in ("op1", "op2") if node.get(name) is not None)
+            if expr == Statement.FUNC_CALL:
+                return all(expression(arg) for arg in node.get("args"))
+            return True
+
+        return block(func_node.get("statements"))
+
+    # ---- call sites ----
+
+    def statements(self, statement_nodes) -> list:
+        return [self.statement(node) for node in statement_nodes]
+
+    def statement(self, node):
+        category = node.elem_type
+        if category == Statement.ASSIGNMENT:
+            return rebuild(node, expression=self.expression(node.get("expression")))
+        if category == Statement.FUNC_CALL:
+            return self.expression(node)
+        if category == Statement.IF_STATEMENT:
+            return rebuild(node, condition=self.expression(node.get("condition")),
+                           statements=self.statements(node.get("statements")),
+                           else_statements=self.statements(node.get("else_statements") or []) or None)
+        if category == Statement.FOR_STATEMENT:
+            return rebuild(node, init=self.statement(node.get("init")),
+                           condition=self.expression(node.get("condition")),
+                           statements=self.statements(node.get("statements")),
+                           update=self.statement(node.get("update")))
+        if category == Statement.RETURN and node.get("expression"):
+            return rebuild(node, expression=self.expression(node.get("expression")))
+        return node
+
+    def expression(self, node):
+        expr = node.elem_type
+        if expr in UnaryOps:
+            return rebuild(node, op1=self.expression(node.get("op1")))
+        if expr in BinaryOps:
+            return rebuild(node, op1=self.expression(node.get("op1")), op2=self.expression(node.get("op2")))
+        if expr != Statement.FUNC_CALL:
+            return node
+        args = [self.expression(arg) for arg in node.get("args")]
+        key = (node.get("name"), len(args))
+        statements = self.body(key) if key in self.functions and key[0] not in BUILTINS else None
+        if statements is None:
+            return rebuild(node, args=args)
+
+        label = f"{key[0]}/{key[1]}"
+        self.sites += 1
+        self.inlined[label] = self.inlined.get(label, 0) + 1
+        func_node = self.functions[key]
+        new = Element(Statement.INLINE, name=node.get("name"), args=args,
+                      params=[(arg.get("name"), arg.get("var_type")) for arg in func_node.get("args")],
+                      return_type=func_node.get("return_type"), statements=statements)
+        return place(new, node)  # errors converting the arguments or the result are on the line of the call
+
+
+class Optimizer:
+    """ Every pass, in order: constants are folded, calls to small functions inlined, loop invariants marked and
+    common subexpressions shared. The last two see an inline node as a call, which may assign to any field, and
+    leave its body as the folder left it; common subexpressions are not looked for in invariants. Each pass is kept
+    with its statistics; passes lists the ones that run, which a caller may narrow. """
+    def __init__(self, inline_size: int = INLINE_SIZE):
+        self.folder = ConstantFolder()
+        self.inliner = Inliner(inline_size)
+        self.invariants = LoopInvariants()
+        self.sharing = CommonSubexpressions()
+        self.passes = [self.folder, self.inliner, self.invariants, self.sharing]
+
+    def program(self, ast):
+        for optimization in self.passes:
+            ast = optimization.program(ast)
+        return ast
+
+    def settings(self) -> str:
+        """ What the optimized tree depends on besides the program: the passes that run, in order, and the largest
+        body inlined. The python engine keys its code cache on it (see transpile.cache_key). """
+        return ",".join(type(optimization).__name__ for optimization in self.passes) + f";{self.inliner.max_size}"
+
+    def summary(self) -> str:
+        return (f"{self.folder.folded} operations folded, {self.folder.pruned} branches pruned; "
+                f"{self.inliner.summary()}; {self.invariants.hoisted} invariants; {self.sharing.shared} reused")
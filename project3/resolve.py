@@ -0,0 +1,173 @@
+from element import DottedName, Element
+from type import BinaryOps, Statement, UnaryOps
+
+
+class Variable:
+    """ A variable definition and where it lives: depth is the nesting of the block defining it (0 for the
+    parameters, 1 for the function body), slot its index in the frame of the function call. """
+    __slots__ = ("name", "var_type", "depth", "slot")
+
+    def __init__(self, name: str, var_type, depth: int, slot: int):
+        self.name = name
+        self.var_type = var_type
+        self.depth = depth
+        self.slot = slot
+
+    def __repr__(self):
+        return f"Variable({self.name!r}, {self.var_type}, depth={self.depth}, slot={self.slot})"
+
+
+class Resolver:
+    """ Static scoping for one function, used by the engines as they compile its body. Brewin scopes are blocks
+    and a function only sees its own variables, so the definition a name refers to at any point of the body can be
+    known before the function runs: the innermost one in an enclosing block that comes before that point. (A
+    definition that is skipped, by an if or a return, is also never reached by the code after it in its block.)
+
+    Every definition gets a slot in a flat frame, a list of values with one entry per slot that is made for each
+    call. Blocks allocate their slots like a stack, so sibling blocks share them and the frame is only as big as
+    the deepest nesting needs. Reading or writing a variable is then an index into the frame, with no dict probe
+    per block, and defining one resets its slot, which is what a fresh block dict did.
+
+    define() returns None for a name already defined in the same block, and lookup() for a name with no
+    definition in scope: the places where the interpreter raises NAME_ERROR, which the engines keep raising there,
+    at run time.
+
+    The compiling engines (compiler.py, vm.py, transpile.py) resolve the names as they compile a function, and the
+    tree walker in interpreterv3.py through an Annotator. """
+    def __init__(self, params: list[tuple[str, object]]):
+        self.blocks: list[dict[str, Variable]] = []
+        self.starts: list[int] = []  # first slot of each open block
+        self.next_slot = 0
+        self.size = 0  # slots in a frame
+        self.push()
+        self.params = [self.define(name, var_type) for name, var_type in params]
+
+    def push(self) -> None:
+        self.blocks.append({})
+        self.starts.append(self.next_slot)
+
+    def pop(self) -> None:
+        self.blocks.pop()
+        self.next_slot = self.starts.pop()
+
+    def define(self, name: str, var_type=None) -> Variable|None:
+        block = self.blocks[-1]
+        if name in block:
+            return None
+        variable = block[name] = Variable(name, var_type, len(self.blocks) - 1, self.next_slot)
+        self.next_slot += 1
+        self.size = max(self.size, self.next_slot)
+        return variable
+
+    def temporary(self) -> int:
+        """ A slot in the current block for a value the engine keeps itself, with no name to look it up by. """
+        slot = self.next_slot
+        self.next_slot += 1
+        self.size = max(self.size, self.next_slot)
+        return slot
+
+    def lookup(self, name) -> Variable|None:
+        """ The definition of a variable, or of the variable a dotted name starts from. """
+        if isinstance(name, DottedName):
+            name = name.path[0]
+        elif "." in name:
+            name = name.split(".")[0]
+        for block in reversed(self.blocks):
+            if name in block:
+                return block[name]
+        return None
+
+
+def place(new, node):
+    """ Put a new node where another is in the source: the tree may be in any form parse_program returns. """
+    new.span = node.span
+    return new
+
+
+def rebuild(node, **changes):
+    """ A copy of the node with some of its children replaced, at the same place in the source. """
+    return place(Element(node.elem_type, **{**node.dict, **changes}), node)
+
+
+def slot_of(variable: Variable|None) -> int|None:
+    return variable.slot if variable is not None else None
+
+
+class Annotator:
+    """ Resolver pass for the tree-walking interpreter, run over a function before its first call. It returns a
+    copy of the statements in which every node that defines, reads or assigns a variable has the variable's slot
+    in a slot attribute, None where the interpreter raises NAME_ERROR: var_def, assignment and var nodes, and the
+    cached and invariant nodes of the optimizer. A for loop gets the slots of its invariants and an inline node
+    those of its parameters, in slots.
+
+    Slots are attributes, outside dict, so the copies print as the nodes they copy. Copies are Elements whatever
+    the form of the tree, which is left as it is: it may be shared, and an inlined body may be at several depths
+    of one function. """
+    def __init__(self, params: list[tuple[str, object]]):
+        self.resolver = Resolver(params)
+        self.temporaries: dict[int, int] = {}  # id of a cached node -> its slot
+        self.invariants: dict[int, int] = {}  # id of a loop invariant -> its slot
+
+    def block(self, statement_nodes) -> list:
+        self.resolver.push()
+        statements = [self.statement(node) for node in statement_nodes]
+        self.resolver.pop()
+        return statements
+
+    def statement(self, node):
+        category = node.elem_type
+        if category == Statement.VAR_DEF:
+            new = rebuild(node)
+            new.slot = slot_of(self.resolver.define(node.get("name")))
+        elif category == Statement.ASSIGNMENT:
+            new = rebuild(node, expression=self.expression(node.get("expression")))
+            new.slot = slot_of(self.resolver.lookup(node.get("name")))
+        elif category == Statement.IF_STATEMENT:
+            else_statements = node.get("else_statements")
+            new = rebuild(node, condition=self.expression(node.get("condition")),
+                          statements=self.block(node.get("statements")),
+                          else_statements=self.block(else_statements) if else_statements else else_statements)
+        elif category == Statement.FOR_STATEMENT:
+            slots = [self.invariants.setdefault(invariant, self.resolver.temporary())
+                     for invariant in node.get("invariants") or ()]
+            new = rebuild(node, init=self.statement(node.get("init")),
+                          condition=self.expression(node.get("condition")),
+                          statements=self.block(node.get("statements")), update=self.statement(node.get("update")))
+            new.slots = slots
+        elif category == Statement.RETURN and node.get("expression"):
+            new = rebuild(node, expression=self.expression(node.get("expression")))
+        else:
+            new = self.expression(node)
+        return new
+
+    def expression(self, node):
+        expr = node.elem_type
+        if expr == "var":
+            new = rebuild(node)
+            new.slot = slot_of(self.resolver.lookup(node.get("name")))
+        elif expr in UnaryOps:
+            new = rebuild(node, op1=self.expression(node.get("op1")))
+        elif expr in BinaryOps:
+            new = rebuild(node, op1=self.expression(node.get("op1")), op2=self.expression(node.get("op2")))
+        elif expr == Statement.FUNC_CALL:
+            new = rebuild(node, args=[self.expression(arg) for arg in node.get("args")])
+        elif expr == Statement.CACHED:
+            if node.get("expression") is None:  # computed earlier, in the same block or an enclosing one
+                new = rebuild(node)
+                new.slot = self.temporaries[node.get("id")]
+            else:
+                new = rebuild(node, expression=self.expression(node.get("expression")))
+                new.slot = self.temporaries[node.get("id")] = self.resolver.temporary()
+        elif expr == Statement.INVARIANT:
+            new = rebuild(node, expression=self.expression(node.get("expression")))
+            new.slot = self.invariants[node.get("id")]
+        elif expr == Statement.INLINE:
+            args = [self.expression(arg) for arg in node.get("args")]
+            self.resolver.push()
+            slots = [self.resolver.define(param_name).slot for param_name, _ in node.get("params")]
+            new = rebuild(node, args=args, statements=self.block(node.get("statements")))
+            self.resolver.pop()
+            new.slots = slots
+        else:  # literals, new, and what the interpreter rejects
+            new = node
+        return new
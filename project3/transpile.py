@@ -0,0 +1,555 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from compiler import ClosureCompiler
+from element import DottedName
+from intbase import ErrorType
+from resolve import Resolver
+from type import BasicType, EqualOps, LogicOps, Statement, UnaryOps, BinaryOps
+
+# Python operators on raw values, for the types OP_TO_LAMBDA has them for; && and || use & and |, which on two bools
+# give the same result as and/or but never skip evaluating the right operand, as the interpreter does not either
+PY_OPS = {
+    "int": {"==": "==", "!=": "!=", "+": "+", "-": "-", "*": "*", "/": "//",
+            ">=": ">=", "<=": "<=", ">": ">", "<": "<"},
+    "bool": {"==": "==", "!=": "!=", "||": "|", "&&": "&"},
+    "string": {"==": "==", "!=": "!=", "+": "+"},
+    "nil": {"==": "==", "!=": "!="},
+}
+PRIORITY = {"int": 1, "bool": 2}  # COERCION_PRIORITY
+DEFAULTS = {"int": "0", "bool": "False", "string": "''"}  # anything else starts as None
+
+MAX_CACHED = 128
+
+_code_cache: OrderedDict[str, object] = OrderedDict()  # source hash -> code object, or None if not transpiled
+_cache_lock = threading.Lock()
+
+
+class Unsupported(Exception):
+    """ The program uses something the transpiler does not translate. """
+
+
+class PythonTranspiler:
+    """ Execution engine that translates a whole v3 program into Python source, one Python function per Brewin
+    function, compiles it with compile() and runs it. Code objects are cached by a hash of the program's source, so
+    running a program again only executes its module code.
+
+    v3 is statically typed: every variable, field, parameter and return value has a declared type, and the
+    interpreter's conversions keep every value at its declared type. The translator therefore works out each
+    expression's type, and the generated code holds raw Python values (int, bool, str, a dict for a struct, None
+    for nil and void), applies the int to bool coercions where try_conversion would, and resolves every variable to
+    a Python local at translation time. Checks that depend only on types become a _fail(...) call that evaluates the
+    operands the interpreter would have evaluated, then raises the error the interpreter raises, on the same line;
+    nil faults and the other checks that depend on values stay run-time checks.
+
+    Programs Python cannot compile (e.g. expressions nested too deeply for its parser) are run by the closure engine,
+    as are trees with a variable or field of type nil, which the grammar does not allow: assigning a struct to one
+    would change its type at run time. """
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+
+    def run(self, main_func, key: str|None = None) -> None:
+        code = self.compile(key)
+        if code is None:
+            ClosureCompiler(self.interpreter).run(main_func)
+            return
+        namespace = runtime(self.interpreter)
+        exec(code, namespace)
+        namespace[function_name("main", 0)](main_func.lineno)
+
+    def compile(self, key: str|None):
+        """ The code object of the program, from the cache when its key (see cache_key) was seen before. """
+        if key is not None:
+            with _cache_lock:
+                if key in _code_cache:
+                    _code_cache.move_to_end(key)
+                    return _code_cache[key]
+        try:
+            code = compile(self.translate(), "<brewin>", "exec")
+        except (Unsupported, SyntaxError, RecursionError, MemoryError):
+            code = None
+        if key is not None:
+            with _cache_lock:
+                _code_cache[key] = code
+                while len(_code_cache) > MAX_CACHED:
+                    _code_cache.popitem(last=False)
+        return code
+
+    def translate(self) -> str:
+        """ The Python source of the program. Raises Unsupported if it cannot be translated. """
+        interpreter = self.interpreter
+        structs = {}
+        for struct_name, fields in interpreter.struct_table.items():
+            structs[struct_name] = {field: str(value.type) for field, value in fields.items()}
+            if "nil" in structs[struct_name].values():
+                raise Unsupported(f"Struct '{struct_name}' has a field of type nil")
+        functions = {}
+        for key, func_node in interpreter.func_table.items():
+            # a dict, as in Interpreter.__call_func: a repeated parameter name is bound once
+            params = {arg.get("name"): arg.get("var_type") for arg in func_node.get("args")}
+            functions[key] = (list(params.items()), func_node.get("return_type"))
+
+        chunks = []
+        for key, func_node in interpreter.func_table.items():
+            chunks.append(FunctionTranslator(structs, functions, func_node).translate())
+        return "\n\n".join(chunks) + "\n"
+
+
+def cache_key(source: str|None, variant: str = "") -> str|None:
+    """ The key of a program's code object: a hash of its source text and of the variant of its tree that is
+    translated, the optimizer's settings for an optimized one; None, which is never cached, for a tree without its
+    source. """
+    if source is None:
+        return None
+    if variant:
+        source = variant + "\0" + source
+    return hashlib.sha256(source.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def cached_code(key: str|None):
+    """ The cached code object for the key, or None if there is none: not translated yet, or not translatable. """
+    if key is None:
+        return None
+    with _cache_lock:
+        return _code_cache.get(key)
+
+
+def function_name(name: str, arg_count: int) -> str:
+    return f"f_{name}_{arg_count}"
+
+
+def default(var_type: str) -> str:
+    return DEFAULTS.get(var_type, "None")
+
+
+def convert(code: str, source_type: str, target_type: str) -> tuple[str, str]:
+    """ try_conversion on types: the code converted towards target_type, and the type it then has. """
+    if source_type == "nil" and target_type not in DEFAULTS and target_type not in ("nil", "void"):
+        return code, target_type  # nil to a struct type
+    if source_type == "int" and target_type == "bool":
+        return f"({code} != 0)", "bool"
+    return code, source_type
+
+
+class FunctionTranslator:
+    """ Translates one function. Names are resolved as the body is translated (see resolve.py), and every slot of
+    the frame is a Python local, named after the variable in it. """
+    def __init__(self, structs: dict[str, dict[str, str]], functions: dict, func_node):
+        self.structs = structs
+        self.functions = functions
+        self.func_node = func_node
+        self.func_name = func_node.get("name")
+        self.return_type = func_node.get("return_type")
+        self.lines: list[str] = []
+        self.indent = 1
+        self.resolver: Resolver|None = None
+        self.temporaries: dict[int, tuple[str, str]] = {}  # id of a cached node -> (Python local, type)
+
+    def translate(self) -> str:
+        params, _ = self.functions[(self.func_name, len(self.func_node.get("args")))]
+        self.resolver = Resolver(params)
+        names = [self.local(variable) for variable in self.resolver.params]
+        names += [f"_unbound{k}" for k in range(len(names), len(self.func_node.get("args")))]
+        self.block(self.func_node.get("statements"))
+        self.emit(f"return {default(self.return_type)}")  # no return statement was executed
+        header = f"def {function_name(self.func_name, len(names))}({', '.join(['_line'] + names)}):"
+        return "\n".join([header] + self.lines)
+
+    # ---- output ----
+
+    def emit(self, line: str) -> None:
+        self.lines.append("    " * self.indent + line)
+
+    @staticmethod
+    def local(variable) -> str:
+        return f"v_{variable.name}_{variable.slot}"
+
+    def lookup(self, name: str) -> tuple[str, str]|None:
+        """ The Python local and the type of a variable, or None if it is not in scope. """
+        variable = self.resolver.lookup(name)
+        return None if variable is None else (self.local(variable), variable.var_type)
+
+    def fail(self, error_type: ErrorType, description: str, line, *operands: str) -> tuple[str, str]:
+        """ Code that evaluates the operands, then raises the error. Its type does not matter: it never returns. """
+        return f"_fail({error_type.name}, {description!r}, {', '.join((str(line),) + operands)})", "void"
+
+    # ---- statements ----
+
+    def block(self, statement_nodes) -> None:
+        self.resolver.push()
+        start = len(self.lines)
+        for node in statement_nodes:
+            self.statement(node)
+        if len(self.lines) == start:
+            self.emit("pass")
+        self.resolver.pop()
+
+    def nested(self, header: str, statement_nodes) -> None:
+        self.emit(header)
+        self.indent += 1
+        self.block(statement_nodes)
+        self.indent -= 1
+
+    def statement(self, node) -> None:
+        category = node.elem_type
+        if category == Statement.VAR_DEF:
+            self.var_def(node)
+        elif category == Statement.ASSIGNMENT:
+            self.assign(node)
+        elif category in (Statement.FUNC_CALL, Statement.INLINE):
+            self.emit(self.call(node)[0])
+        elif category == Statement.IF_STATEMENT:
+            self.if_statement(node)
+        elif category == Statement.FOR_STATEMENT:
+            self.for_statement(node)
+        elif category == Statement.RETURN:
+            self.return_statement(node)
+        else:
+            self.emit(self.fail(ErrorType.TYPE_ERROR, f"Statement '{category}' is unknown", node.lineno)[0])
+
+    def var_def(self, node) -> None:
+        var_name, var_type = node.get("name"), node.get("var_type")
+        if var_type == "nil":
+            raise Unsupported(f"Variable '{var_name}' has type nil")
+        if not BasicType.contains(var_type) and var_type not in self.structs:
+            self.emit(self.fail(ErrorType.TYPE_ERROR, f"Variable '{var_name}' has invalid type '{var_type}'",
+                                node.lineno)[0])
+        elif (variable := self.resolver.define(var_name, var_type)) is None:
+            self.emit(self.fail(ErrorType.NAME_ERROR, f"Variable '{var_name}' defined more than once",
+                                node.lineno)[0])
+        else:
+            self.emit(f"{self.local(variable)} = {default(var_type)}")
+
+    def assign(self, node) -> None:
+        var_name, lineno = node.get("name"), node.lineno
+        code, value_type = self.expression(node.get("expression"))
+        fields = path(var_name)
+        found = self.lookup(fields[0])
+        if found is None:
+            self.emit(self.fail(ErrorType.NAME_ERROR, f"Variable '{var_name}' not found", lineno, code)[0])
+            return
+        local, var_type = found
+        if len(fields) == 1:
+            converted, converted_type = convert(code, value_type, var_type)
+            if converted_type != var_type:
+                self.emit(self.fail(ErrorType.TYPE_ERROR, f"Cannot assign '{converted_type}' to variable '{var_name}'",
+                                    lineno, code)[0])
+            else:
+                self.emit(f"{local} = {converted}")
+            return
+
+        field_type = self.field_type(var_type, fields[1:])
+        if field_type is not None and len(fields) == 2:
+            # the variable holds the struct itself, which the expression cannot change
+            self.emit(f"_v = {code}")
+            self.emit(f"if {local} is None: _fault({str(var_name)!r}, {lineno})")
+            store = local
+        else:
+            # the interpreter looks the field up before the expression runs and again to assign it, in between
+            # the expression may change the structs on the path
+            self.emit(f"_c = _lookup({local}, {fields[1:]!r})")
+            self.emit(f"_v = {code}")
+            description = f"Variable '{var_name}' not found"
+            self.emit(f"if type(_c) is not dict: _fail(_c, {description!r}, {lineno})")
+            if field_type is None:
+                return  # the lookup always fails
+            store = "_c"
+        converted, converted_type = convert("_v", value_type, field_type)
+        if converted_type != field_type:
+            self.emit(self.fail(ErrorType.TYPE_ERROR, f"Cannot assign '{converted_type}' to variable '{var_name}'",
+                                lineno)[0])
+            return
+        if store == "_c":
+            self.emit(f"_c = _walk({local}, {fields[1:]!r})")
+            description = f"Cannot assign '{converted_type}' to variable '{var_name}'"
+            self.emit(f"if type(_c) is not dict: _fail(_c, {description!r}, {lineno})")
+        self.emit(f"{store}[{fields[-1]!r}] = {converted}")
+
+    def condition(self, node, description: str) -> str|None:
+        """ The condition as a Python bool, or None (after emitting the failure) if it can never be one. """
+        code, value_type = self.expression(node)
+        code, value_type = convert(code, value_type, "bool")
+        if value_type != "bool":
+            self.emit(self.fail(ErrorType.TYPE_ERROR, description, node.lineno, code)[0])
+            return None
+        return code
+
+    def if_statement(self, node) -> None:
+        condition = self.condition(node.get("condition"), "'if' condition must be a boolean")
+        if condition is None:
+            return
+        self.nested(f"if {condition}:", node.get("statements"))
+        if node.get("else_statements"):
+            self.nested("else:", node.get("else_statements"))
+
+    def for_statement(self, node) -> None:
+        init, update = node.get("init"), node.get("update")
+        if init.elem_type != Statement.ASSIGNMENT:
+            self.emit(self.fail(ErrorType.TYPE_ERROR, "'for' loop initialization must be a variable declaration",
+                                init.lineno)[0])
+            return
+        if update.elem_type != Statement.ASSIGNMENT:
+            self.emit(self.fail(ErrorType.TYPE_ERROR, "'for' loop update must be an assignment", update.lineno)[0])
+            return
+        for invariant in node.get("invariants") or ():
+            self.emit(f"i_{invariant} = None")  # computed again in this run of the loop
+        self.assign(init)
+        condition = self.condition(node.get("condition"), "'for' loop condition must be a boolean")
+        if condition is None:
+            return
+        self.nested(f"while {condition}:", node.get("statements"))
+        self.indent += 1
+        self.assign(update)  # in the scope around the loop, not the body's
+        self.indent -= 1
+
+    def return_statement(self, node) -> None:
+        return_type = self.return_type
+        if not node.get("expression"):
+            self.emit(f"return {default(return_type)}")
+            return
+        code, value_type = self.expression(node.get("expression"))
+        if value_type == "void" and return_type != "void":
+            self.emit(code)
+            self.emit(f"return {default(return_type)}")  # a void result gives the default value
+            return
+        converted, converted_type = convert(code, value_type, return_type)
+        if converted_type != return_type:
+            self.emit(self.fail(ErrorType.TYPE_ERROR, f"Function '{self.func_name}' must return '{return_type}' type",
+                                "_line", code)[0])
+        else:
+            self.emit(f"return {converted}")
+
+    # ---- expressions ----
+
+    def expression(self, node) -> tuple[str, str]:
+        """ Python code for the expression, and its Brewin type. """
+        expr = node.elem_type
+        if expr in ("int", "string", "bool"):
+            return repr(node.get("val")), expr
+        if expr == "nil":
+            return "None", "nil"
+        if expr == "var":
+            return self.variable(node)
+        if expr in UnaryOps:
+            return self.unary_op(node)
+        if expr in BinaryOps:
+            return self.binary_op(node)
+        if expr in (Statement.FUNC_CALL, Statement.INLINE):
+            # an inlined body is still a call here: its statements cannot go in a Python expression, and the
+            # function it calls is already compiled Python code (see optimize.Inliner)
+            return self.call(node)
+        if expr == Statement.CACHED:
+            # kept where it is first computed, reused where it is computed again (see optimize.CommonSubexpressions)
+            if node.get("expression") is None:
+                return self.temporaries[node.get("id")]
+            code, value_type = self.expression(node.get("expression"))
+            local = f"t_{node.get('id')}"
+            self.temporaries[node.get("id")] = (local, value_type)
+            return f"({local} := {code})", value_type
+        if expr == Statement.INVARIANT:
+            # computed the first time in a run of its loop (see optimize.LoopInvariants); a nil value is computed
+            # again, which gives nil again
+            code, value_type = self.expression(node.get("expression"))
+            local = f"i_{node.get('id')}"
+            return f"({local} if {local} is not None else ({local} := {code}))", value_type
+        if expr == Statement.NEW:
+            struct_name = node.get("var_type")
+            if struct_name not in self.structs:
+                return self.fail(ErrorType.TYPE_ERROR, f"Struct '{struct_name}' not found", node.lineno)
+            fields = ", ".join(f"{field!r}: {default(field_type)}"
+                               for field, field_type in self.structs[struct_name].items())
+            return f"{{{fields}}}", struct_name
+        return self.fail(ErrorType.TYPE_ERROR, f"Operand '{expr}' is unknown", node.lineno)
+
+    def field_type(self, var_type: str, fields: list[str]) -> str|None:
+        """ The type of a field path in a struct type, or None if it has no such field (or a step is no struct). """
+        for field in fields:
+            struct = self.structs.get(var_type)
+            if struct is None or field not in struct:
+                return None
+            var_type = struct[field]
+        return var_type
+
+    def variable(self, node) -> tuple[str, str]:
+        var_name, lineno = node.get("name"), node.lineno
+        fields = path(var_name)
+        found = self.lookup(fields[0])
+        if found is None:
+            return self.fail(ErrorType.NAME_ERROR, f"Variable '{var_name}' not found", lineno)
+        local, var_type = found
+        if len(fields) == 1:
+            return local, var_type
+        field_type = self.field_type(var_type, fields[1:])
+        if field_type is None:
+            return f"_field({local}, {fields[1:]!r}, {str(var_name)!r}, {lineno})", "void"  # always fails
+        # every step is a struct with the field: the only run-time check left is for nil
+        code = local
+        for field in fields[1:]:
+            if code.isidentifier():
+                code = f"({code}[{field!r}] if {code} is not None else _fault({str(var_name)!r}, {lineno}))"
+            else:
+                code = f"(_t[{field!r}] if (_t := {code}) is not None else _fault({str(var_name)!r}, {lineno}))"
+        return code, field_type
+
+    def unary_op(self, node) -> tuple[str, str]:
+        oper = node.elem_type
+        code, value_type = self.expression(node.get("op1"))
+        if oper == "!":
+            code, value_type = convert(code, value_type, "bool")
+            if value_type == "bool":
+                return f"(not {code})", "bool"
+        else:
+            code, value_type = convert(code, value_type, "int")
+            if value_type == "int":
+                return f"(-{code})", "int"
+        return self.fail(ErrorType.TYPE_ERROR, f"Incompatible types for '{oper}' operation", node.lineno, code)
+
+    def binary_op(self, node) -> tuple[str, str]:
+        oper, lineno = node.elem_type, node.lineno
+        lhs, lhs_type = self.expression(node.get("op1"))
+        rhs, rhs_type = self.expression(node.get("op2"))
+        description = "Incompatible types '{}' and '{}' for '" + oper + "' operation"
+
+        if oper in EqualOps and (lhs_type in self.structs or rhs_type in self.structs):
+            if lhs_type in self.structs and rhs_type in self.structs and lhs_type != rhs_type:
+                return self.fail(ErrorType.TYPE_ERROR, description.format(lhs_type, rhs_type), lineno, lhs, rhs)
+            if lhs_type in self.structs and rhs_type in self.structs or "nil" in (lhs_type, rhs_type):
+                # a nil struct compares as nil, others by identity
+                return f"({lhs} {'is' if oper == '==' else 'is not'} {rhs})", "bool"
+            # a struct and a value of a basic type are never equal, but it is an error if the struct is nil
+            struct_left = lhs_type in self.structs
+            other = rhs_type if struct_left else lhs_type
+            types = ("nil", other) if struct_left else (other, "nil")
+            return (f"_mixed({lhs}, {rhs}, {struct_left}, {oper == '!='}, "
+                    f"{description.format(*types)!r}, {lineno})", "bool")
+
+        swapped = False
+        if oper in LogicOps:
+            lhs, lhs_type = convert(lhs, lhs_type, "bool")
+            rhs, rhs_type = convert(rhs, rhs_type, "bool")
+        else:  # coercion_by_priority
+            lhs_priority, rhs_priority = PRIORITY.get(lhs_type, 10), PRIORITY.get(rhs_type, 10)
+            if lhs_priority > rhs_priority:
+                rhs, rhs_type = convert(rhs, rhs_type, lhs_type)
+                swapped = True  # coercion_by_priority returns the converted operand first
+            elif lhs_priority < rhs_priority:
+                lhs, lhs_type = convert(lhs, lhs_type, rhs_type)
+        py_op = PY_OPS.get(lhs_type, {}).get(oper) if lhs_type == rhs_type else None
+        if py_op is None:
+            types = (rhs_type, lhs_type) if swapped else (lhs_type, rhs_type)
+            return self.fail(ErrorType.TYPE_ERROR, description.format(*types), lineno, lhs, rhs)
+        result_type = lhs_type if oper in ("+", "-", "*", "/") else "bool"
+        return f"({lhs} {py_op} {rhs})", result_type
+
+    def printable(self, code: str, value_type: str, lineno) -> str:
+        """ get_printable, checked as print() checks it. """
+        if value_type == "int":
+            return f"str({code})"
+        if value_type == "string":
+            return code
+        if value_type == "bool":
+            return f"('true' if {code} else 'false')"
+        if value_type in self.structs:
+            return f"_print_struct({code}, {lineno})"
+        return self.fail(ErrorType.TYPE_ERROR, "Non-printable type for print()", lineno, code)[0]
+
+    def call(self, node) -> tuple[str, str]:
+        func_name, args, lineno = node.get("name"), node.get("args"), node.lineno
+        if func_name == "print":
+            parts = [self.printable(*self.expression(arg), arg.lineno) for arg in args]
+            return f"_output({' + '.join(parts) or repr('')})", "void"
+        if func_name in ("inputi", "inputs"):
+            if len(args) > 1:
+                return self.fail(ErrorType.NAME_ERROR, "inputi() can take only one parameter", lineno)
+            prompt = ""
+            if args:
+                code, value_type = self.expression(args[0])
+                # printed unchecked, as the interpreter does: a non-printable prompt prints as None
+                if value_type in ("int", "string", "bool"):
+                    prompt = ", " + self.printable(code, value_type, lineno)
+                elif value_type in self.structs:
+                    prompt = f", ('nil' if {code} is None else None)"
+                else:
+                    prompt = f", ({code}, None)[1]"
+            return f"_input({func_name == 'inputi'}{prompt})", "int" if func_name == "inputi" else "string"
+
+        signature = self.functions.get((func_name, len(args)))
+        if signature is None:  # looked up before the arguments are evaluated
+            return self.fail(ErrorType.NAME_ERROR, f"Function '{func_name}' with {len(args)} params not found", lineno)
+        params, return_type = signature
+        codes = [self.expression(arg) for arg in args]
+        converted = [code for code, _ in codes]
+        for k, ((param_name, param_type), (code, value_type)) in enumerate(zip(params, codes)):
+            converted[k], converted_type = convert(code, value_type, param_type)
+            if converted_type != param_type:  # checked once every argument has been evaluated
+                return self.fail(ErrorType.TYPE_ERROR, f"Function '{func_name}' expects '{param_type}' type for "
+                                 f"'{param_name}'", lineno, *(code for code, _ in codes))
+        return f"{function_name(func_name, len(args))}({', '.join([str(lineno)] + converted)})", return_type
+
+
+def path(var_name) -> list[str]:
+    if isinstance(var_name, DottedName):
+        return list(var_name.path)
+    return var_name.split(".")
+
+
+def runtime(interpreter) -> dict:
+    """ The globals generated code runs with: error types and helpers bound to the interpreter. """
+    error, output, get_input = interpreter.error, interpreter.output, interpreter.get_input
+
+    def walk(value, fields):
+        # EnvironmentManager._traverse_scope on raw values, from the value of the variable: the dict holding the
+        # last field, or the error
+        if value is None:
+            return ErrorType.FAULT_ERROR
+        if type(value) is not dict:
+            return ErrorType.TYPE_ERROR
+        for field in fields[:-1]:
+            if field not in value:
+                return ErrorType.NAME_ERROR
+            value = value[field]
+            if value is None:
+                return ErrorType.FAULT_ERROR
+            if type(value) is not dict:
+                return ErrorType.TYPE_ERROR
+        return value
+
+    def lookup(value, fields):
+        # EnvironmentManager.get: walk, then the last field must exist
+        container = walk(value, fields)
+        if type(container) is dict and fields[-1] not in container:
+            return ErrorType.NAME_ERROR
+        return container
+
+    def field(value, fields, var_name, lineno):
+        container = lookup(value, fields)
+        if type(container) is not dict:
+            error(container, f"Variable '{var_name}' not found", lineno)
+        return container[fields[-1]]
+
+    def fail(error_type, description, lineno, *operands):
+        error(error_type, description, lineno)
+
+    def fault(var_name, lineno):
+        error(ErrorType.FAULT_ERROR, f"Variable '{var_name}' not found", lineno)
+
+    def mixed(lhs, rhs, struct_left, unequal, description, lineno):
+        if (lhs if struct_left else rhs) is None:
+            error(ErrorType.TYPE_ERROR, description, lineno)
+        return unequal
+
+    def print_struct(value, lineno):
+        if value is not None:
+            error(ErrorType.TYPE_ERROR, "Non-printable type for print()", lineno)
+        return "nil"
+
+    def read_input(integer, *prompt):
+        if prompt:
+            output(prompt[0])
+        usr_input = get_input()
+        return int(usr_input) if integer else usr_input
+
+    return {"NAME_ERROR": ErrorType.NAME_ERROR, "TYPE_ERROR": ErrorType.TYPE_ERROR,
+            "FAULT_ERROR": ErrorType.FAULT_ERROR, "_fail": fail, "_fault": fault, "_field": field, "_walk": walk,
+            "_lookup": lookup, "_mixed": mixed, "_print_struct": print_struct, "_output": output, "_input": read_input}
@@ -120,6 +120,9 @@ class Statement:
     FOR_STATEMENT = "for"
     RETURN = "return"
     NEW = "new"
+    CACHED = "cached" # a value computed once and reused, put in by optimize.CommonSubexpressions
+    INVARIANT = "invariant" # a value computed once per run of a loop, put in by optimize.LoopInvariants
+    INLINE = "inline" # the body of a function in place of a call to it, put in by optimize.Inliner
 
 UnaryOps = {"neg", "!"}
 EqualOps = {"==", "!="}
@@ -0,0 +1,511 @@
+from compiler import FAST_BINARY, apply_binary
+from element import DottedName
+from env import get_field, traverse_fields
+from intbase import ErrorType
+from resolve import Resolver
+from type import *
+
+INT, BOOL, STRING, NIL, VOID = BasicType.INT, BasicType.BOOL, BasicType.STRING, BasicType.NIL, BasicType.VOID
+
+OPNAMES = ["CONST", "LOAD", "LOAD_FIELD", "LOOKUP_FIELD", "STORE", "STORE_FIELD", "DEF", "BINARY", "UNARY",
+           "JUMP", "JUMP_IF_FALSE", "CALL", "RETURN", "POP", "PRINTABLE", "PRINT", "INPUT", "NEW", "FAIL", "REMEMBER",
+           "INVARIANT", "FORGET", "BIND", "RESULT"]
+(CONST, LOAD, LOAD_FIELD, LOOKUP_FIELD, STORE, STORE_FIELD, DEF, BINARY, UNARY,
+ JUMP, JUMP_IF_FALSE, CALL, RETURN, POP, PRINTABLE, PRINT, INPUT, NEW, FAIL, REMEMBER,
+ INVARIANT, FORGET, BIND, RESULT) = range(len(OPNAMES))
+
+
+class Function:
+    """ A user function: what a call needs to bind its arguments and check its result, and its code, compiled on
+    the first call. """
+    __slots__ = ("node", "name", "params", "return_type", "default", "code", "size")
+
+    def __init__(self, node, params: list[tuple[str, Value]], return_type: Type):
+        self.node = node
+        self.name = node.get("name")
+        self.params = params  # (name, default value of its type), one per distinct name
+        self.return_type = return_type
+        self.default = create_value(return_type)
+        self.code: list[tuple[int, object]]|None = None
+        self.size = 0  # slots in a frame of the function, once compiled
+
+
+class VM:
+    """ Execution engine that compiles each function of a v3 program, on its first call, to a list of (opcode,
+    argument) instructions for a stack machine, and runs them in one dispatch loop. Calls push a frame on the VM's
+    own call stack rather than recursing in Python, and if/for become conditional and plain jumps. && and || still
+    evaluate both operands, as they do in the interpreter.
+
+    Variables are resolved to slots as a function is compiled (see resolve.py) and live in a frame per call, so
+    blocks cost no instructions. Every check is made at run time in the interpreter's order, raising the same error
+    on the same line. """
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.functions: dict[tuple[str, int], Function] = {}
+
+    def get_type(self, var_type: str) -> Type|ErrorType:
+        if BasicType.contains(var_type):
+            return BasicType(var_type)
+        if var_type in self.interpreter.struct_table:
+            return StructType(var_type)
+        return ErrorType.TYPE_ERROR
+
+    def function(self, key: tuple[str, int]) -> Function|None:
+        function = self.functions.get(key)
+        if function is None:
+            func_node = self.interpreter.func_table.get(key)
+            if func_node is None:
+                return None
+            # a dict, as in Interpreter.__call_func: a repeated parameter name is bound once
+            params = {arg.get("name"): self.get_type(arg.get("var_type")) for arg in func_node.get("args")}
+            function = self.functions[key] = Function(
+                func_node, [(name, create_value(param_type)) for name, param_type in params.items()],
+                self.get_type(func_node.get("return_type")))
+        return function
+
+    def code(self, function: Function) -> list[tuple[int, object]]:
+        if function.code is None:
+            compiler = FunctionCompiler(self, function)
+            function.code = compiler.compile(function.node)
+            function.size = compiler.resolver.size
+        return function.code
+
+    # ---- execution ----
+
+    def run(self, main_func) -> None:
+        # like Interpreter.run, main's own node stands in for the call
+        self.execute(self.function(("main", 0)), [], main_func.lineno)
+
+    def execute(self, function: Function, arg_values: list[Value], call_line) -> Value:
+        error = self.interpreter.error
+        output, get_input = self.interpreter.output, self.interpreter.get_input
+        struct_table = self.interpreter.struct_table
+
+        frames = []  # (function, code, pc, stack, call line, slots) of every caller
+        code = self.code(function)
+        slots = self.enter(function, arg_values, call_line)
+        pc = 0
+        stack = []
+        while True:
+            op, arg = code[pc]
+            pc += 1
+            if op == LOAD:
+                stack.append(slots[arg])
+            elif op == CONST:
+                stack.append(arg)
+            elif op == BINARY:
+                oper, fast_type, raw, result_type, lineno = arg
+                rhs = stack.pop()
+                lhs = stack[-1]
+                if lhs.t is fast_type and rhs.t is fast_type:
+                    stack[-1] = Value(result_type, raw(lhs.v, rhs.v))
+                else:
+                    stack[-1] = apply_binary(error, oper, lhs, rhs, lineno)
+            elif op == STORE:
+                slot, var_name, lineno = arg
+                value = stack.pop()
+                var_def = slots[slot]
+                if value.t is not var_def.t:
+                    value, var_def = try_conversion(value, var_def)
+                    if var_def.type != value.type:
+                        error(ErrorType.TYPE_ERROR, f"Cannot assign '{value.type}' to variable '{var_name}'", lineno)
+                slots[slot] = value
+            elif op == JUMP_IF_FALSE:
+                target, template, description, lineno = arg
+                value = stack.pop()
+                if value.t is not BOOL:
+                    value, _ = try_conversion(value, template)
+                    if value.type != BOOL:
+                        error(ErrorType.TYPE_ERROR, description, lineno)
+                if value.v is False:
+                    pc = target
+            elif op == JUMP:
+                pc = arg
+            elif op == LOAD_FIELD:
+                slot, fields, var_name, lineno = arg
+                value = get_field(slots[slot], fields)
+                if isinstance(value, ErrorType):
+                    error(value, f"Variable '{var_name}' not found", lineno)
+                stack.append(value)
+            elif op == LOOKUP_FIELD:
+                # the field is looked up before the expression assigned to it runs
+                stack.append(get_field(slots[arg[0]], arg[1]))
+            elif op == STORE_FIELD:
+                slot, fields, var_name, lineno = arg
+                value = stack.pop()
+                var_def = stack.pop()
+                if isinstance(var_def, ErrorType):
+                    error(var_def, f"Variable '{var_name}' not found", lineno)
+                if value.t is not var_def.t:
+                    value, var_def = try_conversion(value, var_def)
+                    if var_def.type != value.type:
+                        error(ErrorType.TYPE_ERROR, f"Cannot assign '{value.type}' to variable '{var_name}'", lineno)
+                scope, res = traverse_fields(slots[slot], fields)  # the expression may have changed the path
+                if res is not None:
+                    error(res, f"Cannot assign '{value.type}' to variable '{var_name}'", lineno)
+                scope[fields[-1]] = value
+            elif op == CALL:
+                callee, argc, lineno = arg
+                if argc:
+                    arg_values = stack[-argc:]
+                    del stack[-argc:]
+                else:
+                    arg_values = []
+                frames.append((function, code, pc, stack, call_line, slots))
+                code = callee.code or self.code(callee)
+                slots = self.enter(callee, arg_values, lineno)
+                function, call_line = callee, lineno
+                pc = 0
+                stack = []
+            elif op == RETURN:
+                result = self.leave(function, stack.pop() if stack else None, call_line)
+                if not frames:
+                    return result
+                function, code, pc, stack, call_line, slots = frames.pop()
+                stack.append(result)
+            elif op == UNARY:
+                oper, template, lineno = arg
+                value = stack[-1]
+                if value.t is template.t:
+                    stack[-1] = Value(BOOL, not value.v) if value.t is BOOL else Value(INT, -value.v)
+                else:
+                    value, _ = try_conversion(value, template)
+                    op_func = get_operator_lambda(value.type, oper)
+                    if op_func is None:
+                        error(ErrorType.TYPE_ERROR, f"Incompatible types for '{oper}' operation", lineno)
+                    stack[-1] = op_func(value)
+            elif op == POP:
+                stack.pop()
+            elif op == DEF:
+                slots[arg[0]] = arg[1]
+            elif op == REMEMBER:
+                slots[arg] = stack[-1]
+            elif op == INVARIANT:
+                value = slots[arg[1]]
+                if value is not None:  # computed earlier in this run of the loop: skip its code
+                    stack.append(value)
+                    pc = arg[0]
+            elif op == FORGET:
+                for slot in arg:
+                    slots[slot] = None
+            elif op == BIND:
+                callee, targets, lineno = arg
+                arg_values = stack[-len(targets):]
+                del stack[-len(targets):]
+                self.bind(callee, arg_values, slots, targets, lineno)
+            elif op == RESULT:
+                stack[-1] = self.leave(arg[0], stack[-1], arg[1])
+            elif op == NEW:
+                struct_type, struct_name = arg
+                stack.append(Value(struct_type, dict(struct_table[struct_name])))
+            elif op == PRINTABLE:
+                printable = get_printable(stack[-1])
+                if printable is None:
+                    error(ErrorType.TYPE_ERROR, "Non-printable type for print()", arg)
+                stack[-1] = printable
+            elif op == PRINT:
+                if arg:
+                    s = "".join(stack[-arg:])
+                    del stack[-arg:]
+                else:
+                    s = ""
+                output(s)
+                stack.append(create_value(VOID))
+            elif op == INPUT:
+                func_name, has_prompt = arg
+                if has_prompt:
+                    output(get_printable(stack.pop()))
+                usr_input = get_input()
+                stack.append(create_value(INT, int(usr_input)) if func_name == "inputi"
+                             else create_value(STRING, usr_input))
+            elif op == FAIL:
+                error(*arg)
+            else:
+                raise ValueError(f"Unknown opcode: {op}")
+
+    def enter(self, function: Function, arg_values: list[Value], lineno) -> list:
+        """ The frame of a call, with its arguments bound to the parameters, which take the first slots. """
+        slots = [None] * function.size
+        self.bind(function, arg_values, slots, range(len(function.params)), lineno)
+        return slots
+
+    def bind(self, function: Function, arg_values: list[Value], slots: list, targets, lineno) -> None:
+        """ Convert the arguments to the types of the parameters and store them in the target slots. """
+        for slot, ((param_name, param_value), arg_value) in zip(targets, zip(function.params, arg_values)):
+            if arg_value.t is not param_value.t:
+                arg_value, converted = try_conversion(arg_value, param_value)
+                if converted.type != arg_value.type:
+                    self.interpreter.error(ErrorType.TYPE_ERROR, f"Function '{function.name}' expects "
+                                           f"'{converted.type}' type for '{param_name}'", lineno)
+            slots[slot] = arg_value
+
+    def leave(self, function: Function, result: Value|None, lineno) -> Value:
+        """ The value a call returns, from the value of its return statement (None if it ran off the end). """
+        return_type = function.return_type
+        if result is None:
+            result = create_value(VOID)
+        if result.t is return_type:
+            return result
+        if result.type == VOID and result.type != return_type:
+            return function.default  # no return statement, or a return without a value
+        result, _ = try_conversion(result, function.default)
+        if result.type != return_type:
+            self.interpreter.error(ErrorType.TYPE_ERROR,
+                                   f"Function '{function.name}' must return '{return_type}' type", lineno)
+        return result
+
+
+class FunctionCompiler:
+    """ Compiles the body of one function to VM instructions. """
+    def __init__(self, vm: VM, function: Function):
+        self.vm = vm
+        self.code: list[tuple[int, object]] = []
+        self.resolver = Resolver([(name, param_value.t) for name, param_value in function.params])
+        self.temporaries: dict[int, int] = {}  # id of a cached node -> its slot
+        self.invariants: dict[int, int] = {}  # id of a loop invariant -> its slot
+        self.returns: list[list[int]] = []  # for each inlined body being compiled, its jumps to its result
+
+    def emit(self, op: int, arg=None) -> int:
+        self.code.append((op, arg))
+        return len(self.code) - 1
+
+    def patch(self, at: int, target: int) -> None:
+        op, arg = self.code[at]
+        self.code[at] = (op, target if op == JUMP else (target,) + arg[1:])
+
+    def compile(self, func_node) -> list[tuple[int, object]]:
+        self.block(func_node.get("statements"))
+        self.emit(RETURN)  # falls off the end: the stack is empty, so the call returns the default value
+        return self.code
+
+    # ---- statements ----
+
+    def block(self, statement_nodes) -> None:
+        """ Code for the statements of a block, whose variables are only in scope until its end. """
+        self.resolver.push()
+        for node in statement_nodes:
+            self.statement(node)
+        self.resolver.pop()
+
+    def statement(self, node) -> None:
+        category = node.elem_type
+        if category == Statement.VAR_DEF:
+            var_name = node.get("name")
+            var_type = self.vm.get_type(node.get("var_type"))
+            if isinstance(var_type, ErrorType):
+                self.emit(FAIL, (var_type, f"Variable '{var_name}' has invalid type '{node.get('var_type')}'",
+                                 node.lineno))
+            else:
+                variable = self.resolver.define(var_name, var_type)
+                if variable is None:
+                    self.emit(FAIL, (ErrorType.NAME_ERROR, f"Variable '{var_name}' defined more than once",
+                                     node.lineno))
+                else:
+                    self.emit(DEF, (variable.slot, create_value(var_type), var_name))
+        elif category == Statement.ASSIGNMENT:
+            self.assign(node)
+        elif category == Statement.FUNC_CALL:
+            self.call(node)
+            self.emit(POP)
+        elif category == Statement.INLINE:
+            self.inline(node)
+            self.emit(POP)
+        elif category == Statement.IF_STATEMENT:
+            self.if_statement(node)
+        elif category == Statement.FOR_STATEMENT:
+            self.for_statement(node)
+        elif category == Statement.RETURN:
+            if node.get("expression"):
+                self.expression(node.get("expression"))
+            else:
+                self.emit(CONST, create_value(VOID))
+            if self.returns:  # ends the inlined body, not the function
+                self.returns[-1].append(self.emit(JUMP))
+            else:
+                self.emit(RETURN)
+        else:
+            self.emit(FAIL, (ErrorType.TYPE_ERROR, f"Statement '{category}' is unknown", node.lineno))
+
+    def assign(self, node) -> None:
+        var_name = node.get("name")
+        variable = self.resolver.lookup(var_name)
+        if variable is None:  # the interpreter fails once it has evaluated the expression
+            self.expression(node.get("expression"))
+            self.emit(FAIL, (ErrorType.NAME_ERROR, f"Variable '{var_name}' not found", node.lineno))
+        elif isinstance(var_name, DottedName) or "." in var_name:
+            fields = var_name.path if isinstance(var_name, DottedName) else var_name.split(".")
+            self.emit(LOOKUP_FIELD, (variable.slot, fields))
+            self.expression(node.get("expression"))
+            self.emit(STORE_FIELD, (variable.slot, fields, var_name, node.lineno))
+        else:
+            self.expression(node.get("expression"))
+            self.emit(STORE, (variable.slot, var_name, node.lineno))
+
+    def condition(self, node, description: str) -> int:
+        """ Code for a condition and a jump, to be patched, taken when it is false. """
+        self.expression(node)
+        return self.emit(JUMP_IF_FALSE, (None, create_value(BOOL), description, node.lineno))
+
+    def if_statement(self, node) -> None:
+        to_else = self.condition(node.get("condition"), "'if' condition must be a boolean")
+        self.block(node.get("statements"))
+        if node.get("else_statements"):
+            to_end = self.emit(JUMP)
+            self.patch(to_else, len(self.code))
+            self.block(node.get("else_statements"))
+            self.patch(to_end, len(self.code))
+        else:
+            self.patch(to_else, len(self.code))
+
+    def for_statement(self, node) -> None:
+        init, update = node.get("init"), node.get("update")
+        if init.elem_type != Statement.ASSIGNMENT:
+            self.emit(FAIL, (ErrorType.TYPE_ERROR, "'for' loop initialization must be a variable declaration",
+                             init.lineno))
+            return
+        if update.elem_type != Statement.ASSIGNMENT:
+            self.emit(FAIL, (ErrorType.TYPE_ERROR, "'for' loop update must be an assignment", update.lineno))
+            return
+        if node.get("invariants"):
+            self.emit(FORGET, tuple(self.invariants.setdefault(invariant, self.resolver.temporary())
+                                    for invariant in node.get("invariants")))
+        self.assign(init)
+        start = len(self.code)
+        to_end = self.condition(node.get("condition"), "'for' loop condition must be a boolean")
+        self.block(node.get("statements"))
+        self.assign(update)
+        self.emit(JUMP, start)
+        self.patch(to_end, len(self.code))
+
+    # ---- expressions ----
+
+    def expression(self, node) -> None:
+        """ Code that pushes the Value of the expression. """
+        expr = node.elem_type
+        if expr in VarType:
+            self.emit(CONST, create_value(BasicType(expr), node.get("val")))
+        elif expr == BasicType.NIL.value:
+            self.emit(CONST, create_value(NIL))
+        elif expr == "var":
+            var_name = node.get("name")
+            variable = self.resolver.lookup(var_name)
+            if variable is None:
+                self.emit(FAIL, (ErrorType.NAME_ERROR, f"Variable '{var_name}' not found", node.lineno))
+            elif isinstance(var_name, DottedName) or "." in var_name:
+                fields = var_name.path if isinstance(var_name, DottedName) else var_name.split(".")
+                self.emit(LOAD_FIELD, (variable.slot, fields, var_name, node.lineno))
+            else:
+                self.emit(LOAD, variable.slot)
+        elif expr in UnaryOps:
+            self.expression(node.get("op1"))
+            self.emit(UNARY, (expr, create_value(BOOL) if expr == "!" else create_value(INT), node.lineno))
+        elif expr in BinaryOps:
+            self.expression(node.get("op1"))
+            self.expression(node.get("op2"))
+            fast_type, raw, result_type = FAST_BINARY.get(expr, (None, None, None))
+            self.emit(BINARY, (expr, fast_type, raw, result_type, node.lineno))
+        elif expr == Statement.FUNC_CALL:
+            self.call(node)
+        elif expr == Statement.INLINE:
+            self.inline(node)
+        elif expr == Statement.CACHED:
+            # kept where it is first computed, loaded where it is reused (see optimize.CommonSubexpressions)
+            if node.get("expression") is None:
+                self.emit(LOAD, self.temporaries[node.get("id")])
+            else:
+                self.expression(node.get("expression"))
+                self.temporaries[node.get("id")] = slot = self.resolver.temporary()
+                self.emit(REMEMBER, slot)
+        elif expr == Statement.INVARIANT:
+            # computed once per run of its loop, which forgets it when it starts (see optimize.LoopInvariants)
+            slot = self.invariants[node.get("id")]
+            skip = self.emit(INVARIANT, (None, slot))
+            self.expression(node.get("expression"))
+            self.emit(REMEMBER, slot)
+            self.patch(skip, len(self.code))
+        elif expr == Statement.NEW:
+            struct_name = node.get("var_type")
+            if struct_name in self.vm.interpreter.struct_table:
+                self.emit(NEW, (StructType(struct_name), struct_name))
+            else:
+                self.emit(FAIL, (ErrorType.TYPE_ERROR, f"Struct '{struct_name}' not found", node.lineno))
+        else:
+            self.emit(FAIL, (ErrorType.TYPE_ERROR, f"Operand '{expr}' is unknown", node.lineno))
+
+    def call(self, node) -> None:
+        func_name, args = node.get("name"), node.get("args")
+        if func_name == "print":
+            for arg in args:
+                self.expression(arg)
+                self.emit(PRINTABLE, arg.lineno)  # checked before the next argument runs
+            self.emit(PRINT, len(args))
+        elif func_name in ("inputi", "inputs"):
+            if len(args) > 1:
+                self.emit(FAIL, (ErrorType.NAME_ERROR, "inputi() can take only one parameter", node.lineno))
+                return
+            if args:
+                self.expression(args[0])  # the prompt, printed unchecked, as the interpreter does
+            self.emit(INPUT, (func_name, bool(args)))
+        else:
+            function = self.vm.function((func_name, len(args)))
+            if function is None:
+                self.emit(FAIL, (ErrorType.NAME_ERROR, f"Function '{func_name}' with {len(args)} params not found",
+                                 node.lineno))
+                return
+            for arg in args:
+                self.expression(arg)
+            self.emit(CALL, (function, len(args), node.lineno))
+
+    def inline(self, node) -> None:
+        """ A call the optimizer replaced with the function's body (see optimize.Inliner): its parameters and
+        variables get slots of the caller's frame, in blocks of their own, and its returns jump to the code that
+        converts the result, as RETURN would. """
+        params = [(name, create_value(self.vm.get_type(var_type))) for name, var_type in node.get("params")]
+        function = Function(node, params, self.vm.get_type(node.get("return_type")))
+        for arg in node.get("args"):
+            self.expression(arg)
+        self.resolver.push()
+        targets = tuple(self.resolver.define(name, param_value.t).slot for name, param_value in params)
+        if targets:
+            self.emit(BIND, (function, targets, node.lineno))
+        self.returns.append([])
+        self.block(node.get("statements"))
+        self.emit(CONST, create_value(VOID))  # ran off the end
+        for jump in self.returns.pop():
+            self.patch(jump, len(self.code))
+        self.resolver.pop()
+        self.emit(RESULT, (function, node.lineno))
+
+
+def disassemble(code: list[tuple[int, object]]) -> str:
+    """ One line per instruction: its index, opcode and argument. """
+    lines = []
+    for pc, (op, arg) in enumerate(code):
+        if op == CALL:
+            arg = f"{arg[0].name}/{arg[1]} line {arg[2]}"
+        elif op == CONST:
+            arg = f"{arg.type} {arg.value!r}"
+        elif op == BINARY:
+            arg = f"{arg[0]} line {arg[-1]}"
+        elif op == JUMP_IF_FALSE:
+            arg = f"-> {arg[0]} line {arg[-1]}"
+        elif op == INVARIANT:
+            arg = f"[{arg[1]}] -> {arg[0]}"
+        elif op == BIND:
+            arg = f"{arg[0].name} {list(arg[1])} line {arg[2]}"
+        elif op == RESULT:
+            arg = f"{arg[0].name} line {arg[1]}"
+        elif op == JUMP:
+            arg = f"-> {arg}"
+        elif op in (LOAD, REMEMBER):
+            arg = f"[{arg}]"
+        elif op in (STORE, LOAD_FIELD, STORE_FIELD):
+            arg = f"[{arg[0]}] {arg[-2]} line {arg[-1]}"
+        elif op == LOOKUP_FIELD:
+            arg = f"[{arg[0]}] {'.'.join(arg[1])}"
+        elif op == DEF:
+            arg = f"[{arg[0]}] {arg[2]}: {arg[1].type}"
+        elif isinstance(arg, tuple):
+            arg = " ".join(str(item) for item in arg)
+        lines.append(f"{pc:5}  {OPNAMES[op]:<13} {'' if arg is None else arg}")
+    return "\n".join(lines)
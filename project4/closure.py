@@ -3,7 +3,7 @@ from element import Element
 class Closure:
     def __init__(self, expr: Element):
         self._expr = expr
-        self._scope = [{}]
+        self._scope = {}  # slot -> value of the variables the expression reads, as captured
 
     @property
     def expr(self):
@@ -13,5 +13,5 @@ class Closure:
     def scope(self):
         return self._scope
 
-    def add_scope(self, var_name: str, expr):
-        self._scope[-1][var_name] = expr
+    def add_scope(self, slot: int, expr):
+        self._scope[slot] = expr
@@ -3,38 +3,31 @@ from type import *
 
 class EnvironmentManager:
     """ The EnvironmentManager class keeps a mapping between each variable (aka symbol) in a Brewin program and the value of that variable """
+    # a frame per function call: a list with a slot per variable of the function, where the resolver put it (see
+    # resolve.py), so variables are read and assigned by index, with no lookup by name
     def __init__(self):
-        self.environment = []  # [[{}], [{},{}], ...]
+        self.environment = []  # [[...], [...], ...]
 
-    def assign(self, symbol: str, val: Value) -> bool:
-        """ Assign a value to a variable name. """
-        curr_env = self.environment[-1]
-        for env in reversed(curr_env):
-            if symbol in env:
-                env[symbol] = val
-                return True
-        return False  # variable not exist
+    def assign(self, slot: int|None, val: Value) -> bool:
+        """ Assign a value to a variable. """
+        if slot is None:
+            return False  # variable not exist
+        self.environment[-1][slot] = val
+        return True
 
-    def create(self, symbol: str, val: Value = None) -> bool:
-        """ Declare a variable at the top environment with a given value. Return False if the variable already exists. """
+    def create(self, slot: int|None, val: Value = None) -> bool:
+        """ Declare a variable with a given value. Return False if the variable already exists in its block. """
         if val is None: val = create_value(Type.NIL)  # default value
-        curr_env = self.environment[-1][-1]
-        if symbol not in curr_env:
-            curr_env[symbol] = val
-            return True
-        return False  # variable already declared
+        if slot is None:
+            return False  # variable already declared
+        self.environment[-1][slot] = val
+        return True
 
     def get_current_env(self):
         return self.environment[-1]
 
-    def push_env(self):
-        self.environment.append([{}])
+    def push_env(self, size: int):
+        self.environment.append([None] * size)
 
     def pop_env(self):
         self.environment.pop()
-
-    def push_block(self):
-        self.environment[-1].append({})
-
-    def pop_block(self):
-        self.environment[-1].pop()
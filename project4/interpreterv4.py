@@ -3,6 +3,7 @@ from closure import Closure
 from element import Element
 from env import EnvironmentManager
 from intbase import ErrorType, InterpreterBase
+from resolve import Annotator
 from type import *
 
 
@@ -12,12 +13,13 @@ class Interpreter(InterpreterBase):
         self.trace_output = trace_output  # debug purpose
         self.env = EnvironmentManager()  # store variables
         self.func_table: dict[tuple[str, int], Element] = {}  # key: (func name, arg count)
+        self.resolved: dict[tuple[str, int], tuple] = {}  # key: (func name, arg count), see __resolve
 
     def run(self, program) -> None:
         ast = parse_program(program)  # generate Abstract Syntax Tree of the program
         self.__set_function_table(ast)
         main_func = self.__get_func_by_name(("main", 0))
-        result, state = self.__call_func(main_func, [{}])
+        result, state = self.__call_func(main_func, [])
         if state == ExecStatus.RAISE:
             super().error(ErrorType.FAULT_ERROR, f"Unhandled exception {result.value}")
 
@@ -25,7 +27,7 @@ class Interpreter(InterpreterBase):
         for func_node in ast.get("functions"):
             func_name = func_node.get("name")
             if func_name in self.func_table:
-                super().error(ErrorType.NAME_ERROR, f"Function {func_name} defined more than once")
+                super().error(ErrorType.NAME_ERROR, f"Function {func_name} defined more than once", func_node.lineno)
 
             self.func_table[(func_name, len(func_node.get("args")))] = func_node
 
@@ -35,6 +37,15 @@ class Interpreter(InterpreterBase):
 
         return self.func_table[func_key]
 
+    def __resolve(self, func_hash: tuple[str, int], func_node: Element) -> tuple[list, list[Element], int]:
+        """ Resolve a function before its first call (see resolve.Annotator): the slots of its parameters, its
+        statements with the slots of their variables and the size of its frame. """
+        if func_hash not in self.resolved:
+            annotator = Annotator([arg_node.get("name") for arg_node in func_node.get("args")])
+            statements = annotator.block(func_node.get("statements"))
+            self.resolved[func_hash] = annotator.resolver.params, statements, annotator.resolver.size
+        return self.resolved[func_hash]
+
     def __run_statements(self, statement_nodes: list[Element]) -> tuple[Value, ExecStatus]:
         for statement in statement_nodes:
             if self.trace_output: print(" 👩‍💻 ", statement)  # debug
@@ -64,7 +75,7 @@ class Interpreter(InterpreterBase):
                 case Statement.RAISE:
                     result, _ = self.__force_eval(statement.get("exception_type"), self.env.get_current_env())
                     if result.type != Type.STRING:
-                        super().error(ErrorType.TYPE_ERROR, "Exception type must be a string")
+                        super().error(ErrorType.TYPE_ERROR, "Exception type must be a string", statement.lineno)
                     return result, ExecStatus.RAISE
                 case Statement.RETURN:  # return immediately
                     return self.__call_return(statement, self.env.get_current_env())
@@ -75,27 +86,26 @@ class Interpreter(InterpreterBase):
 
     def __var_def(self, vardef_node: Element) -> None:
         var_name = vardef_node.get("name")
-        if not self.env.create(var_name):
-            super().error(ErrorType.NAME_ERROR, f"Variable {var_name} has already been defined")
+        if not self.env.create(vardef_node.slot):
+            super().error(ErrorType.NAME_ERROR, f"Variable {var_name} has already been defined", vardef_node.lineno)
 
-    def __assign(self, assign_node: Element, env: list[dict]) -> None:
+    def __assign(self, assign_node: Element, env) -> None:
         var_name = assign_node.get("name")
         value = self.__capture_value(assign_node.get("expression"), env)
-        if not self.env.assign(var_name, value):
-            super().error(ErrorType.NAME_ERROR, f"Variable {var_name} has not been defined")
+        if not self.env.assign(assign_node.slot, value):
+            super().error(ErrorType.NAME_ERROR, f"Variable {var_name} has not been defined", assign_node.lineno)
 
-    def __capture_value(self, expr_node: Element, env: list[dict]) -> Value:
+    def __capture_value(self, expr_node: Element, env) -> Value:
         closure = Closure(expr_node)
         self.__capture_scope(closure, expr_node, env)
         return Value(Type.CLOSURE, closure)
 
-    def __capture_scope(self, closure: Closure, expr_node: Element, env: list[dict]) -> None:
+    def __capture_scope(self, closure: Closure, expr_node: Element, env) -> None:
         """ Capture variable scope for closure within environment """
         expr = expr_node.elem_type
         if expr == Statement.VAR:
-            var_name = expr_node.get("name")
-            var_val = find_var(var_name, env)
-            closure.add_scope(var_name, var_val)
+            if expr_node.slot is not None:  # else it fails when evaluated
+                closure.add_scope(expr_node.slot, env[expr_node.slot])
         elif expr == Statement.FUNC_CALL:
             for arg in expr_node.get("args"):
                 self.__capture_scope(closure, arg, env)
@@ -105,7 +115,7 @@ class Interpreter(InterpreterBase):
             self.__capture_scope(closure, expr_node.get("op1"), env)
             self.__capture_scope(closure, expr_node.get("op2"), env)
 
-    def __call_func(self, fcall_node: Element, env: list[dict]) -> tuple[Value, ExecStatus]:
+    def __call_func(self, fcall_node: Element, env) -> tuple[Value, ExecStatus]:
         func_name = fcall_node.get("name")
         match func_name:
             case "print":
@@ -115,34 +125,31 @@ class Interpreter(InterpreterBase):
             case _:  # user-defined function
                 func_hash = (func_name, len(fcall_node.get("args")))
                 if func_hash not in self.func_table:
-                    super().error(ErrorType.NAME_ERROR, f"Function {func_name} not found")
+                    super().error(ErrorType.NAME_ERROR, f"Function {func_name} not found", fcall_node.lineno)
 
                 func_node = self.func_table[func_hash]
-                param_names = [arg_node.get("name") for arg_node in func_node.get("args")]
+                param_slots, statements, size = self.__resolve(func_hash, func_node)
                 arg_values = [self.__capture_value(arg, env) for arg in fcall_node.get("args")]
 
-                self.env.push_env()  # new environment for function call
+                self.env.push_env(size)  # new environment for function call
 
                 # map arguments to parameters and add to environment
-                for param_name, arg_value in zip(param_names, arg_values):
-                    self.env.create(param_name, arg_value)
+                for slot, arg_value in zip(param_slots, arg_values):
+                    self.env.create(slot, arg_value)
 
-                self.env.push_block()
-                result, state = self.__run_statements(func_node.get("statements"))
-                self.env.pop_block()
+                result, state = self.__run_statements(statements)
 
                 self.env.pop_env()
 
                 return result, state
 
-    def __call_if(self, if_node: Element, env: list[dict]) -> tuple[Value, ExecStatus]:
+    def __call_if(self, if_node: Element, env) -> tuple[Value, ExecStatus]:
         condition, state = self.__force_eval(if_node.get("condition"), env)
         if state != ExecStatus.CONTINUE:
             return condition, state
         if condition.type != Type.BOOL:
-            super().error(ErrorType.TYPE_ERROR, "If condition must be a boolean")
+            super().error(ErrorType.TYPE_ERROR, "If condition must be a boolean", if_node.get("condition").lineno)
 
-        self.env.push_block()  # new child scope for if statement body
         result, state = create_value(Type.NIL), ExecStatus.CONTINUE
 
         if condition.value:
@@ -150,19 +157,17 @@ class Interpreter(InterpreterBase):
         elif if_node.get("else_statements"):
             result, state = self.__run_statements(if_node.get("else_statements"))
 
-        self.env.pop_block()
-
         return result, state
 
-    def __call_for(self, for_node: Element, env: list[dict]) -> tuple[Value, ExecStatus]:
+    def __call_for(self, for_node: Element, env) -> tuple[Value, ExecStatus]:
         init: Element = for_node.get("init")
         condition: Element = for_node.get("condition")
         update: Element = for_node.get("update")
 
         if init.elem_type != Statement.ASSIGNMENT:
-            super().error(ErrorType.TYPE_ERROR, "For loop initialization must be a variable declaration")
+            super().error(ErrorType.TYPE_ERROR, "For loop initialization must be a variable declaration", init.lineno)
         if update.elem_type != Statement.ASSIGNMENT:
-            super().error(ErrorType.TYPE_ERROR, "For loop update must be an assignment")
+            super().error(ErrorType.TYPE_ERROR, "For loop update must be an assignment", update.lineno)
 
         self.__assign(init, env)
         result, state = create_value(Type.NIL), ExecStatus.CONTINUE
@@ -172,20 +177,18 @@ class Interpreter(InterpreterBase):
             if state != ExecStatus.CONTINUE:
                 return condition_result, state
             if condition_result.type != Type.BOOL:
-                super().error(ErrorType.TYPE_ERROR, "For loop condition must be a boolean")
+                super().error(ErrorType.TYPE_ERROR, "For loop condition must be a boolean", condition.lineno)
             if condition_result.value is False:
                 break
 
-            self.env.push_block()  # new child scope for for loop body
             result, state = self.__run_statements(for_node.get("statements"))
-            self.env.pop_block()
             if state == ExecStatus.RETURN: break
 
             self.__assign(update, env)
 
         return result, state
 
-    def __call_return(self, return_node: Element, env: list[dict]) -> tuple[Value, ExecStatus]:
+    def __call_return(self, return_node: Element, env) -> tuple[Value, ExecStatus]:
         result = create_value(Type.NIL)  # default return value
         expr = return_node.get("expression")
         if expr:
@@ -194,21 +197,17 @@ class Interpreter(InterpreterBase):
         return result, ExecStatus.RETURN
 
     def __call_try(self, try_node: Element) -> tuple[Value, ExecStatus]:
-        self.env.push_block()
         result, state = self.__run_statements(try_node.get("statements"))
-        self.env.pop_block()
 
         if state == ExecStatus.RAISE:
             for catch_node in try_node.get("catchers"):
                 if catch_node.get("exception_type") == result.value:  # exception caught
-                    self.env.push_block()
                     result, state = self.__run_statements(catch_node.get("statements"))
-                    self.env.pop_block()
                     return result, state
 
         return result, state
 
-    def __eval_expr(self, expr_node: Element, env: list[dict]) -> tuple[Value, ExecStatus]:
+    def __eval_expr(self, expr_node: Element, env) -> tuple[Value, ExecStatus]:
         expr = expr_node.elem_type
         if expr == Type.NIL:
             return create_value(Type.NIL), ExecStatus.CONTINUE
@@ -224,41 +223,44 @@ class Interpreter(InterpreterBase):
         if expr in BinaryOps:
             return self.__eval_op(expr_node, env)
 
-        super().error(ErrorType.TYPE_ERROR, f"Unknown operand type: {expr}")
+        super().error(ErrorType.TYPE_ERROR, f"Unknown operand type: {expr}", expr_node.lineno)
 
-    def __force_eval(self, expr_node: Element, env: list[dict]) -> tuple[Value, ExecStatus]:
+    def __force_eval(self, expr_node: Element, env) -> tuple[Value, ExecStatus]:
         value, state = self.__eval_expr(expr_node, env)
         if value.type == Type.CLOSURE:
             return self.__eval_expr(value.value.expr, value.value.scope)
         return value, state
 
-    def __eval_var(self, var_node: Element, env: list[dict]) -> tuple[Value, ExecStatus]:
+    def __eval_var(self, var_node: Element, env) -> tuple[Value, ExecStatus]:
         var_name: str = var_node.get("name")
-        var_value = find_var(var_name, env)
+        var_value = env[var_node.slot] if var_node.slot is not None else None
 
         if var_value is None:
-            super().error(ErrorType.NAME_ERROR, f"Variable {var_name} not found")
+            super().error(ErrorType.NAME_ERROR, f"Variable {var_name} not found", var_node.lineno)
 
         if var_value.type == Type.CLOSURE:  # not evaluated yet
             var_value, state = self.__eval_expr(var_value.value.expr, var_value.value.scope)
             if state != ExecStatus.CONTINUE:
                 return var_value, state
 
-        assign_var(var_name, var_value, env)  # cache evaluated value
+        cached = env[var_node.slot]  # cache evaluated value
+        cached.type = var_value.type
+        cached.value = var_value.value
         return var_value, ExecStatus.CONTINUE
 
-    def __eval_unary_op(self, expr_node: Element, env: list[dict]) -> tuple[Value, ExecStatus]:  # neg, !
+    def __eval_unary_op(self, expr_node: Element, env) -> tuple[Value, ExecStatus]:  # neg, !
         value, state = self.__force_eval(expr_node.get("op1"), env)
         if state != ExecStatus.CONTINUE:
             return value, state
 
         op_func = get_operator_lambda(value.type, expr_node.elem_type)
         if op_func is None:
-            super().error(ErrorType.TYPE_ERROR, f"Incompatible types for '{expr_node.elem_type}' operation")
+            super().error(ErrorType.TYPE_ERROR, f"Incompatible types for '{expr_node.elem_type}' operation",
+                          expr_node.lineno)
 
         return op_func(value), ExecStatus.CONTINUE
 
-    def __eval_op(self, expr_node: Element, env: list[dict]) -> tuple[Value, ExecStatus]:
+    def __eval_op(self, expr_node: Element, env) -> tuple[Value, ExecStatus]:
         oper = expr_node.elem_type
         lhs, state = self.__force_eval(expr_node.get("op1"), env)
         if state != ExecStatus.CONTINUE:
@@ -275,7 +277,7 @@ class Interpreter(InterpreterBase):
 
         # only equality check is allowed for different types
         if oper not in EqualOps and lhs.type != rhs.type:
-            super().error(ErrorType.TYPE_ERROR, f"Incompatible types for {oper} operation")
+            super().error(ErrorType.TYPE_ERROR, f"Incompatible types for {oper} operation", expr_node.lineno)
 
         # raise division by zero exception
         if oper == "/" and rhs.value == 0:
@@ -284,10 +286,10 @@ class Interpreter(InterpreterBase):
         op_func = get_operator_lambda(lhs.type, oper)
         if op_func is None:
             super().error(ErrorType.TYPE_ERROR,
-                          f"Incompatible types '{lhs.type}' and '{rhs.type}' for '{oper}' operation")
+                          f"Incompatible types '{lhs.type}' and '{rhs.type}' for '{oper}' operation", expr_node.lineno)
         return op_func(lhs, rhs), ExecStatus.CONTINUE
 
-    def __call_print(self, fcall_node: Element, env: list[dict]) -> tuple[Value, ExecStatus]:
+    def __call_print(self, fcall_node: Element, env) -> tuple[Value, ExecStatus]:
         args = fcall_node.get("args")
         s = ""
         for arg in args:
@@ -296,15 +298,15 @@ class Interpreter(InterpreterBase):
                 return value, state
             printable = get_printable(value)
             if printable is None:
-                super().error(ErrorType.TYPE_ERROR, "Non-printable type for print()")
+                super().error(ErrorType.TYPE_ERROR, "Non-printable type for print()", arg.lineno)
             s += printable
         super().output(s)
         return create_value(Type.NIL), ExecStatus.CONTINUE
 
-    def __call_input(self, fcall_node: Element, env: list[dict]) -> tuple[Value, ExecStatus]:
+    def __call_input(self, fcall_node: Element, env) -> tuple[Value, ExecStatus]:
         args = fcall_node.get("args")
         if len(args) > 1:
-            super().error(ErrorType.NAME_ERROR, "inputi() function got more than one parameter")
+            super().error(ErrorType.NAME_ERROR, "inputi() function got more than one parameter", fcall_node.lineno)
 
         if args:
             arg, state = self.__force_eval(args[0], env)
@@ -321,17 +323,3 @@ class Interpreter(InterpreterBase):
                 return create_value(Type.INT, int(usr_input)), ExecStatus.CONTINUE
             case "inputs":
                 return create_value(Type.STRING, usr_input), ExecStatus.CONTINUE
-
-def find_var(var_name: str, env: list[dict]) -> Value | None:
-    for scope in reversed(env):
-        if var_name in scope:
-            return scope[var_name]
-    return None
-
-def assign_var(var_name: str, val: Value, env: list[dict]) -> bool:
-    for scope in reversed(env):
-        if var_name in scope:
-            scope[var_name].type = val.type
-            scope[var_name].value = val.value
-            return True
-    return False
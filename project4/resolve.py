@@ -0,0 +1,109 @@
+from element import Element
+from type import BinaryOps, Statement, UnaryOps
+
+
+class Resolver:
+    """ Static scoping for one function. Brewin scopes are blocks and a function only sees its own variables, so the
+    definition a name refers to at any point of the body can be known before the function runs: the innermost one
+    in an enclosing block that comes before that point.
+
+    Every definition gets a slot in the frame of the call, a list with one entry per slot. Blocks allocate their
+    slots like a stack, so sibling blocks share them and the frame is only as big as the deepest nesting needs.
+    define() returns None for a name already defined in the same block, and lookup() for a name with no definition
+    in scope: the places where the interpreter raises NAME_ERROR, which it keeps raising there, at run time. """
+    def __init__(self, param_names: list[str]):
+        self.blocks: list[dict[str, int]] = []  # name -> slot
+        self.starts: list[int] = []  # first slot of each open block
+        self.next_slot = 0
+        self.size = 0  # slots in a frame
+        self.push()
+        self.params = [self.define(name) for name in param_names]
+
+    def push(self) -> None:
+        self.blocks.append({})
+        self.starts.append(self.next_slot)
+
+    def pop(self) -> None:
+        self.blocks.pop()
+        self.next_slot = self.starts.pop()
+
+    def define(self, name: str) -> int|None:
+        block = self.blocks[-1]
+        if name in block:
+            return None
+        slot = block[name] = self.next_slot
+        self.next_slot += 1
+        self.size = max(self.size, self.next_slot)
+        return slot
+
+    def lookup(self, name: str) -> int|None:
+        for block in reversed(self.blocks):
+            if name in block:
+                return block[name]
+        return None
+
+
+def rebuild(node, **changes) -> Element:
+    """ A copy of the node with some of its children replaced, at the same place in the source. """
+    new = Element(node.elem_type, **{**node.dict, **changes})
+    new.span = node.span
+    return new
+
+
+class Annotator:
+    """ Resolver pass, run over a function before its first call. It returns a copy of the statements in which every
+    node that defines, reads or assigns a variable has the variable's slot in a slot attribute, None where the
+    interpreter raises NAME_ERROR. Slots are attributes, outside dict, so the copies print as the nodes they copy,
+    and the tree, which the parse cache may share, is left as it is. """
+    def __init__(self, param_names: list[str]):
+        self.resolver = Resolver(param_names)
+
+    def block(self, statement_nodes) -> list[Element]:
+        self.resolver.push()
+        statements = [self.statement(node) for node in statement_nodes]
+        self.resolver.pop()
+        return statements
+
+    def statement(self, node):
+        category = node.elem_type
+        if category == Statement.VAR_DEF:
+            new = rebuild(node)
+            new.slot = self.resolver.define(node.get("name"))
+        elif category == Statement.ASSIGNMENT:
+            new = rebuild(node, expression=self.expression(node.get("expression")))
+            new.slot = self.resolver.lookup(node.get("name"))
+        elif category == Statement.IF_STATEMENT:
+            else_statements = node.get("else_statements")
+            new = rebuild(node, condition=self.expression(node.get("condition")),
+                          statements=self.block(node.get("statements")),
+                          else_statements=self.block(else_statements) if else_statements else else_statements)
+        elif category == Statement.FOR_STATEMENT:
+            new = rebuild(node, init=self.statement(node.get("init")),
+                          condition=self.expression(node.get("condition")),
+                          statements=self.block(node.get("statements")), update=self.statement(node.get("update")))
+        elif category == Statement.TRY:
+            new = rebuild(node, statements=self.block(node.get("statements")),
+                          catchers=[rebuild(catch_node, statements=self.block(catch_node.get("statements")))
+                                    for catch_node in node.get("catchers")])
+        elif category == Statement.RAISE:
+            new = rebuild(node, exception_type=self.expression(node.get("exception_type")))
+        elif category == Statement.RETURN and node.get("expression"):
+            new = rebuild(node, expression=self.expression(node.get("expression")))
+        else:
+            new = self.expression(node)
+        return new
+
+    def expression(self, node):
+        expr = node.elem_type
+        if expr == Statement.VAR:
+            new = rebuild(node)
+            new.slot = self.resolver.lookup(node.get("name"))
+        elif expr in UnaryOps:
+            new = rebuild(node, op1=self.expression(node.get("op1")))
+        elif expr in BinaryOps:
+            new = rebuild(node, op1=self.expression(node.get("op1")), op2=self.expression(node.get("op2")))
+        elif expr == Statement.FUNC_CALL:
+            new = rebuild(node, args=[self.expression(arg) for arg in node.get("args")])
+        else:  # literals, and what the interpreter rejects
+            new = node
+        return new